@@ -0,0 +1,214 @@
+"""
+Camada de execução das chamadas de IA (Gemini).
+
+O SDK do Gemini é síncrono: chamar `model.generate_content()` dentro de uma
+rota `async def` trava o event loop durante toda a ida e volta ao modelo,
+e todas as outras requisições do worker ficam paradas esperando.
+
+Aqui as chamadas rodam num pool de threads limitado (AI_MAX_CONCURRENCY),
+com fila limitada (AI_MAX_QUEUE), tempo máximo por chamada (AI_TIMEOUT) e
+métricas de fila/latência.
+
+Provedores (AI_PROVIDER): um modelo é qualquer objeto com
+`generate_content(prompt)` que devolve algo com `.text`. O `GeminiModel`
+só importa o SDK na primeira chamada (importar google.generativeai custa
+mais de meio segundo, pago por cada worker e a cada reload, e só duas
+rotas usam IA); o `FakeModel` simula o Gemini localmente.
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import config, metrics
+
+
+class AIError(Exception):
+    """Erro base da camada de IA."""
+
+
+class AITimeoutError(AIError):
+    """A chamada excedeu o tempo máximo (na fila ou no modelo)."""
+
+
+class AIOverloadedError(AIError):
+    """Fila cheia: muitos pedidos aguardando o modelo."""
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """
+    Modelo local para testes e benchmarks.
+    Mesma interface usada do Gemini (`generate_content(prompt).text`),
+    dorme `latency` segundos para simular a ida e volta à API.
+    Prompts em lote (linhas "#<id> | ...") recebem um JSON {id: texto}.
+    """
+
+    def __init__(self, latency=0.5, text="<span class='text-success'>Preço Justo</span>"):
+        self.latency = latency
+        self.text = text
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        time.sleep(self.latency)
+        ids = re.findall(r"^\s*#(\d+) \|", prompt, re.MULTILINE)
+        if ids:
+            return FakeResponse(json.dumps({item_id: self.text for item_id in ids}))
+        return FakeResponse(self.text)
+
+
+class GeminiModel:
+    """
+    Gemini com o SDK carregado na primeira chamada (numa thread do pool
+    do AIExecutor, fora do event loop). Só a primeira chamada paga a
+    importação; as seguintes reusam o mesmo GenerativeModel.
+    """
+
+    def __init__(self, model_name, api_key):
+        if not api_key:
+            print("ALERTA: GOOGLE_API_KEY não encontrada no arquivo .env")
+        self.model_name = model_name
+        self.api_key = api_key
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+
+                genai.configure(api_key=self.api_key)
+                self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate_content(self, prompt):
+        return (self._model or self._load()).generate_content(prompt)
+
+
+# AI_PROVIDER -> fábrica do modelo (nada é importado até a fábrica rodar)
+PROVIDERS = {
+    "gemini": lambda: GeminiModel(config.AI_MODEL_NAME, os.getenv("GOOGLE_API_KEY")),
+    "fake": lambda: FakeModel(latency=config.AI_FAKE_LATENCY),
+}
+
+
+def create_model(provider: str = None):
+    """Modelo do provedor configurado (AI_PROVIDER)."""
+    provider = (provider or config.AI_PROVIDER).lower()
+    if provider not in PROVIDERS:
+        raise AIError(f"AI_PROVIDER desconhecido: {provider!r} (opções: {', '.join(PROVIDERS)})")
+    return PROVIDERS[provider]()
+
+
+class AIExecutor:
+    """
+    Executa `model.generate_content` num pool de threads sem bloquear o event loop.
+
+    Limites:
+      - max_workers: chamadas simultâneas ao modelo;
+      - max_queue: pedidos esperando vaga (acima disso -> AIOverloadedError);
+      - timeout: tempo total por chamada, fila incluída (-> AITimeoutError).
+    """
+
+    def __init__(self, model, max_workers=4, max_queue=32, timeout=30.0):
+        self.model = model
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai")
+        self._lock = threading.Lock()
+        # Métricas
+        self.queued = 0
+        self.in_flight = 0
+        self.max_queued = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.started = 0
+        self.finished = 0
+        self.total_wait = 0.0
+        self.total_latency = 0.0
+
+    def _run(self, prompt, enqueued_at):
+        # Roda numa thread do pool: sai da fila e chama o modelo
+        started = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.in_flight += 1
+            self.started += 1
+            self.total_wait += started - enqueued_at
+        outcome = "error"
+        try:
+            text = self.model.generate_content(prompt).text
+            outcome = "ok"
+            return text
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.AI_CALL_SECONDS.observe(elapsed, outcome)
+            with self._lock:
+                self.in_flight -= 1
+                self.finished += 1
+                self.total_latency += elapsed
+
+    async def generate(self, prompt: str) -> str:
+        """Gera texto para `prompt` e devolve `response.text`."""
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise AIOverloadedError("Muitos pedidos à IA em andamento, tente novamente em instantes")
+            self.queued += 1
+            self.submitted += 1
+            self.max_queued = max(self.max_queued, self.queued)
+
+        future = self._pool.submit(self._run, prompt, time.perf_counter())
+        try:
+            text = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            # Se ainda estava na fila, sai dela; se já estava no modelo, a thread termina sozinha
+            if future.cancel():
+                with self._lock:
+                    self.queued -= 1
+            with self._lock:
+                self.timeouts += 1
+            raise AITimeoutError(f"IA não respondeu em {self.timeout:g}s")
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        with self._lock:
+            self.completed += 1
+        return text
+
+    def metrics(self) -> dict:
+        """Retrato das métricas de fila e latência."""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": self.queued,
+                "in_flight": self.in_flight,
+                "max_queued": self.max_queued,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(1000 * self.total_wait / self.started, 1) if self.started else 0.0,
+                "avg_latency_ms": round(1000 * self.total_latency / self.finished, 1) if self.finished else 0.0,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
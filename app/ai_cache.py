@@ -0,0 +1,165 @@
+"""
+Cache persistente das respostas de IA (análise de preço e relatório de OS).
+
+A chave é o SHA-256 das entradas normalizadas do prompt:
+  - análise de preço: nome da peça + preço de venda;
+  - relatório de OS: id da OS + lista de itens (nome, qtd, preço) + total.
+Se as entradas mudam, a chave muda e o cache erra sozinho; além disso,
+`invalidate()` apaga na hora as respostas de uma peça/OS alterada.
+
+As entradas vencem após AI_CACHE_TTL segundos e, acima de
+AI_CACHE_MAX_ENTRIES, saem as usadas há mais tempo (LRU).
+
+A consulta (`get`) só lê: os acessos para o LRU ficam em memória e são
+gravados junto com a próxima escrita do cache (`evict`). As escritas
+(`store`) passam pela fila única de escrita.
+"""
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, delete, func, select, text, update
+from sqlmodel import Session
+
+from app import config
+from app.database import writer_lane
+from app.models import AICacheEntry
+
+KIND_PRICE = "price"
+KIND_REPORT = "report"
+
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "invalidations": 0}
+# chave -> último acesso ainda não gravado em last_used_at
+_touched = {}
+
+
+def _count(name, n=1):
+    with _lock:
+        _counters[name] += n
+
+
+def _normalize_text(value: str) -> str:
+    return " ".join((value or "").split()).casefold()
+
+
+def make_key(kind: str, payload) -> str:
+    """Hash estável (JSON ordenado) das entradas do prompt."""
+    raw = json.dumps([kind, payload], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def price_key(item) -> str:
+    """Chave da análise de preço de uma peça do estoque."""
+    return make_key(KIND_PRICE, {"name": _normalize_text(item.name), "price": round(item.sell_price, 2)})
+
+
+def report_key(order) -> str:
+    """
+    Chave do relatório de uma OS.
+    `order` é a OS com seus itens (app/os_view.OrderView).
+    """
+    lines = sorted(
+        (_normalize_text(line.name), line.quantity_sold, round(line.price_at_moment, 2))
+        for line in order.items
+    )
+    return make_key(KIND_REPORT, {"os": order.id, "items": lines, "total": round(order.total_value, 2)})
+
+
+def get(session: Session, key: str):
+    """Devolve o texto em cache (ou None). Só lê: o acesso para o LRU fica em memória."""
+    row = session.execute(
+        select(AICacheEntry.value, AICacheEntry.created_at).where(AICacheEntry.key == key)
+    ).first()
+    if row is None:
+        _count("misses")
+        return None
+
+    now = datetime.now()
+    if row.created_at < now - timedelta(seconds=config.AI_CACHE_TTL):
+        # A entrada vencida sai na próxima limpeza (evict)
+        _count("expired")
+        _count("misses")
+        return None
+
+    with _lock:
+        _touched[key] = now
+        _counters["hits"] += 1
+    return row.value
+
+
+def add(session: Session, key: str, kind: str, ref_id: int, value: str):
+    """Guarda uma resposta sem commit nem limpeza (lotes: várias `add` e um `evict`)."""
+    now = datetime.now()
+    session.merge(AICacheEntry(key=key, kind=kind, ref_id=ref_id, value=value, created_at=now, last_used_at=now))
+    _count("stores")
+
+
+def evict(session: Session):
+    """Grava os acessos pendentes e apaga as entradas vencidas e as excedentes (LRU). Não faz commit."""
+    with _lock:
+        touched = [{"entry_key": key, "used_at": used_at} for key, used_at in _touched.items()]
+        _touched.clear()
+    if touched:
+        session.execute(
+            update(AICacheEntry.__table__)
+            .where(AICacheEntry.__table__.c.key == bindparam("entry_key"))
+            .values(last_used_at=bindparam("used_at")),
+            touched,
+        )
+    session.execute(delete(AICacheEntry).where(
+        AICacheEntry.created_at < datetime.now() - timedelta(seconds=config.AI_CACHE_TTL)
+    ))
+    # LRU: mantém apenas as AI_CACHE_MAX_ENTRIES usadas mais recentemente
+    session.execute(
+        text("""
+            DELETE FROM aicacheentry WHERE key IN (
+                SELECT key FROM aicacheentry ORDER BY last_used_at DESC LIMIT -1 OFFSET :keep
+            )
+        """),
+        {"keep": config.AI_CACHE_MAX_ENTRIES},
+    )
+
+
+def put(session: Session, key: str, kind: str, ref_id: int, value: str):
+    """Guarda uma resposta e aplica a validade e o limite de entradas."""
+    add(session, key, kind, ref_id, value)
+    evict(session)
+    session.commit()
+
+
+def store(engine, key: str, kind: str, ref_id: int, value: str):
+    """
+    `put` numa sessão própria, dentro da fila única de escrita (as rotas de
+    IA são de leitura e chamam numa thread). Falhar em guardar não invalida
+    a resposta já obtida do modelo: só avisa no log.
+    """
+    try:
+        with writer_lane(), Session(engine) as session:
+            put(session, key, kind, ref_id, value)
+    except Exception as e:
+        print(f"ALERTA: resposta da IA não guardada no cache ({e})")
+
+
+def invalidate(session: Session, kind: str, ref_id: int):
+    """
+    Remove as respostas ligadas a uma peça/OS. Não faz commit:
+    participa da transação da rota que alterou os dados.
+    """
+    removed = session.execute(
+        delete(AICacheEntry).where(AICacheEntry.kind == kind, AICacheEntry.ref_id == ref_id)
+    ).rowcount
+    if removed:
+        _count("invalidations", removed)
+
+
+def stats(session: Session = None) -> dict:
+    """Contadores de acerto/erro do cache (e o total de entradas, se houver sessão)."""
+    with _lock:
+        result = dict(_counters)
+    lookups = result["hits"] + result["misses"]
+    result["hit_ratio"] = round(result["hits"] / lookups, 3) if lookups else 0.0
+    if session is not None:
+        result["entries"] = session.execute(select(func.count()).select_from(AICacheEntry)).scalar()
+    return result
@@ -0,0 +1,346 @@
+"""
+Relatórios de vendas e margem (página /reports).
+
+Tudo é calculado em duas etapas, sem laços por linha no Python:
+  1. a tabela `salesdaily` já guarda as vendas somadas por (dia, peça),
+     mantida por triggers em `serviceorderitem` na mesma transação de cada
+     venda/estorno (como os contadores do Dashboard): anos de histórico são
+     no máximo dias x peças vendidas linhas, lidas por faixa da chave e
+     somadas no SQL por dia e por peça;
+  2. o pandas junta esses totais com o Estoque e faz os demais cortes
+     vetorizados: receita e margem por dia/mês/categoria, peças mais
+     vendidas, giro de estoque, dias de cobertura por peça e sugestão de
+     reposição (com base em `min_quantity` e no ritmo de vendas).
+
+A margem usa o preço cobrado (`price_at_moment`) menos o custo ATUAL da
+peça (o custo na data da venda não é guardado). Entram todas as OS do
+período, abertas ou não: a peça sai do estoque ao ser lançada.
+
+Os relatórios ficam em cache por período. A entrada vale enquanto a
+"impressão digital" dos dados não muda (último item vendido + contadores
+do Dashboard, mantidos por triggers) e por no máximo ANALYTICS_CACHE_TTL.
+
+Uso pela linha de comando:
+    python -m app.analytics --start 2024-01-01 --end 2024-12-31
+    python -m app.analytics --rebuild   # recalcula `salesdaily` do zero
+"""
+import argparse
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, text
+from sqlmodel import Session
+
+from app import archive, config, http_cache
+from app.models import InventoryItem
+
+TOP_PARTS = 10
+MAX_REORDER_ROWS = 50
+
+# Data da OS dona do item (a data da venda)
+_DAY_OF = "(SELECT date(created_at) FROM serviceorder WHERE id = {row}.order_id)"
+
+_ADD_LINE = """
+    INSERT INTO salesdaily (day, item_id, units, revenue)
+    SELECT date(created_at), NEW.item_id, NEW.quantity_sold, NEW.quantity_sold * NEW.price_at_moment
+    FROM serviceorder WHERE id = NEW.order_id
+    ON CONFLICT (day, item_id) DO UPDATE SET
+        units = units + excluded.units,
+        revenue = revenue + excluded.revenue;
+"""
+
+_REMOVE_LINE = f"""
+    UPDATE salesdaily SET
+        units = units - OLD.quantity_sold,
+        revenue = revenue - OLD.quantity_sold * OLD.price_at_moment
+    WHERE item_id = OLD.item_id AND day = {_DAY_OF.format(row="OLD")};
+    DELETE FROM salesdaily
+    WHERE item_id = OLD.item_id AND day = {_DAY_OF.format(row="OLD")} AND units = 0;
+"""
+
+TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS salesdaily_item_insert
+    AFTER INSERT ON serviceorderitem BEGIN {_ADD_LINE} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS salesdaily_item_update
+    AFTER UPDATE OF order_id, item_id, quantity_sold, price_at_moment ON serviceorderitem
+    BEGIN {_REMOVE_LINE} {_ADD_LINE} END
+    """,
+    # Itens de OS indo para o arquivo (app/archive.py) continuam sendo vendas
+    f"""
+    CREATE TRIGGER IF NOT EXISTS salesdaily_item_delete
+    AFTER DELETE ON serviceorderitem
+    WHEN NOT EXISTS (SELECT 1 FROM archivebatch WHERE order_id = OLD.order_id)
+    BEGIN {_REMOVE_LINE} END
+    """,
+]
+
+# Recalculo: vendas das OS quentes e das arquivadas (app/archive.py), uma parte por fonte
+REBUILD_SQL = [
+    "DELETE FROM salesdaily",
+    """
+    INSERT INTO salesdaily (day, item_id, units, revenue)
+    SELECT day, item_id, SUM(units), SUM(revenue) FROM ({sales}) GROUP BY 1, 2
+    """,
+]
+_SALES_OF = """
+    SELECT date(so.created_at) AS day, soi.item_id AS item_id, soi.quantity_sold AS units,
+           soi.quantity_sold * soi.price_at_moment AS revenue
+    FROM {orders} so JOIN {lines} soi ON soi.order_id = so.id
+"""
+
+# Receita e custo por dia do período (faixa da chave primária de salesdaily)
+SALES_BY_DAY_SQL = """
+SELECT sd.day AS day,
+       SUM(sd.units) AS units,
+       SUM(sd.revenue) AS revenue,
+       SUM(sd.units * COALESCE(i.cost_price, 0)) AS cost
+FROM salesdaily sd
+LEFT JOIN inventoryitem i ON i.id = sd.item_id
+WHERE sd.day >= :start AND sd.day <= :end
+GROUP BY sd.day
+"""
+
+# Vendas do período por peça
+SALES_BY_ITEM_SQL = """
+SELECT item_id, SUM(units) AS units, SUM(revenue) AS revenue
+FROM salesdaily
+WHERE day >= :start AND day <= :end
+GROUP BY item_id
+"""
+
+ORDERS_BY_DAY_SQL = """
+SELECT date(created_at) AS day, COUNT(*) AS orders
+FROM ({orders})
+WHERE created_at >= :start AND created_at < :end
+GROUP BY day
+"""
+
+
+@dataclass
+class SalesReport:
+    start: date
+    end: date
+    days: int
+    totals: dict
+    by_day: list
+    by_month: list
+    by_category: list
+    top_parts: list
+    reorder: list
+    elapsed_ms: float = 0.0
+    generated_at: datetime = field(default_factory=datetime.now)
+
+
+_lock = threading.Lock()
+# (início, fim) -> (impressão digital, vence_em, relatório)
+_cache = {}
+
+
+def install(engine):
+    """
+    Cria os triggers de `salesdaily` (se ainda não existirem). Se a tabela
+    está vazia mas já há vendas (banco anterior a ela), calcula do zero.
+    """
+    with engine.begin() as conn:
+        for ddl in TRIGGERS:
+            conn.execute(text(ddl))
+        empty = conn.execute(text("SELECT NOT EXISTS (SELECT 1 FROM salesdaily)")).scalar()
+        has_sales = conn.execute(text("SELECT EXISTS (SELECT 1 FROM serviceorderitem)")).scalar()
+        if empty and has_sales:
+            rebuild(conn)
+
+
+def rebuild(conn):
+    """Recalcula `salesdaily` a partir das OS (útil após importações manuais no banco)."""
+    sales = " UNION ALL ".join(
+        _SALES_OF.format(orders=orders, lines=lines) for orders, lines in archive.source_names(conn)
+    )
+    for sql in REBUILD_SQL:
+        conn.execute(text(sql.format(sales=sales)))
+
+
+def _frame(conn, sql, params=None) -> pd.DataFrame:
+    result = conn.execute(text(sql) if isinstance(sql, str) else sql, params or {})
+    columns = list(result.keys())
+    # Tuplas simples: montar o DataFrame a partir de Row é bem mais lento
+    return pd.DataFrame.from_records([tuple(row) for row in result], columns=columns)
+
+
+def _inventory(conn) -> pd.DataFrame:
+    return _frame(conn, select(
+        InventoryItem.id.label("item_id"), InventoryItem.name, InventoryItem.category, InventoryItem.cost_price,
+        InventoryItem.sell_price, InventoryItem.quantity, InventoryItem.min_quantity,
+    )).set_index("item_id")
+
+
+def _records(df: pd.DataFrame) -> list:
+    """Linhas para o template, com None no lugar de NaN/infinito."""
+    df = df.replace([np.inf, -np.inf], np.nan)
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def _margin_pct(df: pd.DataFrame) -> pd.Series:
+    return (100 * df["margin"] / df["revenue"].where(df["revenue"] != 0)).round(1)
+
+
+def build_report(conn, start: date, end: date) -> SalesReport:
+    """Calcula o relatório do período [start, end] (dias inclusivos)."""
+    started = time.perf_counter()
+    days = (end - start).days + 1
+    days_range = {"start": start.isoformat(), "end": end.isoformat()}
+    sales_by_day = _frame(conn, SALES_BY_DAY_SQL, days_range)
+    sales_by_item = _frame(conn, SALES_BY_ITEM_SQL, days_range)
+    all_orders = " UNION ALL ".join(f"SELECT created_at FROM {orders}" for orders, _ in archive.source_names(conn))
+    orders = _frame(conn, ORDERS_BY_DAY_SQL.format(orders=all_orders), {
+        "start": datetime.combine(start, datetime.min.time()),
+        "end": datetime.combine(end + timedelta(days=1), datetime.min.time()),
+    })
+    inventory = _inventory(conn)
+    metrics = ["revenue", "cost", "margin", "units"]
+
+    # --- Por dia (todos os dias do período, inclusive sem vendas) e por mês ---
+    calendar = pd.date_range(start, end, freq="D")
+    by_day = (
+        sales_by_day.set_index(pd.to_datetime(sales_by_day["day"]))[["revenue", "cost", "units"]]
+        .reindex(calendar, fill_value=0)
+        .astype({"units": "int64"})
+    )
+    by_day["margin"] = by_day["revenue"] - by_day["cost"]
+    by_day["orders"] = (
+        orders.set_index(pd.to_datetime(orders["day"]))["orders"].reindex(calendar, fill_value=0)
+        if not orders.empty else 0
+    )
+    by_month = by_day.groupby(by_day.index.to_period("M")).sum()
+    for frame in (by_day, by_month):
+        frame["margin_pct"] = _margin_pct(frame)
+
+    # --- Por peça (peças excluídas do cadastro continuam nas vendas, sem custo conhecido) ---
+    per_item = sales_by_item.set_index("item_id").reindex(columns=["units", "revenue"]).astype(
+        {"units": "int64", "revenue": "float64"}
+    )
+    per_item = per_item.join(inventory[["category", "cost_price"]], how="left")
+    per_item["category"] = per_item["category"].fillna("(peça excluída)")
+    per_item["cost"] = per_item["units"] * per_item["cost_price"].fillna(0.0)
+    per_item["margin"] = per_item["revenue"] - per_item["cost"]
+
+    # --- Por categoria ---
+    by_category = per_item.groupby("category")[metrics].sum().sort_values("revenue", ascending=False)
+    by_category["margin_pct"] = _margin_pct(by_category)
+    by_category["share_pct"] = (100 * by_category["revenue"] / by_category["revenue"].sum()).round(1)
+
+    # --- Por peça: giro, cobertura e reposição ---
+    items = inventory.join(per_item[metrics], how="left").fillna({m: 0 for m in metrics})
+    items["daily_units"] = items["units"] / days
+    items["days_of_cover"] = (items["quantity"] / items["daily_units"].where(items["daily_units"] > 0)).round(1)
+    # Giro no período: unidades vendidas / estoque atual
+    items["turnover"] = (items["units"] / items["quantity"].where(items["quantity"] > 0)).round(2)
+
+    top_parts = items[items["units"] > 0].nlargest(TOP_PARTS, ["units", "revenue"])
+
+    target = np.ceil(items["daily_units"] * (config.REORDER_LEAD_DAYS + config.REORDER_COVER_DAYS))
+    items["suggested"] = (np.maximum(target, items["min_quantity"] + 1) - items["quantity"]).clip(lower=0)
+    needs_reorder = (items["quantity"] <= items["min_quantity"]) | (
+        items["days_of_cover"] < config.REORDER_LEAD_DAYS
+    )
+    reorder = (
+        items[needs_reorder & (items["suggested"] > 0)]
+        .sort_values(["days_of_cover", "quantity"], na_position="last")
+        .head(MAX_REORDER_ROWS)
+    )
+
+    inventory_cost = float((inventory["cost_price"] * inventory["quantity"].clip(lower=0)).sum())
+    revenue, cost = float(by_day["revenue"].sum()), float(by_day["cost"].sum())
+    totals = {
+        "revenue": revenue,
+        "cost": cost,
+        "margin": revenue - cost,
+        "margin_pct": round(100 * (revenue - cost) / revenue, 1) if revenue else None,
+        "units": int(by_day["units"].sum()),
+        "orders": int(orders["orders"].sum()) if not orders.empty else 0,
+        "inventory_cost": inventory_cost,
+        # Giro anualizado: custo das vendas / valor do estoque a custo
+        "turnover_year": round(cost / inventory_cost * 365 / days, 2) if inventory_cost else None,
+        "reorder_count": int((needs_reorder & (items["suggested"] > 0)).sum()),
+    }
+
+    by_day.index = by_day.index.strftime("%d/%m/%Y")
+    by_month.index = by_month.index.strftime("%m/%Y")
+    return SalesReport(
+        start=start,
+        end=end,
+        days=days,
+        totals=totals,
+        by_day=_records(by_day.rename_axis("label").reset_index()),
+        by_month=_records(by_month.rename_axis("label").reset_index()),
+        by_category=_records(by_category.reset_index()),
+        top_parts=_records(top_parts.reset_index()),
+        reorder=_records(reorder.reset_index()),
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+    )
+
+
+def _fingerprint(session: Session):
+    """
+    Contadores de `tableversion` (ver app/http_cache.py): mudam a cada
+    INSERT/UPDATE/DELETE nas peças (custo, estoque), nas OS e nos itens,
+    inclusive um item trocado que reusa o mesmo id.
+    """
+    return http_cache.table_versions(session, "inventoryitem", "serviceorder", "serviceorderitem")
+
+
+def get_report(session: Session, start: date, end: date) -> SalesReport:
+    """Relatório do período, do cache quando os dados não mudaram."""
+    key = (start, end)
+    fingerprint = _fingerprint(session)
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(key)
+    if cached and cached[0] == fingerprint and cached[1] > now:
+        return cached[2]
+
+    report = build_report(session.connection(), start, end)
+    with _lock:
+        # Descarta entradas vencidas ou de dados antigos antes de guardar
+        for old_key in [k for k, (fp, expires, _) in _cache.items() if fp != fingerprint or expires <= now]:
+            del _cache[old_key]
+        _cache[key] = (fingerprint, now + config.ANALYTICS_CACHE_TTL, report)
+    return report
+
+
+def default_period(today: date = None):
+    """Últimos 30 dias, incluindo hoje."""
+    today = today or date.today()
+    return today - timedelta(days=29), today
+
+
+if __name__ == "__main__":
+    from app.database import create_db_and_tables, engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=date.fromisoformat)
+    parser.add_argument("--end", type=date.fromisoformat)
+    parser.add_argument("--rebuild", action="store_true", help="recalcula a tabela salesdaily antes")
+    args = parser.parse_args()
+    create_db_and_tables()
+    if args.rebuild:
+        with engine.begin() as conn:
+            rebuild(conn)
+    start, end = default_period()
+    start, end = args.start or start, args.end or end
+
+    with Session(engine) as session:
+        report = get_report(session, start, end)
+    t = report.totals
+    print(f"{start} a {end} ({report.days} dias) calculado em {report.elapsed_ms:.0f} ms")
+    print(f"Receita R$ {t['revenue']:.2f}  custo R$ {t['cost']:.2f}  margem R$ {t['margin']:.2f} "
+          f"({t['margin_pct']}%)  OS {t['orders']}  unidades {t['units']}")
+    for row in report.top_parts:
+        print(f"  {row['name']:<40} {row['units']:>8.0f} un  R$ {row['revenue']:.2f}")
+    print(f"{t['reorder_count']} peças para repor")
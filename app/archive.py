@@ -0,0 +1,347 @@
+"""
+Arquivo das OS fechadas antigas.
+
+`serviceorder` e `serviceorderitem` crescem para sempre. As OS fechadas
+criadas há mais de ARCHIVE_AFTER_DAYS dias vão, com os seus itens, para
+um segundo arquivo SQLite (ARCHIVE_DATABASE_PATH, por padrão
+"<banco>_archive.db"), anexado com ATTACH como schema `archive` em toda
+conexão das engines (ver database.build_engine). As tabelas quentes, os
+índices e a lista de OS ficam pequenos; só o arquivo cresce.
+
+Leitura transparente: quem carrega uma OS pelo id (detalhes, impressão,
+relatório de IA, impressão em lote: app/os_view.py e app/http_cache.py)
+procura no arquivo o que não achou nas tabelas quentes. Exportações,
+impressão em lote por período e os Relatórios de vendas leem os dois
+lados (`sources`). OS arquivada é só leitura: lançar, estornar e fechar
+respondem 404.
+
+A mudança é feita em lotes, cada um em transações que gravam um arquivo
+só (com WAL o SQLite não garante atomicidade entre bancos anexados):
+  1. troca as cópias antigas (de uma rodada interrompida) por OS e itens
+     atuais;
+  2. apaga das tabelas quentes só as OS cuja `version` ainda é a copiada,
+     ou seja, que não mudaram desde a etapa 1;
+  3. descarta do arquivo as cópias que não foram removidas na etapa 2.
+Se o processo cair entre as etapas, a OS fica nos dois lugares (as telas
+leem a quente) e a próxima rodada termina o serviço. Na etapa 2 as OS
+ficam listadas em `archivebatch`, e o trigger de `salesdaily` não desconta
+as vendas desses itens: o histórico dos Relatórios continua igual.
+
+A OS de maior id nunca é arquivada: sem AUTOINCREMENT, o SQLite
+reaproveitaria esse id numa OS nova. Já o id de um item pode voltar (item
+de maior id estornado), então no arquivo os itens têm chave própria
+(`archive_id`) e são únicos por (OS, id).
+
+Uso pela linha de comando:
+    python -m app.archive                      # arquiva o que passou da idade
+    python -m app.archive --days 180 --dry-run
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, Table, UniqueConstraint, event, text
+from sqlalchemy.engine import make_url
+
+from app import config
+from app.models import ServiceOrder, ServiceOrderItem, ServiceOrderStatus
+
+SCHEMA = "archive"
+
+# Primeira rodada automática depois da subida (segundos)
+_FIRST_RUN_DELAY = 60
+
+metadata = MetaData()
+
+
+def _archive_table(model, *indexes, own_key=False):
+    """
+    Mesmas colunas da tabela quente (sem chaves estrangeiras) + data de
+    arquivamento. `own_key`: o id quente vira coluna comum e a chave é `archive_id`.
+    """
+    columns = [
+        Column(column.name, column.type, primary_key=column.primary_key and not own_key,
+               nullable=column.nullable and not column.primary_key)
+        for column in model.__table__.columns
+    ]
+    if own_key:
+        columns.insert(0, Column("archive_id", Integer, primary_key=True))
+    return Table(
+        model.__tablename__, metadata, *columns,
+        Column("archived_at", DateTime, nullable=False), *indexes, schema=SCHEMA,
+    )
+
+
+orders = _archive_table(
+    ServiceOrder,
+    Index("ix_archive_serviceorder_created_at", "created_at"),
+    Index("ix_archive_serviceorder_client_id", "client_id"),
+)
+# A unicidade (OS, id) também atende às leituras pela OS
+lines = _archive_table(
+    ServiceOrderItem, UniqueConstraint("order_id", "id", name="uq_archive_serviceorderitem_order_line"), own_key=True,
+)
+
+
+def database_path(url=None):
+    """Arquivo do banco de arquivo; None para banco em memória (nada é anexado)."""
+    if config.ARCHIVE_DATABASE_PATH:
+        return config.ARCHIVE_DATABASE_PATH
+    main = make_url(url or config.DATABASE_URL).database
+    if not main or main == ":memory:":
+        return None
+    root, ext = os.path.splitext(main)
+    return f"{root}_archive{ext or '.db'}"
+
+
+def attach(sync_engine, url=None):
+    """Anexa o arquivo como schema `archive` em toda conexão nova da engine."""
+    path = database_path(url)
+    if path is None:
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def attach_archive(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"ATTACH DATABASE ? AS {SCHEMA}", (path,))
+        cursor.close()
+
+
+def available(conn) -> bool:
+    """O arquivo está anexado e com as tabelas? (engines avulsas e bancos em memória não têm)"""
+    attached = conn.execute(
+        text("SELECT 1 FROM pragma_database_list WHERE name = :schema"), {"schema": SCHEMA}
+    ).first()
+    return attached is not None and conn.execute(
+        text(f"SELECT 1 FROM {SCHEMA}.sqlite_master WHERE type = 'table' AND name = 'serviceorder'")
+    ).first() is not None
+
+
+def sources(conn) -> list:
+    """Pares (tabela de OS, tabela de itens) com OS: as quentes e, se houver, as do arquivo."""
+    found = [(ServiceOrder.__table__, ServiceOrderItem.__table__)]
+    if available(conn):
+        found.append((orders, lines))
+    return found
+
+
+def source_names(conn) -> list:
+    """Como `sources`, com os nomes das tabelas (para SQL escrito à mão)."""
+    return [(orders_table.fullname, lines_table.fullname) for orders_table, lines_table in sources(conn)]
+
+
+def _rebuild_lines(conn):
+    """Arquivo antigo, com `id` como chave dos itens: refaz a tabela com `archive_id`."""
+    columns = {row[1] for row in conn.execute(text(f"PRAGMA {SCHEMA}.table_info({lines.name})"))}
+    if not columns or "archive_id" in columns:
+        return
+    copied = ", ".join(column.name for column in lines.columns if column.name != "archive_id")
+    conn.execute(text(f"ALTER TABLE {SCHEMA}.{lines.name} RENAME TO {lines.name}_old"))
+    lines.create(conn)
+    conn.execute(text(
+        f"INSERT INTO {SCHEMA}.{lines.name} ({copied}) SELECT {copied} FROM {SCHEMA}.{lines.name}_old ORDER BY id"
+    ))
+    conn.execute(text(f"DROP TABLE {SCHEMA}.{lines.name}_old"))
+    print("Arquivo: itens das OS arquivadas com chave própria (archive_id)")
+
+
+def install(engine):
+    """Cria as tabelas do arquivo (se o arquivo estiver anexado)."""
+    with engine.begin() as conn:
+        attached = conn.execute(
+            text("SELECT 1 FROM pragma_database_list WHERE name = :schema"), {"schema": SCHEMA}
+        ).first()
+        if attached is not None:
+            _rebuild_lines(conn)
+            metadata.create_all(conn)
+
+
+# --- Mudança para o arquivo ---
+
+_CANDIDATES_SQL = text("""
+    SELECT id FROM serviceorder
+    WHERE status = :closed AND created_at < :cutoff AND id > :after
+      AND id < (SELECT MAX(id) FROM serviceorder)
+    ORDER BY id
+    LIMIT :limit
+""")
+
+_IDS = "(SELECT value FROM json_each(:ids))"
+
+
+def _copy_sql(hot, archived, key):
+    columns = ", ".join(column.name for column in hot.columns)
+    return text(
+        f"INSERT INTO {SCHEMA}.{archived.name} ({columns}, archived_at) "
+        f"SELECT {columns}, :now FROM main.{hot.name} WHERE {key} IN {_IDS}"
+    )
+
+
+_COPY_ORDERS_SQL = _copy_sql(ServiceOrder.__table__, orders, "id")
+_COPY_LINES_SQL = _copy_sql(ServiceOrderItem.__table__, lines, "order_id")
+
+# Só as OS que não mudaram desde a cópia (a versão sobe com qualquer alteração na OS ou nos itens)
+_MARK_SQL = text(f"""
+    INSERT INTO archivebatch (order_id)
+    SELECT o.id FROM main.serviceorder o JOIN {SCHEMA}.serviceorder a ON a.id = o.id AND a.version = o.version
+    WHERE o.id IN {_IDS}
+""")
+_REMOVE_SQL = [
+    text("DELETE FROM main.serviceorderitem WHERE order_id IN (SELECT order_id FROM archivebatch)"),
+    text("DELETE FROM main.serviceorder WHERE id IN (SELECT order_id FROM archivebatch)"),
+]
+# Cópias de OS que continuam quentes (mudaram no meio do caminho, ou de uma rodada interrompida)
+_DISCARD_SQL = [
+    text(f"DELETE FROM {SCHEMA}.serviceorderitem WHERE order_id IN {_IDS} "
+         "AND order_id IN (SELECT id FROM main.serviceorder)"),
+    text(f"DELETE FROM {SCHEMA}.serviceorder WHERE id IN {_IDS} AND id IN (SELECT id FROM main.serviceorder)"),
+]
+
+
+@dataclass
+class ArchiveResult:
+    orders: int = 0     # OS movidas para o arquivo
+    lines: int = 0      # itens movidos
+    skipped: int = 0    # OS alteradas durante a mudança (ficam para a próxima rodada)
+    batches: int = 0
+    seconds: float = 0.0
+
+
+_lock = threading.Lock()
+_stats = {"runs": 0, "orders": 0, "lines": 0, "skipped": 0, "last_run": None}
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats)
+
+
+def cutoff_date(days: int = None, now: datetime = None) -> datetime:
+    days = config.ARCHIVE_AFTER_DAYS if days is None else days
+    return (now or datetime.now()) - timedelta(days=days)
+
+
+def candidates(conn, cutoff: datetime, after: int = 0, limit: int = None) -> list:
+    """Ids das próximas OS a arquivar (fechadas, anteriores a `cutoff`), em ordem."""
+    return [row[0] for row in conn.execute(_CANDIDATES_SQL, {
+        "closed": ServiceOrderStatus.CLOSED.name, "cutoff": cutoff, "after": after,
+        "limit": limit or config.ARCHIVE_BATCH_SIZE,
+    })]
+
+
+def _move_batch(engine, ids: list, now: datetime) -> ArchiveResult:
+    params = {"ids": json.dumps(ids), "now": now}
+    # 1. Cópia: a transação só grava no arquivo (as OS do lote ainda são quentes,
+    #    então uma cópia anterior delas está velha e sai antes)
+    with engine.begin() as conn:
+        for sql in _DISCARD_SQL:
+            conn.execute(sql, params)
+        conn.execute(_COPY_ORDERS_SQL, params)
+        conn.execute(_COPY_LINES_SQL, params)
+    # 2. Remoção: a transação só grava no banco principal
+    with engine.begin() as conn:
+        moved = conn.execute(_MARK_SQL, params).rowcount
+        removed_lines = conn.execute(_REMOVE_SQL[0]).rowcount
+        conn.execute(_REMOVE_SQL[1])
+        conn.execute(text("DELETE FROM archivebatch"))
+    # 3. O que não saiu da tabela quente não fica duplicado no arquivo
+    if moved < len(ids):
+        with engine.begin() as conn:
+            for sql in _DISCARD_SQL:
+                conn.execute(sql, params)
+    return ArchiveResult(orders=moved, lines=removed_lines, skipped=len(ids) - moved)
+
+
+def archive_orders(engine, days: int = None, batch_size: int = None, now: datetime = None,
+                   dry_run: bool = False) -> ArchiveResult:
+    """
+    Move para o arquivo as OS fechadas criadas antes de `days` dias atrás.
+    Cada lote passa pela fila única de escrita; entre lotes as rotas escrevem normalmente.
+    """
+    from app.database import writer_lane
+
+    started = time.perf_counter()
+    now = now or datetime.now()
+    cutoff = cutoff_date(days, now)
+    result = ArchiveResult()
+    after = 0
+    while True:
+        with engine.connect() as conn:
+            if not available(conn):
+                raise RuntimeError("Banco de arquivo não anexado (banco em memória?)")
+            ids = candidates(conn, cutoff, after, batch_size)
+        if not ids:
+            break
+        after = ids[-1]
+        if dry_run:
+            result.orders += len(ids)
+            continue
+        with writer_lane():
+            batch = _move_batch(engine, ids, now)
+        result.orders += batch.orders
+        result.lines += batch.lines
+        result.skipped += batch.skipped
+        result.batches += 1
+    result.seconds = round(time.perf_counter() - started, 3)
+
+    if not dry_run:
+        with _lock:
+            _stats["runs"] += 1
+            _stats["orders"] += result.orders
+            _stats["lines"] += result.lines
+            _stats["skipped"] += result.skipped
+            _stats["last_run"] = now.isoformat(timespec="seconds")
+    return result
+
+
+class ArchiveScheduler:
+    """Roda `archive_orders` a cada ARCHIVE_INTERVAL_HOURS, numa thread, dentro do servidor."""
+
+    def __init__(self, engine, interval_hours: float = None):
+        self.engine = engine
+        self.interval = (config.ARCHIVE_INTERVAL_HOURS if interval_hours is None else interval_hours) * 3600
+        self._task = None
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        await asyncio.sleep(_FIRST_RUN_DELAY)
+        while True:
+            try:
+                result = await asyncio.to_thread(archive_orders, self.engine)
+                if result.orders or result.skipped:
+                    print(f"Arquivo: {result.orders} OS ({result.lines} itens) movidas em {result.seconds}s, "
+                          f"{result.skipped} adiadas")
+            except Exception as e:
+                print(f"ALERTA: falha ao arquivar OS antigas ({e})")
+            await asyncio.sleep(self.interval)
+
+
+if __name__ == "__main__":
+    from app.database import create_db_and_tables, engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, help=f"idade mínima em dias (padrão: {config.ARCHIVE_AFTER_DAYS})")
+    parser.add_argument("--batch-size", type=int, help=f"OS por lote (padrão: {config.ARCHIVE_BATCH_SIZE})")
+    parser.add_argument("--dry-run", action="store_true", help="só conta as OS que seriam movidas")
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    result = archive_orders(engine, args.days, args.batch_size, dry_run=args.dry_run)
+    print(json.dumps(asdict(result), ensure_ascii=False))
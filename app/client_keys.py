@@ -0,0 +1,91 @@
+"""
+Chaves normalizadas de placa e telefone dos clientes (busca e duplicidade).
+
+No balcão o cliente é achado pela placa do caminhão ou pelo telefone, e
+cada um digita de um jeito: "abc-1234", "ABC1C34", "(11) 99999-8888",
+"+55 11 999998888". As chaves tiram a formatação e juntam as variantes:
+
+  - placa: maiúsculas, só letras e números; a placa Mercosul vira a antiga
+    equivalente (o 5º caractere A-J volta a ser o dígito 0-9: ABC1C34 e
+    ABC1234 são o mesmo veículo, convertido);
+  - telefone: só dígitos, sem o DDI 55 e sem o zero de operadora.
+
+As mesmas regras existem em Python (para o texto digitado) e em SQL (colunas
+geradas `plate_key` e `phone_key` da tabela `client`, com índice). Como o
+próprio SQLite calcula as colunas, elas valem para qualquer escrita:
+cadastro, importação em lote ou edição direta no banco.
+"""
+import re
+import unicodedata
+
+# 5º caractere da placa Mercosul -> dígito da placa antiga (A=0 ... J=9)
+MERCOSUL_LETTERS = "ABCDEFGHIJ"
+
+_PLATE_NOISE = re.compile(r"[^A-Z0-9]")
+# Só ASCII: \D deixaria passar dígitos de outros alfabetos, que as chaves em SQL não tratam
+_NOT_DIGIT = re.compile(r"[^0-9]")
+
+
+def _text(value) -> str:
+    # NFKC: dígitos e letras de largura total ("１１", "ＡＢＣ") viram ASCII
+    return unicodedata.normalize("NFKC", str(value or ""))
+
+
+def clean_plate(value) -> str:
+    """'abc-1d23' -> 'ABC1D23' (forma gravada no cadastro)."""
+    return _PLATE_NOISE.sub("", _text(value).upper())
+
+
+def plate_key(value) -> str:
+    """Chave da placa: Mercosul convertida para o formato antigo ('ABC1C34' -> 'ABC1234')."""
+    plate = clean_plate(value)
+    if len(plate) >= 5 and plate[3].isdigit() and plate[4] in MERCOSUL_LETTERS:
+        plate = plate[:4] + str(MERCOSUL_LETTERS.index(plate[4])) + plate[5:]
+    return plate
+
+
+def clean_phone(value) -> str:
+    """Só os dígitos: '(11) 99999-8888' -> '11999998888'."""
+    return _NOT_DIGIT.sub("", _text(value))
+
+
+def phone_key(value) -> str:
+    """Chave do telefone: DDD + número, sem DDI 55 e sem zero de operadora."""
+    digits = clean_phone(value)
+    if len(digits) in (12, 13) and digits.startswith("55"):
+        return digits[2:]
+    return digits.lstrip("0")
+
+
+def _strip(column: str, characters) -> str:
+    expression = column
+    for character in characters:
+        expression = f"REPLACE({expression}, '{character}', '')"
+    return expression
+
+
+def _plate_key_sql(column: str) -> str:
+    plate = f"UPPER({_strip(f'TRIM({column})', '- ./')})"
+    return (
+        f"CASE WHEN substr({plate}, 4, 1) BETWEEN '0' AND '9' AND substr({plate}, 5, 1) BETWEEN 'A' AND 'J' "
+        f"THEN substr({plate}, 1, 4) || (unicode(substr({plate}, 5, 1)) - 65) || substr({plate}, 6) "
+        f"ELSE {plate} END"
+    )
+
+
+def _phone_key_sql(column: str) -> str:
+    digits = _strip(column, " -().+/")
+    return (
+        f"CASE WHEN length({digits}) IN (12, 13) AND substr({digits}, 1, 2) = '55' "
+        f"THEN substr({digits}, 3) ELSE ltrim({digits}, '0') END"
+    )
+
+
+# Expressões das colunas geradas (o SQLite não tem regex: tira os separadores comuns)
+PLATE_KEY_SQL = _plate_key_sql("car_plate")
+PHONE_KEY_SQL = _phone_key_sql("phone")
+
+
+def prefix_range(prefix: str):
+    """(início, fim) para `coluna >= início AND coluna < fim`: prefixo que usa o índice."""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
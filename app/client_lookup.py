@@ -0,0 +1,98 @@
+"""
+Busca de clientes para o seletor (typeahead) da nova OS e aviso de cadastro
+duplicado.
+
+A tela de OS listava todos os clientes num <select>. Agora o campo pede só
+as N primeiras sugestões enquanto o balconista digita a placa, o telefone ou
+o início do nome. Cada busca é uma faixa de índice (prefixo) sobre as
+chaves normalizadas de app/client_keys.py, então o custo não cresce com o
+cadastro: "abc1c" acha a ABC1C34 e a antiga ABC1234, "(11) 9999" acha
+"11 99998-8888" e "+55 11 999988888".
+"""
+import re
+
+from sqlalchemy import or_
+from sqlmodel import select
+
+from app import config
+from app.client_keys import clean_plate, phone_key, plate_key, prefix_range
+from app.models import Client
+
+# Texto que pode ser o começo de uma placa (antiga ou Mercosul)
+_PLATE_PREFIX = re.compile(r"^[A-Z]{1,3}$|^[A-Z]{3}[0-9]([A-Z0-9][0-9]{0,2})?$")
+_LETTER = re.compile(r"[^\W\d_]")
+# Curingas do LIKE não fazem sentido num nome digitado
+_LIKE_WILDCARDS = re.compile(r"[%_\\]")
+
+
+def _by_prefix(session, column, prefix: str, limit: int) -> list:
+    start, end = prefix_range(prefix)
+    return session.exec(
+        select(Client).where(column >= start, column < end).order_by(column).limit(limit)
+    ).all()
+
+
+def _by_name(session, name: str, limit: int) -> list:
+    # LIKE sem ESCAPE e ordenação NOCASE: o SQLite usa ix_client_name_nocase
+    return session.exec(
+        select(Client).where(Client.name.like(f"{name}%"))
+        .order_by(Client.name.collate("NOCASE")).limit(limit)
+    ).all()
+
+
+def lookup(session, term: str, limit: int = None) -> list:
+    """
+    Até `limit` clientes cuja placa, telefone ou nome começa com o texto
+    digitado (nessa ordem de prioridade). Sem texto: os cadastrados por último.
+    """
+    limit = limit or config.LOOKUP_LIMIT
+    term = " ".join(term.split())
+    if not term:
+        return session.exec(select(Client).order_by(Client.id.desc()).limit(limit)).all()
+
+    found = []
+    has_letters = bool(_LETTER.search(term))
+    if _PLATE_PREFIX.match(clean_plate(term)):
+        found += _by_prefix(session, Client.plate_key, plate_key(term), limit)
+    digits = phone_key(term)
+    if term.startswith("+55") and len(digits) < 12:
+        # Número ainda incompleto: só o "+" diz que o 55 é o DDI (e não o DDD 55)
+        digits = digits[2:]
+    if not has_letters and len(digits) >= 2:
+        found += _by_prefix(session, Client.phone_key, digits, limit)
+    name = _LIKE_WILDCARDS.sub("", term)
+    if has_letters and name:
+        found += _by_name(session, name, limit)
+
+    # O mesmo cliente pode casar por mais de um campo: fica a primeira ocorrência
+    unique = {}
+    for client in found:
+        unique.setdefault(client.id, client)
+    return list(unique.values())[:limit]
+
+
+def find_duplicates(session, phone: str, car_plate: str, limit: int = 5) -> list:
+    """
+    Clientes já cadastrados com a mesma placa ou o mesmo telefone (pelas
+    chaves normalizadas). Devolve [(cliente, [motivos])]; a mesma placa vem
+    primeiro (mesmo telefone sozinho pode ser uma frota da mesma empresa).
+    """
+    plate, digits = plate_key(car_plate), phone_key(phone)
+    conditions = []
+    if plate:
+        conditions.append(Client.plate_key == plate)
+    if digits:
+        conditions.append(Client.phone_key == digits)
+    if not conditions:
+        return []
+
+    matches = []
+    for client in session.exec(select(Client).where(or_(*conditions)).order_by(Client.id).limit(limit)).all():
+        reasons = []
+        if plate and client.plate_key == plate:
+            reasons.append("mesma placa")
+        if digits and client.phone_key == digits:
+            reasons.append("mesmo telefone")
+        matches.append((client, reasons))
+    return sorted(matches, key=lambda match: "mesma placa" not in match[1])
+
@@ -0,0 +1,128 @@
+"""
+Configurações da aplicação.
+Lidas de variáveis de ambiente (ou do arquivo .env na raiz do projeto).
+"""
+import os
+from dotenv import load_dotenv
+
+# Carrega variáveis de ambiente do arquivo .env
+load_dotenv()
+
+# Linhas por página nas listagens (Estoque, Clientes, OS)
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "50"))
+
+# --- IA (Gemini) ---
+# "gemini" usa a API real; "fake" usa um modelo local que simula latência (testes/benchmarks)
+AI_PROVIDER = os.getenv("AI_PROVIDER", "gemini")
+# gemini-flash-latest foi o confirmado como disponível
+AI_MODEL_NAME = os.getenv("AI_MODEL_NAME", "gemini-flash-latest")
+# Chamadas simultâneas ao modelo (tamanho do pool de threads)
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+# Pedidos aguardando vaga no pool; acima disso a chamada é recusada na hora
+AI_MAX_QUEUE = int(os.getenv("AI_MAX_QUEUE", "32"))
+# Tempo máximo (segundos) de cada chamada, incluindo a espera na fila
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", "30"))
+# Latência simulada (segundos) do modelo "fake"
+AI_FAKE_LATENCY = float(os.getenv("AI_FAKE_LATENCY", "0.5"))
+
+# --- Cache das respostas de IA ---
+# Validade (segundos) de uma análise/relatório em cache (padrão: 7 dias)
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", str(7 * 24 * 3600)))
+# Máximo de respostas guardadas; acima disso sai a menos usada recentemente
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "5000"))
+
+# --- Seletor de peças da OS (typeahead) ---
+# Máximo de sugestões por busca
+LOOKUP_LIMIT = int(os.getenv("LOOKUP_LIMIT", "10"))
+# Buscas guardadas no cache em memória e validade (segundos) de cada uma
+LOOKUP_CACHE_SIZE = int(os.getenv("LOOKUP_CACHE_SIZE", "256"))
+LOOKUP_CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL", "60"))
+# "Peças quentes" (campo vazio): mais vendidas nos últimos N dias, ranking refeito a cada N segundos
+LOOKUP_HOT_DAYS = int(os.getenv("LOOKUP_HOT_DAYS", "90"))
+LOOKUP_HOT_TTL = float(os.getenv("LOOKUP_HOT_TTL", "600"))
+
+# --- Análise de preço em lote ---
+# Peças enviadas em cada prompt
+AI_BATCH_SIZE = int(os.getenv("AI_BATCH_SIZE", "20"))
+# Limite de chamadas por minuto do job em lote (respeita a cota da API)
+AI_BATCH_CALLS_PER_MINUTE = float(os.getenv("AI_BATCH_CALLS_PER_MINUTE", "10"))
+# Tentativas por lote antes de marcar o job como falho
+AI_BATCH_RETRIES = int(os.getenv("AI_BATCH_RETRIES", "3"))
+
+# --- Importação em massa (CSV/XLSX) ---
+# Linhas por lote: cada lote é validado e gravado numa única transação
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+# Pasta onde os arquivos enviados ficam até o fim da importação
+IMPORT_DIR = os.getenv("IMPORT_DIR", "imports")
+# Erros por linha guardados no job (o total é sempre contado)
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
+# --- Exportações (CSV/JSON Lines/Parquet) ---
+# Linhas lidas do cursor e enviadas por vez
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+
+# --- Relatórios de vendas e margem ---
+# Validade (segundos) de um relatório em cache, mesmo sem mudança nos dados
+ANALYTICS_CACHE_TTL = int(os.getenv("ANALYTICS_CACHE_TTL", "300"))
+# Prazo de entrega do fornecedor e estoque desejado após a reposição (dias)
+REORDER_LEAD_DAYS = int(os.getenv("REORDER_LEAD_DAYS", "7"))
+REORDER_COVER_DAYS = int(os.getenv("REORDER_COVER_DAYS", "30"))
+
+# --- Impressão de OS em lote (PDF/ZIP) ---
+# Processos que geram os PDFs (0 = um por núcleo)
+PRINT_WORKERS = int(os.getenv("PRINT_WORKERS", "0"))
+# Documentos enviados a cada processo por tarefa
+PRINT_CHUNK_SIZE = int(os.getenv("PRINT_CHUNK_SIZE", "8"))
+# Máximo de OS por lote
+PRINT_MAX_ORDERS = int(os.getenv("PRINT_MAX_ORDERS", "2000"))
+# Pasta com os documentos já gerados das OS fechadas
+PRINT_CACHE_DIR = os.getenv("PRINT_CACHE_DIR", "print_cache")
+
+# --- Cache HTTP (ETag) ---
+# Por quanto tempo (s) o navegador reusa a impressão de uma OS fechada sem revalidar
+HTTP_CACHE_CLOSED_OS_MAX_AGE = int(os.getenv("HTTP_CACHE_CLOSED_OS_MAX_AGE", str(7 * 24 * 3600)))
+
+# --- Eventos ao vivo (SSE em /events) ---
+# "memory": só o worker atual; "sqlite": workers compartilham via tabela eventlog
+EVENTS_BROKER = os.getenv("EVENTS_BROKER", "memory")
+# Chaves diferentes pendentes por cliente antes de mandá-lo recarregar a página
+EVENTS_MAX_PENDING = int(os.getenv("EVENTS_MAX_PENDING", "500"))
+# Segundos sem eventos até mandar um comentário de keep-alive
+EVENTS_KEEPALIVE = float(os.getenv("EVENTS_KEEPALIVE", "15"))
+# Broker sqlite: intervalo de leitura do log e por quanto tempo (s) os eventos ficam nele
+EVENTS_POLL_INTERVAL = float(os.getenv("EVENTS_POLL_INTERVAL", "0.5"))
+EVENTS_LOG_RETENTION = float(os.getenv("EVENTS_LOG_RETENTION", "300"))
+
+# --- Métricas (/metrics) ---
+# "1" mede latência por rota, SQL e templates; "0" desliga o middleware
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Requisições mais lentas que isso (ms) vão para o log com o SQL mais demorado (0 = desligado)
+METRICS_SLOW_REQUEST_MS = float(os.getenv("METRICS_SLOW_REQUEST_MS", "1000"))
+
+# --- Banco de dados ---
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///oficina.db")
+# "tuned": WAL + pragmas de desempenho + fila única de escrita; "default": SQLite padrão
+DB_PROFILE = os.getenv("DB_PROFILE", "tuned")
+# Conexões mantidas abertas no pool (+ extras temporárias em picos)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "16"))
+# Espera máxima (ms) por um lock do SQLite antes de "database is locked"
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+# Cache de páginas por conexão (KiB) e tamanho do mapeamento em memória (bytes)
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "65536"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Como as rotas executam as consultas (ver app/database.py):
+#   "sync":   direto no event loop (uma consulta lenta segura todas as requisições)
+#   "thread": sessão síncrona, cada bloco de consultas no pool de threads
+#   "async":  SQLAlchemy asyncio + aiosqlite (pip install aiosqlite)
+DB_MODE = os.getenv("DB_MODE", "sync")
+
+# --- Arquivo de OS antigas (ver app/archive.py) ---
+# OS fechadas criadas há mais que isso (dias) saem das tabelas quentes
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+# Banco do arquivo (padrão: ao lado do principal, "<nome>_archive.db")
+ARCHIVE_DATABASE_PATH = os.getenv("ARCHIVE_DATABASE_PATH", "")
+# OS movidas por transação (a fila de escrita é liberada entre lotes)
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+# Intervalo (horas) entre rodadas automáticas no servidor (0 = só pela linha de comando)
+ARCHIVE_INTERVAL_HOURS = float(os.getenv("ARCHIVE_INTERVAL_HOURS", "24"))
@@ -0,0 +1,134 @@
+"""
+Contadores do Dashboard mantidos incrementalmente.
+
+Em vez de varrer `inventoryitem` e `serviceorder` a cada acesso à página
+inicial, os valores ficam na tabela `dashboardstats` (linha única, id=1) e
+são atualizados por triggers do SQLite dentro da mesma transação de cada
+escrita (add_item, update_item, delete_item, add_os_item, delete_os_item,
+create_os, close_os...). Assim a rota "/" lê apenas uma linha.
+
+Uso pela linha de comando para recalcular tudo do zero:
+    python -m app.dashboard
+"""
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.models import DashboardStats, ServiceOrderStatus
+
+STATS_ID = 1
+
+# O Enum é gravado pelo nome (ex: 'OPEN'), não pelo valor
+_OPEN = ServiceOrderStatus.OPEN.name
+
+TRIGGERS = [
+    # --- Estoque ---
+    """
+    CREATE TRIGGER IF NOT EXISTS dashboard_inventory_insert
+    AFTER INSERT ON inventoryitem BEGIN
+        UPDATE dashboardstats SET
+            total_inventory_value = total_inventory_value + NEW.cost_price * NEW.quantity,
+            low_stock_count = low_stock_count + (NEW.quantity <= NEW.min_quantity)
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS dashboard_inventory_update
+    AFTER UPDATE OF cost_price, quantity, min_quantity ON inventoryitem BEGIN
+        UPDATE dashboardstats SET
+            total_inventory_value = total_inventory_value
+                + NEW.cost_price * NEW.quantity - OLD.cost_price * OLD.quantity,
+            low_stock_count = low_stock_count
+                + (NEW.quantity <= NEW.min_quantity) - (OLD.quantity <= OLD.min_quantity)
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS dashboard_inventory_delete
+    AFTER DELETE ON inventoryitem BEGIN
+        UPDATE dashboardstats SET
+            total_inventory_value = total_inventory_value - OLD.cost_price * OLD.quantity,
+            low_stock_count = low_stock_count - (OLD.quantity <= OLD.min_quantity)
+        WHERE id = 1;
+    END
+    """,
+    # --- Ordens de Serviço ---
+    f"""
+    CREATE TRIGGER IF NOT EXISTS dashboard_os_insert
+    AFTER INSERT ON serviceorder BEGIN
+        UPDATE dashboardstats SET open_os_count = open_os_count + (NEW.status = '{_OPEN}')
+        WHERE id = 1;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS dashboard_os_update
+    AFTER UPDATE OF status ON serviceorder BEGIN
+        UPDATE dashboardstats SET
+            open_os_count = open_os_count + (NEW.status = '{_OPEN}') - (OLD.status = '{_OPEN}')
+        WHERE id = 1;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS dashboard_os_delete
+    AFTER DELETE ON serviceorder BEGIN
+        UPDATE dashboardstats SET open_os_count = open_os_count - (OLD.status = '{_OPEN}')
+        WHERE id = 1;
+    END
+    """,
+]
+
+RECONCILE_SQL = f"""
+    UPDATE dashboardstats SET
+        total_inventory_value = (SELECT COALESCE(SUM(cost_price * quantity), 0) FROM inventoryitem),
+        low_stock_count = (SELECT COUNT(*) FROM inventoryitem WHERE quantity <= min_quantity),
+        open_os_count = (SELECT COUNT(*) FROM serviceorder WHERE status = '{_OPEN}')
+    WHERE id = 1
+"""
+
+
+def install(engine):
+    """
+    Cria os triggers e a linha de contadores (se ainda não existirem).
+    Na primeira instalação os valores são calculados a partir das tabelas.
+    """
+    with engine.begin() as conn:
+        for ddl in TRIGGERS:
+            conn.execute(text(ddl))
+        created = conn.execute(
+            text("INSERT OR IGNORE INTO dashboardstats (id, total_inventory_value, low_stock_count, open_os_count) "
+                 "VALUES (:id, 0, 0, 0)"),
+            {"id": STATS_ID},
+        ).rowcount
+        if created:
+            conn.execute(text(RECONCILE_SQL))
+
+
+def get_stats(session: Session) -> DashboardStats:
+    """Lê os contadores atuais (consulta de uma única linha pela PK)."""
+    stats = session.get(DashboardStats, STATS_ID)
+    if stats is None:
+        # Banco criado sem passar pelo install(): devolve zeros em vez de quebrar a página
+        stats = DashboardStats(id=STATS_ID)
+    return stats
+
+
+def reconcile(session: Session) -> DashboardStats:
+    """
+    Recalcula todos os contadores do zero a partir das tabelas.
+    Útil após importações manuais no banco ou para corrigir arredondamentos.
+    """
+    session.execute(text(RECONCILE_SQL))
+    session.commit()
+    stats = session.get(DashboardStats, STATS_ID)
+    session.refresh(stats)
+    return stats
+
+
+if __name__ == "__main__":
+    from app.database import create_db_and_tables, engine
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        stats = reconcile(session)
+        print(f"Valor em estoque (custo): R$ {stats.total_inventory_value:.2f}")
+        print(f"Itens com estoque baixo:  {stats.low_stock_count}")
+        print(f"OS abertas:               {stats.open_os_count}")
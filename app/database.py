@@ -1,20 +1,151 @@
+import threading
+from contextlib import contextmanager
+
+import anyio
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlmodel import SQLModel, create_engine, Session
+from starlette.concurrency import run_in_threadpool
 from app.models import *
+from app import analytics, archive, config, dashboard, http_cache, inventory_search, metrics, migrations
+
+# Perfis de engine (DB_PROFILE):
+#   "default": SQLite como vem (journal de rollback, synchronous=FULL)
+#   "tuned":   WAL (leitores não esperam escritores), synchronous=NORMAL,
+#              cache/mmap maiores, busy_timeout e fila única de escrita
+PROFILE_DEFAULT = "default"
+PROFILE_TUNED = "tuned"
+
+# Modos de execução das consultas nas rotas (DB_MODE, ver RequestDB)
+MODE_SYNC = "sync"
+MODE_THREAD = "thread"
+MODE_ASYNC = "async"
+MODES = (MODE_SYNC, MODE_THREAD, MODE_ASYNC)
+
+def _tuned_pragmas():
+    return {
+        "journal_mode": "WAL",
+        # Seguro em WAL: só as últimas transações podem se perder numa queda de energia
+        "synchronous": "NORMAL",
+        "busy_timeout": config.DB_BUSY_TIMEOUT_MS,
+        # Valor negativo = tamanho em KiB
+        "cache_size": -config.DB_CACHE_SIZE_KB,
+        "mmap_size": config.DB_MMAP_SIZE,
+        "temp_store": "MEMORY",
+    }
+
+def build_engine(url=None, profile=None):
+    """
+    Cria a engine do SQLite conforme o perfil.
+    No perfil "tuned" os PRAGMAs são aplicados em toda conexão nova do pool.
+    Toda conexão anexa o banco de arquivo das OS antigas (app/archive.py).
+    """
+    url = url or config.DATABASE_URL
+    profile = profile or config.DB_PROFILE
+    # Configurações para SQLite (necessário para evitar erros de thread em alguns casos)
+    connect_args = {"check_same_thread": False}
+
+    if profile != PROFILE_TUNED:
+        new_engine = create_engine(url, connect_args=connect_args)
+        archive.attach(new_engine, url)
+        return new_engine
+
+    connect_args["timeout"] = config.DB_BUSY_TIMEOUT_MS / 1000
+    new_engine = create_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+    )
+    # Antes dos PRAGMAs: o journal_mode vale também para o arquivo anexado
+    archive.attach(new_engine, url)
+    _apply_tuned_pragmas(new_engine)
+    return new_engine
+
+def _apply_tuned_pragmas(sync_engine):
+    pragmas = _tuned_pragmas()
+
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def build_async_engine(url=None, profile=None):
+    """
+    Engine asyncio (aiosqlite) sobre o mesmo banco e com o mesmo perfil.
+    O aiosqlite é opcional: só o modo "async" precisa dele.
+    """
+    try:
+        import aiosqlite  # noqa: F401
+    except ImportError:
+        raise RuntimeError("DB_MODE=async requer o aiosqlite (pip install aiosqlite)")
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = url or config.DATABASE_URL
+    async_url = make_url(url).set(drivername="sqlite+aiosqlite")
+    profile = profile or config.DB_PROFILE
+    if profile != PROFILE_TUNED:
+        new_engine = create_async_engine(async_url)
+        archive.attach(new_engine.sync_engine, url)
+        return new_engine
+
+    new_engine = create_async_engine(
+        async_url,
+        connect_args={"timeout": config.DB_BUSY_TIMEOUT_MS / 1000},
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+    )
+    # Eventos de conexão e de SQL ficam na engine síncrona por baixo
+    archive.attach(new_engine.sync_engine, url)
+    _apply_tuned_pragmas(new_engine.sync_engine)
+    return new_engine
+
+if config.DB_MODE not in MODES:
+    raise ValueError(f"DB_MODE desconhecido: {config.DB_MODE!r} (opções: {', '.join(MODES)})")
+
+engine = build_engine()
+# As rotas usam a engine asyncio só no modo "async"; jobs, importações,
+# exportações e migrações continuam na engine síncrona
+async_engine = build_async_engine() if config.DB_MODE == MODE_ASYNC else None
+if config.METRICS_ENABLED:
+    # Quantidade e tempo de SQL por requisição e por tipo de instrução (/metrics)
+    metrics.instrument_engine(engine)
+    if async_engine is not None:
+        metrics.instrument_engine(async_engine.sync_engine)
 
-# Nome do arquivo do banco de dados SQLite
-sqlite_file_name = "oficina.db"
-sqlite_url = f"sqlite:///{sqlite_file_name}"
+# Fila única de escrita: no SQLite só existe um escritor por vez, então as
+# transações de escrita do processo esperam aqui em vez de disputar o lock
+# do arquivo (e estourar "database is locked"). Leituras não passam por ela.
+_write_lock = threading.Lock()
 
-# Configurações para SQLite (necessário para evitar erros de thread em alguns casos)
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
+@contextmanager
+def writer_lane():
+    """Serializa um trecho de escrita (uso em threads/tarefas de fundo)."""
+    with _write_lock:
+        yield
 
-def create_db_and_tables():
+def create_db_and_tables(target=None):
     """
     Cria o banco de dados e todas as tabelas definidas nos modelos.
-    Deve ser chamado na inicialização da aplicação.
+    Deve ser chamado na inicialização da aplicação. `target` permite
+    preparar outra engine (ex.: banco gerado pelos benchmarks).
     """
-    SQLModel.metadata.create_all(engine)
+    target = target or engine
+    SQLModel.metadata.create_all(target)
+    # Leva bancos existentes até a versão atual do esquema (índices, colunas novas...)
+    migrations.migrate(target)
+    # Tabelas do banco de arquivo (OS antigas), antes dos relatórios que também as leem
+    archive.install(target)
+    # Triggers que mantêm os contadores do Dashboard atualizados
+    dashboard.install(target)
+    # Índice FTS5 da busca de estoque
+    inventory_search.install(target)
+    # Vendas por dia e peça (Relatórios)
+    analytics.install(target)
+    # Versões de linha e de tabela (ETag das telas)
+    http_cache.install(target)
 
 def get_session():
     """
@@ -23,3 +154,99 @@ def get_session():
     """
     with Session(engine) as session:
         yield session
+
+async def _acquire_write_lock():
+    # Protegido contra cancelamento: se a thread conseguir o lock, ele é sempre liberado
+    with anyio.CancelScope(shield=True):
+        await anyio.to_thread.run_sync(_write_lock.acquire)
+
+async def get_write_session():
+    """
+    Dependência para rotas que escrevem no banco.
+    Entra na fila única de escrita antes de abrir a sessão; a espera
+    acontece numa thread, sem travar o event loop.
+    """
+    await _acquire_write_lock()
+    try:
+        with Session(engine) as session:
+            yield session
+    finally:
+        _write_lock.release()
+
+class RequestDB:
+    """
+    Banco de uma requisição, do jeito escolhido em DB_MODE.
+
+    As rotas agrupam as consultas em funções síncronas `fn(session, ...)`
+    (as mesmas de app/stock.py, app/os_view.py etc.) e fazem
+    `await db.run(fn, ...)`:
+      - sync:   fn roda direto no event loop (comportamento original);
+      - thread: fn roda no pool de threads, com a sessão síncrona;
+      - async:  AsyncSession.run_sync: fn recebe uma sessão síncrona, mas
+                cada consulta espera o aiosqlite sem travar o event loop.
+    Blocos pesados em CPU (pandas, lotes de impressão) usam `offload`,
+    que roda sempre no pool de threads.
+    A sessão não expira os objetos no commit: o que `fn` devolve pode ir
+    direto para o template, sem nova consulta fora de `run`.
+    """
+
+    def __init__(self, mode=None):
+        self.mode = mode or config.DB_MODE
+        # A sessão síncrona só pega uma conexão na primeira consulta
+        self.session = Session(engine, expire_on_commit=False)
+        self._async_session = None
+        if self.mode == MODE_ASYNC:
+            from sqlmodel.ext.asyncio.session import AsyncSession
+
+            self._async_session = AsyncSession(async_engine, expire_on_commit=False)
+
+    async def run(self, fn, *args):
+        """Executa `fn(session, *args)` e devolve o resultado."""
+        if self.mode == MODE_ASYNC:
+            return await self._async_session.run_sync(fn, *args)
+        if self.mode == MODE_THREAD:
+            return await run_in_threadpool(fn, self.session, *args)
+        return fn(self.session, *args)
+
+    async def offload(self, fn, *args):
+        """Como `run`, mas sempre numa thread e com a sessão síncrona (em qualquer modo)."""
+        return await run_in_threadpool(fn, self.session, *args)
+
+    async def get(self, model, ident):
+        return await self.run(lambda session: session.get(model, ident))
+
+    async def rollback(self):
+        await self.run(lambda session: session.rollback())
+
+    async def close(self):
+        if self._async_session is not None:
+            await self._async_session.close()
+        if self.mode == MODE_THREAD:
+            await run_in_threadpool(self.session.close)
+        else:
+            self.session.close()
+
+async def get_db():
+    """Dependência das rotas de leitura (ver RequestDB)."""
+    db = RequestDB()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+async def get_write_db():
+    """Dependência das rotas que escrevem: RequestDB dentro da fila única de escrita."""
+    await _acquire_write_lock()
+    try:
+        db = RequestDB()
+        try:
+            yield db
+        finally:
+            await db.close()
+    finally:
+        _write_lock.release()
+
+async def dispose_async_engine():
+    """Fecha as conexões do aiosqlite (shutdown); nada a fazer nos outros modos."""
+    if async_engine is not None:
+        await async_engine.dispose()
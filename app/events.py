@@ -0,0 +1,328 @@
+"""
+Eventos ao vivo (pub/sub) para as telas abertas, entregues por SSE (/events).
+
+As rotas de escrita publicam chaves do que mudou, depois do commit:
+  - "inventory:<id>"  linha do estoque (venda, estorno, edição, exclusão);
+  - "os:<id>"         itens e total de uma OS;
+  - "dashboard"       contadores do painel;
+  - "inventory"       a lista do estoque (peça nova, importação): as telas
+                      do estoque recarregam, já que a linha nova não existe
+                      nelas e a ordem/paginação muda;
+  - "clients"         a lista de clientes (importação).
+Cada navegador conectado assina tópicos ("inventory", "os:5", "dashboard")
+e recebe o fragmento HTML atual de cada chave, renderizado na hora do envio
+(ver `live_fragment` em app/main.py). O evento diz só "mudou"; o conteúdo
+vem do banco, então nunca chega um estado velho.
+
+Contrapressão: cada assinatura guarda as chaves pendentes sem repetição.
+Um cliente lento que recebe 50 vendas da mesma peça recebe a linha uma vez,
+com o estado final. Se acumular mais de EVENTS_MAX_PENDING chaves
+diferentes (ex.: uma importação), as pendências são descartadas e o
+cliente recebe "resync" e recarrega a página.
+
+Brokers (EVENTS_BROKER):
+  - "memory": só o processo atual (um worker do uvicorn);
+  - "sqlite": os eventos também vão para a tabela `eventlog` do próprio
+    banco, que cada worker lê a cada EVENTS_POLL_INTERVAL. Assim vários
+    workers compartilham os eventos sem serviço externo. Os eventos do
+    próprio worker são entregues na hora e ignorados na leitura. A
+    gravação no log vai para uma thread própria (em ordem, pela fila única
+    de escrita): `publish` nunca espera o banco, nem no event loop.
+"""
+import asyncio
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from starlette.responses import StreamingResponse
+
+from app import config
+
+BROKER_MEMORY = "memory"
+BROKER_SQLITE = "sqlite"
+
+# Pendências descartadas: o cliente precisa recarregar a página
+RESYNC = "resync"
+RELOAD_HTML = "<script>location.reload()</script>"
+
+_POLL_BATCH = 1000
+_PRUNE_EVERY = 60.0
+
+
+def topic_matches(topics, key: str) -> bool:
+    """"inventory" assina todas as "inventory:<id>"; "os:5" só a OS 5."""
+    return key in topics or key.split(":", 1)[0] in topics
+
+
+def format_sse(event: str, data: str) -> str:
+    """Mensagem SSE; cada linha do HTML vira uma linha `data:`."""
+    lines = "".join(f"data: {line}\n" for line in data.splitlines() or [""])
+    return f"event: {event}\n{lines}\n"
+
+
+class Subscription:
+    """Chaves pendentes de um cliente conectado (usada só no event loop)."""
+
+    def __init__(self, bus, topics, max_pending):
+        self.bus = bus
+        self.topics = frozenset(topics)
+        self.max_pending = max_pending
+        # dict como conjunto ordenado: a mesma chave não entra duas vezes
+        self._pending = {}
+        self._ready = asyncio.Event()
+
+    def push(self, key: str):
+        if RESYNC in self._pending or key in self._pending:
+            self.bus.coalesced += 1
+            return
+        if len(self._pending) >= self.max_pending:
+            self._pending.clear()
+            self._pending[RESYNC] = None
+            self.bus.resyncs += 1
+        else:
+            self._pending[key] = None
+        self._ready.set()
+
+    async def next_batch(self, timeout: float) -> list:
+        """Chaves pendentes (todas de uma vez) ou [] se nada mudou em `timeout` segundos."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        batch = list(self._pending)
+        self._pending.clear()
+        return batch
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class SQLiteBroker:
+    """Log de eventos na tabela `eventlog`, lido por todos os workers."""
+
+    def __init__(self, engine, origin):
+        self.engine = engine
+        self.origin = origin
+
+    def append(self, keys):
+        from app.database import writer_lane
+
+        with writer_lane(), self.engine.begin() as conn:
+            conn.execute(
+                text("INSERT INTO eventlog (topic, origin, created_at) VALUES (:topic, :origin, :created_at)"),
+                [{"topic": key, "origin": self.origin, "created_at": datetime.now()} for key in keys],
+            )
+
+    def last_id(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM eventlog")).scalar()
+
+    def read_after(self, last_id: int) -> list:
+        """[(id, chave, origem)] depois de `last_id`."""
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text("SELECT id, topic, origin FROM eventlog WHERE id > :last ORDER BY id LIMIT :limit"),
+                {"last": last_id, "limit": _POLL_BATCH},
+            ).all()
+
+    def prune(self, retention: float):
+        from app.database import writer_lane
+
+        with writer_lane(), self.engine.begin() as conn:
+            conn.execute(
+                text("DELETE FROM eventlog WHERE created_at < :cutoff"),
+                {"cutoff": datetime.now() - timedelta(seconds=retention)},
+            )
+
+
+class EventBus:
+    """
+    Distribui as chaves publicadas às assinaturas do processo.
+    `publish` pode ser chamado de qualquer thread; a entrega acontece no
+    event loop (as assinaturas só são tocadas nele).
+    """
+
+    def __init__(self, max_pending=500, broker=None):
+        self.max_pending = max_pending
+        self.broker = broker
+        self._subscribers = set()
+        self._loop = None
+        self._poller = None
+        # Uma thread grava no log, na ordem de publicação (criada no primeiro evento)
+        self._appender = None
+        # Métricas
+        self._lock = threading.Lock()
+        self.published = 0
+        self.received = 0
+        self.coalesced = 0
+        self.resyncs = 0
+        self.broker_errors = 0
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def start(self):
+        """Liga o bus ao event loop atual (startup) e inicia a leitura do broker."""
+        self._loop = asyncio.get_running_loop()
+        if self.broker is not None:
+            self._poller = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+        self._loop = None
+        with self._lock:
+            appender, self._appender = self._appender, None
+        if appender is not None:
+            # Grava o que ainda está na fila antes de sair
+            await asyncio.to_thread(appender.shutdown, wait=True)
+
+    def subscribe(self, topics) -> Subscription:
+        subscription = Subscription(self, topics, self.max_pending)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    def publish(self, *keys):
+        """Avisa que `keys` mudaram (chamar depois do commit)."""
+        keys = [key for key in keys if key]
+        if not keys:
+            return
+        with self._lock:
+            self.published += len(keys)
+            if self.broker is not None and self._appender is None:
+                self._appender = ThreadPoolExecutor(max_workers=1, thread_name_prefix="eventlog")
+            appender = self._appender
+        if appender is not None:
+            # Sem esperar: a rota (no event loop) ou a thread que publica pode
+            # estar com a fila de escrita, que a gravação no log também usa
+            appender.submit(self._append, keys)
+        self._deliver(keys)
+
+    def _append(self, keys):
+        try:
+            self.broker.append(keys)
+        except Exception as e:
+            # O aviso às outras telas não pode derrubar a escrita que já foi gravada
+            with self._lock:
+                self.broker_errors += 1
+            print(f"ALERTA: evento não gravado no log ({e})")
+
+    def _deliver(self, keys):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._dispatch(keys)
+        else:
+            loop.call_soon_threadsafe(self._dispatch, keys)
+
+    def _dispatch(self, keys):
+        for subscription in list(self._subscribers):
+            for key in keys:
+                if topic_matches(subscription.topics, key):
+                    subscription.push(key)
+
+    async def _poll(self):
+        """Lê os eventos dos outros workers no `eventlog` (broker sqlite)."""
+        last_id = await asyncio.to_thread(self.broker.last_id)
+        since_prune = 0.0
+        while True:
+            await asyncio.sleep(config.EVENTS_POLL_INTERVAL)
+            try:
+                rows = await asyncio.to_thread(self.broker.read_after, last_id)
+                since_prune += config.EVENTS_POLL_INTERVAL
+                if since_prune >= _PRUNE_EVERY:
+                    since_prune = 0.0
+                    await asyncio.to_thread(self.broker.prune, config.EVENTS_LOG_RETENTION)
+            except Exception as e:
+                with self._lock:
+                    self.broker_errors += 1
+                print(f"ALERTA: falha ao ler o log de eventos ({e})")
+                continue
+            if not rows:
+                continue
+            last_id = rows[-1][0]
+            keys = [key for _, key, origin in rows if origin != self.broker.origin]
+            self.received += len(keys)
+            if keys:
+                self._dispatch(keys)
+
+    def metrics(self) -> dict:
+        return {
+            "subscribers": self.subscribers,
+            "published": self.published,
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "resyncs": self.resyncs,
+            "broker_errors": self.broker_errors,
+        }
+
+
+def create_bus(engine) -> EventBus:
+    """Bus do processo com o broker configurado (EVENTS_BROKER)."""
+    broker = None
+    if config.EVENTS_BROKER == BROKER_SQLITE:
+        broker = SQLiteBroker(engine, f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+    elif config.EVENTS_BROKER != BROKER_MEMORY:
+        raise ValueError(f"EVENTS_BROKER desconhecido: {config.EVENTS_BROKER!r} (opções: memory, sqlite)")
+    return EventBus(max_pending=config.EVENTS_MAX_PENDING, broker=broker)
+
+
+async def stream(subscription: Subscription, render):
+    """
+    Corpo da resposta SSE. `render(chave)` (síncrona, roda numa thread)
+    devolve (evento, html) ou None. Comentários periódicos mantêm a conexão
+    viva atrás de proxies e revelam clientes que já saíram.
+    """
+    yield "retry: 3000\n\n"
+    while True:
+        batch = await subscription.next_batch(config.EVENTS_KEEPALIVE)
+        if not batch:
+            yield ": ping\n\n"
+            continue
+        for key in batch:
+            if key == RESYNC:
+                yield format_sse(RESYNC, RELOAD_HTML)
+                continue
+            fragment = await asyncio.to_thread(render, key)
+            if fragment is not None:
+                yield format_sse(*fragment)
+
+
+class EventStreamResponse(StreamingResponse):
+    """
+    Resposta SSE de uma assinatura. A assinatura é encerrada quando a
+    resposta termina por qualquer motivo (inclusive o cliente desconectar
+    no meio de um envio, quando o gerador fica suspenso sem ser fechado).
+    """
+
+    def __init__(self, subscription: Subscription, render):
+        super().__init__(stream(subscription, render), media_type="text/event-stream", headers={
+            "Cache-Control": "no-cache",
+            # Sem buffer em proxies (nginx)
+            "X-Accel-Buffering": "no",
+        })
+        self.subscription = subscription
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.subscription.close()
@@ -0,0 +1,263 @@
+"""
+Exportação dos dados (Estoque, OS e itens vendidos) para a contabilidade.
+
+Os arquivos são gerados enquanto são baixados: as linhas vêm de um cursor
+do banco em blocos de EXPORT_BATCH_SIZE (`yield_per`), cada bloco é
+convertido e enviado, e nada além do bloco atual fica na memória,
+qualquer que seja o período pedido.
+
+Formatos: CSV (UTF-8 com BOM, abre direto no Excel), JSON Lines e Parquet
+(requer pyarrow; cada bloco vira um row group). CSV e JSON Lines podem
+ser comprimidos em gzip durante o envio (.gz); o Parquet já é comprimido
+internamente.
+
+Uso pela linha de comando:
+    python -m app.exports sales --start 2024-01-01 --end 2024-01-31 -o vendas_jan.csv.gz
+    python -m app.exports orders --format parquet -o os.parquet
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import date, datetime, timedelta
+from enum import Enum
+
+from sqlalchemy import Boolean, Float, Integer, Numeric, func, select, union_all
+from sqlmodel import Session
+
+from app import archive, config
+from app.models import Client, InventoryItem, ServiceOrder, ServiceOrderItem
+from app.os_view import DELETED_PART
+
+FORMAT_CSV = "csv"
+FORMAT_JSONL = "jsonl"
+FORMAT_PARQUET = "parquet"
+
+MEDIA_TYPES = {
+    FORMAT_CSV: "text/csv; charset=utf-8",
+    FORMAT_JSONL: "application/x-ndjson",
+    FORMAT_PARQUET: "application/vnd.apache.parquet",
+}
+
+
+class ExportError(Exception):
+    """Conjunto de dados ou formato inválido (ou dependência ausente)."""
+
+
+def _inventory_query():
+    return select(
+        InventoryItem.id, InventoryItem.name, InventoryItem.category, InventoryItem.cost_price,
+        InventoryItem.sell_price, InventoryItem.quantity, InventoryItem.min_quantity, InventoryItem.location,
+    ).order_by(InventoryItem.id)
+
+
+def _orders_query(orders, lines):
+    return (
+        select(
+            orders.c.id.label("os_id"), orders.c.created_at, orders.c.status, orders.c.total_value,
+            Client.id.label("client_id"), Client.name.label("client_name"), Client.phone.label("client_phone"),
+            Client.car_model, Client.car_plate,
+        )
+        .join(Client, Client.id == orders.c.client_id)
+    )
+
+
+def _sales_query(orders, lines):
+    # Peça excluída depois da venda: a linha continua (o total bate com a OS), sem categoria e custo
+    return (
+        select(
+            lines.c.id.label("line_id"), orders.c.id.label("os_id"),
+            orders.c.created_at.label("os_created_at"), orders.c.status.label("os_status"),
+            Client.name.label("client_name"), Client.car_plate,
+            lines.c.item_id, func.coalesce(InventoryItem.name, DELETED_PART).label("item_name"), InventoryItem.category,
+            lines.c.quantity_sold, lines.c.price_at_moment,
+            (lines.c.quantity_sold * lines.c.price_at_moment).label("subtotal"),
+            InventoryItem.cost_price,
+        )
+        .select_from(lines)
+        .join(orders, orders.c.id == lines.c.order_id)
+        .join(Client, Client.id == orders.c.client_id)
+        .outerjoin(InventoryItem, InventoryItem.id == lines.c.item_id)
+    )
+
+
+# nome -> (consulta, ordem, vem das OS: filtro de período e OS arquivadas)
+DATASETS = {
+    "inventory": (_inventory_query, None, False),
+    "orders": (_orders_query, "os_id", True),
+    "sales": (_sales_query, "line_id", True),
+}
+
+
+def build_query(dataset: str, start: date = None, end: date = None, sources=None):
+    """
+    Consulta do conjunto de dados; `end` é inclusivo (o dia inteiro entra).
+    `sources`: pares (OS, itens) a juntar (ver archive.sources); padrão: só as tabelas quentes.
+    """
+    if dataset not in DATASETS:
+        raise ExportError(f"Exportação desconhecida: {dataset}")
+    factory, order_by, dated = DATASETS[dataset]
+    if not dated:
+        return factory()
+
+    parts = []
+    for orders, lines in sources or [(ServiceOrder.__table__, ServiceOrderItem.__table__)]:
+        query = factory(orders, lines)
+        if start:
+            query = query.where(orders.c.created_at >= datetime.combine(start, datetime.min.time()))
+        if end:
+            query = query.where(orders.c.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+        parts.append(query)
+    return (parts[0] if len(parts) == 1 else union_all(*parts)).order_by(order_by)
+
+
+def _plain(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    return value
+
+
+def _batches(session: Session, query, batch_size: int):
+    """Blocos de linhas (listas de tuplas) lidos com cursor no servidor."""
+    result = session.execute(query.execution_options(yield_per=batch_size))
+    columns = list(result.keys())
+    empty = True
+    for partition in result.partitions():
+        empty = False
+        yield columns, [tuple(_plain(value) for value in row) for row in partition]
+    if empty:
+        # Período sem dados: o arquivo sai só com o cabeçalho
+        yield columns, []
+
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header_written = False
+    for columns, rows in batches:
+        if not header_written:
+            buffer.write("\ufeff")  # BOM: o Excel reconhece UTF-8
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _jsonl_chunks(batches):
+    for columns, rows in batches:
+        lines = (json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str) for row in rows)
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _arrow_schema(query):
+    """
+    Schema do Parquet a partir dos tipos das colunas da consulta (e não do
+    primeiro bloco: uma coluna só com nulos nele seria tipada como `null`).
+    Datas e enums saem como texto, como nos outros formatos (ver _plain).
+    """
+    import pyarrow as pa
+
+    def arrow_type(sql_type):
+        if isinstance(sql_type, Boolean):
+            return pa.bool_()
+        if isinstance(sql_type, Integer):
+            return pa.int64()
+        if isinstance(sql_type, (Float, Numeric)):
+            return pa.float64()
+        return pa.string()
+
+    return pa.schema([(column.name, arrow_type(column.type)) for column in query.selected_columns])
+
+
+def _parquet_chunks(batches, schema):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = io.BytesIO()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    for columns, rows in batches:
+        writer.write_table(pa.Table.from_pylist([dict(zip(columns, row)) for row in rows], schema=schema))
+        # O ParquetWriter escreve sequencialmente: o que já está no buffer pode ser enviado
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+
+_ENCODERS = {FORMAT_CSV: _csv_chunks, FORMAT_JSONL: _jsonl_chunks, FORMAT_PARQUET: _parquet_chunks}
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: formato gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def check_format(fmt: str, gzip: bool = False):
+    if fmt not in _ENCODERS:
+        raise ExportError(f"Formato desconhecido: {fmt}")
+    if gzip and fmt == FORMAT_PARQUET:
+        raise ExportError("O Parquet já é comprimido; gzip vale só para CSV e JSON Lines")
+    if fmt == FORMAT_PARQUET:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportError("Exportar em Parquet requer o pyarrow (pip install pyarrow)")
+
+
+def filename(dataset: str, fmt: str, start: date = None, end: date = None, gzip: bool = False) -> str:
+    period = "_".join(d.isoformat() for d in (start, end) if d)
+    name = f"{dataset}_{period}" if period else dataset
+    return f"{name}.{fmt}" + (".gz" if gzip else "")
+
+
+def stream(session: Session, dataset: str, fmt: str, start: date = None, end: date = None,
+           gzip: bool = False, batch_size: int = None):
+    """
+    Valida conjunto de dados e formato já na chamada (levanta ExportError
+    antes de qualquer byte ser enviado) e devolve um gerador com os bytes
+    do arquivo. A consulta só roda quando o gerador é consumido.
+    """
+    check_format(fmt, gzip)
+    # OS já arquivadas (app/archive.py) também vão para a contabilidade
+    query = build_query(dataset, start, end, archive.sources(session.connection()))
+    batches = _batches(session, query, batch_size or config.EXPORT_BATCH_SIZE)
+    if fmt == FORMAT_PARQUET:
+        chunks = _parquet_chunks(batches, _arrow_schema(query))
+    else:
+        chunks = _ENCODERS[fmt](batches)
+    return _gzip(chunks) if gzip else chunks
+
+
+if __name__ == "__main__":
+    from app.database import engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("--format", default=FORMAT_CSV, choices=sorted(_ENCODERS))
+    parser.add_argument("--start", type=date.fromisoformat)
+    parser.add_argument("--end", type=date.fromisoformat)
+    parser.add_argument("--gzip", action="store_true", help="implícito se a saída terminar em .gz")
+    parser.add_argument("-o", "--output", help="arquivo de saída (padrão: nome gerado)")
+    args = parser.parse_args()
+
+    gzip = args.gzip or bool(args.output and args.output.endswith(".gz"))
+    output = args.output or filename(args.dataset, args.format, args.start, args.end, gzip)
+    try:
+        with Session(engine) as session, open(output, "wb") as out:
+            for chunk in stream(session, args.dataset, args.format, args.start, args.end, gzip):
+                out.write(chunk)
+    except ExportError as e:
+        print(e)
+        sys.exit(1)
+    print(f"Exportado: {output}")
@@ -0,0 +1,163 @@
+"""
+Cache HTTP (ETag / If-None-Match) das telas e partials do HTMX.
+
+O HTMX busca de novo as mesmas linhas e páginas o tempo todo. Em vez de
+consultar e renderizar tudo a cada vez, cada resposta leva um ETag
+calculado a partir de versões mantidas pelo próprio SQLite:
+
+  - versão da linha: coluna `version` em `inventoryitem`, `serviceorder` e
+    `client`, somada em 1 por trigger a cada UPDATE (inclusive os UPDATEs
+    atômicos de estoque e os das importações). Lançar ou estornar itens
+    também soma na versão da OS;
+  - versão da tabela: contador por tabela em `tableversion`, somado a cada
+    INSERT/UPDATE/DELETE, para as listas (estoque, clientes, OS).
+
+Se o navegador manda If-None-Match com o mesmo ETag, a rota responde 304
+depois de ler só as versões, sem a consulta da página e sem renderizar.
+O ETag inclui um hash dos templates, então muda também a cada deploy que
+altera o HTML. As respostas variam com o cabeçalho HX-Request (partial ou
+página inteira), daí o `Vary`.
+"""
+import hashlib
+import os
+
+from fastapi import Request, Response
+from sqlalchemy import bindparam, text
+
+from app import archive, config
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+# Tabelas com coluna `version` mantida por trigger
+VERSIONED_TABLES = ("inventoryitem", "serviceorder", "client")
+# Tabelas com contador em `tableversion` (as listas e o cache dos Relatórios dependem delas)
+COUNTED_TABLES = ("inventoryitem", "serviceorder", "serviceorderitem", "client", "priceanalysisjob")
+
+# Sem max-age: o navegador guarda, mas sempre revalida (barato: 304)
+REVALIDATE = "private, no-cache"
+VARY = "HX-Request"
+
+TRIGGERS = [
+    # Versão da linha: o UPDATE interno não dispara o trigger de novo (recursive_triggers
+    # desligado) e o WHEN ignora UPDATEs que já mexeram na versão
+    *(f"""
+    CREATE TRIGGER IF NOT EXISTS version_{table}_update
+    AFTER UPDATE ON {table} WHEN NEW.version = OLD.version BEGIN
+        UPDATE {table} SET version = OLD.version + 1 WHERE id = NEW.id;
+    END
+    """ for table in VERSIONED_TABLES),
+    # Itens lançados/estornados mudam a OS (detalhes e impressão)
+    *(f"""
+    CREATE TRIGGER IF NOT EXISTS version_serviceorderitem_{event.lower()}
+    AFTER {event} ON serviceorderitem BEGIN
+        UPDATE serviceorder SET version = version + 1 WHERE id = {row}.order_id;
+    END
+    """ for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))),
+    # Versão da tabela
+    *(f"""
+    CREATE TRIGGER IF NOT EXISTS tableversion_{table}_{event.lower()}
+    AFTER {event} ON {table} BEGIN
+        UPDATE tableversion SET version = version + 1 WHERE name = '{table}';
+    END
+    """ for table in COUNTED_TABLES for event in ("INSERT", "UPDATE", "DELETE")),
+]
+
+# Versão de tudo que aparece numa OS: a própria OS, o cliente e as peças (nomes)
+_ORDER_VERSION = """
+    SELECT o.version, o.status, c.version,
+           (SELECT COUNT(i.id) || '.' || COALESCE(SUM(i.version), 0)
+              FROM {lines} l LEFT JOIN inventoryitem i ON i.id = l.item_id
+             WHERE l.order_id = o.id)
+    FROM {orders} o LEFT JOIN client c ON c.id = o.client_id
+    WHERE o.id = :id
+"""
+ORDER_VERSION_SQL = text(_ORDER_VERSION.format(orders="serviceorder", lines="serviceorderitem"))
+# OS arquivada (app/archive.py): não muda mais, mas o cliente e os nomes das peças podem mudar
+ARCHIVED_ORDER_VERSION_SQL = text(_ORDER_VERSION.format(
+    orders=f"{archive.SCHEMA}.serviceorder", lines=f"{archive.SCHEMA}.serviceorderitem"
+))
+
+TABLE_VERSIONS_SQL = text("SELECT name, version FROM tableversion WHERE name IN :names").bindparams(
+    bindparam("names", expanding=True)
+)
+
+
+def install(engine):
+    """Cria os triggers e os contadores das tabelas (se ainda não existirem)."""
+    with engine.begin() as conn:
+        for ddl in TRIGGERS:
+            conn.execute(text(ddl))
+        for table in COUNTED_TABLES:
+            conn.execute(
+                text("INSERT OR IGNORE INTO tableversion (name, version) VALUES (:name, 1)"), {"name": table}
+            )
+
+
+def _templates_hash() -> str:
+    digest = hashlib.sha256()
+    for folder, _, files in sorted(os.walk(TEMPLATE_DIR)):
+        for name in sorted(files):
+            with open(os.path.join(folder, name), "rb") as f:
+                digest.update(name.encode("utf-8") + f.read())
+    return digest.hexdigest()[:12]
+
+
+# Calculado uma vez: os templates só mudam com um deploy (e um reinício)
+TEMPLATES_VERSION = _templates_hash()
+
+
+def make_etag(*parts) -> str:
+    """ETag fraco (mesmo conteúdo para o usuário, não necessariamente byte a byte)."""
+    raw = repr((TEMPLATES_VERSION,) + parts).encode("utf-8")
+    return f'W/"{hashlib.sha256(raw).hexdigest()[:20]}"'
+
+
+def table_versions(session, *tables) -> tuple:
+    """Versões das tabelas, na ordem pedida (0 se o contador não existir)."""
+    rows = dict(session.execute(TABLE_VERSIONS_SQL, {"names": list(tables)}).all())
+    return tuple(rows.get(table, 0) for table in tables)
+
+
+def order_version(session, os_id: int):
+    """(versão da OS, status, versão do cliente, peças) ou None se a OS não existe (nem no arquivo)."""
+    row = session.execute(ORDER_VERSION_SQL, {"id": os_id}).first()
+    if row is None and archive.available(session.connection()):
+        row = session.execute(ARCHIVED_ORDER_VERSION_SQL, {"id": os_id}).first()
+    return tuple(row) if row else None
+
+
+def list_etag(session, request: Request, *tables) -> str:
+    """ETag de uma lista: versões das tabelas + URL (filtros/página) + partial ou página."""
+    return make_etag(
+        request.url.path, str(request.url.query), bool(request.headers.get("HX-Request")),
+        table_versions(session, *tables),
+    )
+
+
+def is_fresh(request: Request, etag: str) -> bool:
+    """O navegador já tem esta versão (If-None-Match, comparação fraca)?"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    weak = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == weak for candidate in header.split(","))
+
+
+def not_modified(etag: str, cache_control: str = REVALIDATE) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control, "Vary": VARY})
+
+
+def tag(response: Response, etag: str, cache_control: str = REVALIDATE) -> Response:
+    """Acrescenta ETag e Cache-Control à resposta renderizada."""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    response.headers["Vary"] = VARY
+    return response
+
+
+def closed_order_cache_control() -> str:
+    """OS fechada é um documento histórico: o navegador pode reusar sem revalidar."""
+    return f"private, max-age={config.HTTP_CACHE_CLOSED_OS_MAX_AGE}"
+
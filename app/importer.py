@@ -0,0 +1,467 @@
+"""
+Importação em massa de Estoque e Clientes a partir de planilhas CSV/XLSX.
+
+Cadastrar um catálogo de fornecedor (dezenas de milhares de peças) pelo
+formulário "Novo Item" leva horas: uma requisição e dois commits por peça.
+Aqui o arquivo é lido em lotes de IMPORT_CHUNK_SIZE linhas (nunca inteiro
+na memória) e, para cada lote:
+  - o pandas valida todas as linhas de uma vez (operações vetorizadas);
+  - uma consulta IN encontra os registros que já existem (peça: nome +
+    categoria; cliente: placa);
+  - novos e alterados são gravados com executemany, numa única transação
+    que também avança o progresso do job (`processed_rows`).
+Linhas inválidas não interrompem a importação: entram no relatório de
+erros do job (linha da planilha + motivo).
+
+Os cabeçalhos aceitam os nomes em português ("Nome", "Preço de Venda",
+"Qtd", "Placa"...) ou os nomes das colunas do banco.
+
+Pela web a importação roda em segundo plano (ver rotas /import em
+app/main.py). Uso pela linha de comando:
+    python -m app.importer inventory catalogo.csv
+    python -m app.importer clients clientes.xlsx --chunk-size 10000
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import shutil
+import sys
+import unicodedata
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import insert, or_, update
+from sqlmodel import Session, select
+
+from app import config
+from app.client_keys import clean_phone, clean_plate
+from app.database import writer_lane
+from app.models import Client, ImportJob, InventoryItem, JobStatus
+
+KIND_INVENTORY = "inventory"
+KIND_CLIENTS = "clients"
+
+# Sem progresso por este tempo, uma importação RUNNING é considerada órfã e pode ser retomada
+JOB_LEASE = timedelta(seconds=120)
+
+PLATE_PATTERN = r"^[A-Z]{3}[0-9][A-Z0-9][0-9]{2}$"
+
+
+class ImportFileError(Exception):
+    """Arquivo ilegível, formato não suportado ou sem as colunas obrigatórias."""
+
+
+@dataclass(frozen=True)
+class ImportSpec:
+    model: type
+    # coluna do banco -> nomes aceitos no cabeçalho (já normalizados por _slug)
+    columns: dict
+    required: tuple
+    # colunas que identificam um registro existente (a primeira vai no IN)
+    key: tuple
+    # valores para colunas opcionais ausentes, só em registros novos
+    defaults: dict
+
+
+SPECS = {
+    KIND_INVENTORY: ImportSpec(
+        model=InventoryItem,
+        columns={
+            "name": ("nome", "name", "peca", "produto", "descricao"),
+            "category": ("categoria", "category", "grupo"),
+            "cost_price": ("custo", "preco_de_custo", "preco_custo", "cost_price"),
+            "sell_price": ("venda", "preco", "preco_de_venda", "preco_venda", "sell_price"),
+            "quantity": ("quantidade", "qtd", "estoque", "quantity"),
+            "min_quantity": ("minimo", "estoque_minimo", "qtd_minima", "min_quantity"),
+            "location": ("local", "localizacao", "location"),
+        },
+        required=("name", "category", "cost_price", "sell_price", "quantity"),
+        key=("name", "category"),
+        defaults={"min_quantity": 5, "location": None},
+    ),
+    KIND_CLIENTS: ImportSpec(
+        model=Client,
+        columns={
+            "name": ("nome", "name", "cliente"),
+            "phone": ("telefone", "celular", "whatsapp", "phone"),
+            "email": ("email", "e_mail"),
+            "car_model": ("modelo", "veiculo", "car_model"),
+            "car_plate": ("placa", "car_plate"),
+        },
+        required=("name", "phone", "car_model", "car_plate"),
+        key=("car_plate",),
+        defaults={"email": None},
+    ),
+}
+
+
+# --- Leitura em lotes ---
+
+def _slug(header) -> str:
+    """'Preço de Venda' -> 'preco_de_venda'"""
+    text = unicodedata.normalize("NFKD", str(header)).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+
+def _csv_format(path):
+    """Detecta codificação (UTF-8 ou Latin-1 do Excel) e separador (',' ou ';')."""
+    with open(path, "rb") as f:
+        sample = f.read(1 << 16)
+    try:
+        encoding = "utf-8-sig"
+        text = sample.decode(encoding)
+    except UnicodeDecodeError:
+        encoding = "latin-1"
+        text = sample.decode(encoding)
+    header = text.splitlines()[0] if text else ""
+    sep = ";" if header.count(";") > header.count(",") else ","
+    return encoding, sep
+
+
+def _xlsx_rows(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError("Para importar .xlsx instale o openpyxl (pip install openpyxl)")
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def count_rows(path) -> int:
+    """Linhas de dados do arquivo (sem o cabeçalho), para a barra de progresso."""
+    if path.lower().endswith(".xlsx"):
+        return max(sum(1 for _ in _xlsx_rows(path)) - 1, 0)
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def read_chunks(path, chunk_size, skip_rows=0):
+    """
+    Gera DataFrames (todas as colunas como texto) com até `chunk_size`
+    linhas, pulando as `skip_rows` primeiras linhas de dados (retomada).
+    """
+    if path.lower().endswith(".xlsx"):
+        rows = _xlsx_rows(path)
+        header = [str(h) if h is not None else "" for h in next(rows, ())]
+        width = len(header)
+        for _ in itertools.islice(rows, skip_rows):
+            pass
+        while True:
+            batch = [tuple(row[:width]) + (None,) * (width - len(row)) for row in itertools.islice(rows, chunk_size)]
+            if not batch:
+                return
+            chunk = pd.DataFrame(batch, columns=header, dtype=object)
+            yield chunk.where(chunk.notna(), "").astype(str)
+    elif path.lower().endswith((".csv", ".txt")):
+        encoding, sep = _csv_format(path)
+        yield from pd.read_csv(
+            path, sep=sep, encoding=encoding, dtype=str, keep_default_na=False,
+            chunksize=chunk_size, skiprows=range(1, skip_rows + 1),
+        )
+    else:
+        raise ImportFileError("Formato não suportado: envie um arquivo .csv ou .xlsx")
+
+
+def map_columns(headers, spec: ImportSpec) -> dict:
+    """Cabeçalho da planilha -> coluna do banco. Falha se faltar coluna obrigatória."""
+    aliases = {alias: column for column, names in spec.columns.items() for alias in names}
+    mapping = {}
+    for header in headers:
+        column = aliases.get(_slug(header))
+        if column and column not in mapping.values():
+            mapping[header] = column
+    missing = [c for c in spec.required if c not in mapping.values()]
+    if missing:
+        raise ImportFileError(f"Colunas obrigatórias ausentes: {', '.join(missing)}")
+    return mapping
+
+
+# --- Validação vetorizada ---
+
+def _to_number(values: pd.Series) -> pd.Series:
+    """Aceita '1234.5', '1.234,50' e 'R$ 12,90'; o que não for número vira NaN."""
+    values = values.str.replace(r"[R$\s]", "", regex=True)
+    decimal_comma = values.str.contains(",", regex=False)
+    values = values.where(
+        ~decimal_comma, values.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    )
+    return pd.to_numeric(values, errors="coerce")
+
+
+def _validate_inventory(df, reject):
+    for column, label in (("name", "nome vazio"), ("category", "categoria vazia")):
+        reject(df[column] == "", label)
+
+    for column, label in (("cost_price", "custo"), ("sell_price", "preço de venda")):
+        df[column] = _to_number(df[column])
+        reject(df[column].isna(), f"{label} inválido")
+        reject(df[column] < 0, f"{label} negativo")
+
+    for column, label in (("quantity", "quantidade"), ("min_quantity", "estoque mínimo")):
+        if column not in df:
+            continue
+        empty = df[column] == ""
+        df[column] = _to_number(df[column])
+        if column == "min_quantity":
+            df.loc[empty, column] = SPECS[KIND_INVENTORY].defaults["min_quantity"]
+        reject(df[column].isna() | (df[column] % 1 != 0) | (df[column] < 0), f"{label} inválida")
+
+    if "location" in df:
+        df["location"] = df["location"].where(df["location"] != "", None)
+
+
+def _validate_clients(df, reject):
+    for column, label in (("name", "nome vazio"), ("car_model", "modelo do veículo vazio")):
+        reject(df[column] == "", label)
+
+    # As mesmas regras do cadastro: as chaves geradas em SQL só tratam o que sobra delas
+    df["phone"] = df["phone"].map(clean_phone)
+    reject(~df["phone"].str.len().between(10, 13), "telefone inválido")
+
+    df["car_plate"] = df["car_plate"].map(clean_plate)
+    reject(~df["car_plate"].str.match(PLATE_PATTERN), "placa inválida")
+
+    if "email" in df:
+        df["email"] = df["email"].where(df["email"] != "", None)
+        reject(df["email"].notna() & ~df["email"].fillna("").str.contains("@", regex=False), "e-mail inválido")
+
+
+_VALIDATORS = {KIND_INVENTORY: _validate_inventory, KIND_CLIENTS: _validate_clients}
+
+
+def validate(kind: str, chunk: pd.DataFrame, mapping: dict, first_line: int):
+    """
+    Valida um lote. Devolve (DataFrame só com as linhas válidas, já convertidas,
+    lista de (linha da planilha, motivos)). `first_line` é a linha da
+    planilha correspondente à primeira linha do lote.
+    """
+    df = chunk[list(mapping)].rename(columns=mapping)
+    df.index = pd.RangeIndex(first_line, first_line + len(df))
+    df = df.apply(lambda column: column.astype(str).str.strip())
+
+    problems = pd.Series("", index=df.index, dtype=object)
+
+    def reject(mask, message):
+        mask = mask.fillna(True) if hasattr(mask, "fillna") else mask
+        problems[mask] = problems[mask] + message + "; "
+
+    _VALIDATORS[kind](df, reject)
+
+    bad = problems != ""
+    errors = [(int(line), message.rstrip("; ")) for line, message in problems[bad].items()]
+    valid = df[~bad]
+    for column in ("quantity", "min_quantity"):
+        if column in valid:
+            valid = valid.astype({column: "int64"})
+    # A mesma chave repetida no lote: vale a última linha
+    valid = valid.drop_duplicates(subset=list(SPECS[kind].key), keep="last")
+    return valid, errors
+
+
+# --- Gravação ---
+
+def _records(df: pd.DataFrame) -> list:
+    """Linhas do DataFrame como dicts com tipos do Python (o sqlite3 não aceita tipos do numpy)."""
+    return [
+        {column: (None if pd.isna(value) else value.item() if hasattr(value, "item") else value)
+         for column, value in row.items()}
+        for row in df.astype(object).to_dict("records")
+    ]
+
+
+def upsert(session: Session, kind: str, valid: pd.DataFrame):
+    """
+    Insere os registros novos e atualiza os existentes (só as colunas
+    presentes na planilha). Devolve (inseridos, atualizados). Não faz commit.
+    """
+    spec = SPECS[kind]
+    if valid.empty:
+        return 0, 0
+
+    key_columns = [getattr(spec.model, column) for column in spec.key]
+    existing = {
+        tuple(row[1:]): row[0]
+        for row in session.exec(
+            select(spec.model.id, *key_columns).where(key_columns[0].in_(valid[spec.key[0]].unique().tolist()))
+        ).all()
+    }
+
+    inserts, updates = [], []
+    for record in _records(valid):
+        record_id = existing.get(tuple(record[column] for column in spec.key))
+        if record_id is None:
+            inserts.append({**spec.defaults, **record})
+        else:
+            updates.append({"id": record_id, **record})
+
+    # executemany: uma instrução preparada para o lote inteiro
+    if inserts:
+        session.execute(insert(spec.model), inserts)
+    if updates:
+        session.execute(update(spec.model), updates)
+    return len(inserts), len(updates)
+
+
+# --- Jobs ---
+
+def save_upload(fileobj, filename: str) -> str:
+    """Copia o arquivo enviado para IMPORT_DIR e devolve o caminho salvo."""
+    os.makedirs(config.IMPORT_DIR, exist_ok=True)
+    extension = os.path.splitext(filename)[1].lower()
+    path = os.path.join(config.IMPORT_DIR, f"{uuid.uuid4().hex}{extension}")
+    with open(path, "wb") as out:
+        shutil.copyfileobj(fileobj, out, 1 << 20)
+    return path
+
+
+def create_job(session: Session, kind: str, path: str, filename: str = None, total_rows: int = None) -> ImportJob:
+    """
+    Grava o job. `total_rows` já contado evita ler o arquivo aqui (a web
+    conta antes de entrar na fila de escrita: um .xlsx é lido inteiro).
+    """
+    if kind not in SPECS:
+        raise ImportFileError(f"Destino desconhecido: {kind}")
+    if total_rows is None:
+        total_rows = count_rows(path)
+    job = ImportJob(kind=kind, filename=filename or os.path.basename(path), path=path, total_rows=total_rows)
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def _claimable(now):
+    return or_(
+        ImportJob.status.in_([JobStatus.PENDING, JobStatus.FAILED]),
+        (ImportJob.status == JobStatus.RUNNING) & (ImportJob.heartbeat_at < now - JOB_LEASE),
+    )
+
+
+def is_stale(job: ImportJob) -> bool:
+    """Importação RUNNING sem progresso há mais de JOB_LEASE (worker morreu)."""
+    return (
+        job.status == JobStatus.RUNNING
+        and job.heartbeat_at is not None
+        and job.heartbeat_at < datetime.now() - JOB_LEASE
+    )
+
+
+def claim(session: Session, job_id: int) -> bool:
+    """Marca o job como RUNNING se ninguém o estiver executando (UPDATE condicional)."""
+    now = datetime.now()
+    claimed = session.execute(
+        update(ImportJob)
+        .where(ImportJob.id == job_id, _claimable(now))
+        .values(status=JobStatus.RUNNING, heartbeat_at=now, error=None)
+    ).rowcount
+    session.commit()
+    return bool(claimed)
+
+
+def _finish(engine, job_id, status, error=None):
+    with writer_lane(), Session(engine) as session:
+        job = session.get(ImportJob, job_id)
+        job.status = status
+        job.error = error
+        job.finished_at = datetime.now()
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        session.expunge(job)
+        return job
+
+
+def run_job(engine, job_id: int, chunk_size: int = None, on_progress=None) -> ImportJob:
+    """
+    Executa (ou retoma, a partir de `processed_rows`) uma importação já
+    reservada com `claim`. Síncrona: roda numa thread de fundo ou no CLI.
+    """
+    chunk_size = chunk_size or config.IMPORT_CHUNK_SIZE
+    with Session(engine) as session:
+        job = session.get(ImportJob, job_id)
+        kind, path, skip = job.kind, job.path, job.processed_rows
+        errors = json.loads(job.errors)
+
+    try:
+        mapping = None
+        line = skip + 2  # linha 1 é o cabeçalho
+        for chunk in read_chunks(path, chunk_size, skip):
+            mapping = mapping or map_columns(chunk.columns, SPECS[kind])
+            valid, chunk_errors = validate(kind, chunk, mapping, line)
+            line += len(chunk)
+
+            with writer_lane(), Session(engine) as session:
+                inserted, updated = upsert(session, kind, valid)
+                errors.extend(chunk_errors[:max(config.IMPORT_MAX_ERRORS - len(errors), 0)])
+                # Progresso na mesma transação dos dados: a retomada nunca repete nem pula linhas
+                session.execute(
+                    update(ImportJob)
+                    .where(ImportJob.id == job_id)
+                    .values(
+                        processed_rows=ImportJob.processed_rows + len(chunk),
+                        inserted=ImportJob.inserted + inserted,
+                        updated=ImportJob.updated + updated,
+                        error_count=ImportJob.error_count + len(chunk_errors),
+                        errors=json.dumps(errors, ensure_ascii=False),
+                        heartbeat_at=datetime.now(),
+                    )
+                )
+                session.commit()
+                if on_progress:
+                    on_progress(session.get(ImportJob, job_id))
+    except Exception as e:
+        return _finish(engine, job_id, JobStatus.FAILED, str(e))
+
+    job = _finish(engine, job_id, JobStatus.DONE)
+    # Só apaga arquivos enviados pela web (os do CLI são do usuário)
+    if os.path.dirname(os.path.abspath(path)) == os.path.abspath(config.IMPORT_DIR):
+        os.remove(path)
+    return job
+
+
+def job_errors(job: ImportJob) -> list:
+    return json.loads(job.errors)
+
+
+if __name__ == "__main__":
+    from app.database import create_db_and_tables, engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("kind", choices=sorted(SPECS))
+    parser.add_argument("path")
+    parser.add_argument("--chunk-size", type=int, default=config.IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    started = datetime.now()
+    with Session(engine) as session:
+        job_id = create_job(session, args.kind, args.path).id
+        claim(session, job_id)
+
+    def report(job):
+        print(f"\r{job.processed_rows}/{job.total_rows} linhas  "
+              f"novos {job.inserted}  atualizados {job.updated}  erros {job.error_count}", end="", flush=True)
+
+    job = run_job(engine, job_id, args.chunk_size, on_progress=report)
+    print(f"\nImportação #{job.id}: {job.status.value} em {(datetime.now() - started).total_seconds():.1f}s")
+    for line, message in job_errors(job)[:20]:
+        print(f"  linha {line}: {message}")
+    if job.error_count > 20:
+        print(f"  ... e mais {job.error_count - 20} linhas com erro")
+    if job.status == JobStatus.FAILED:
+        print(f"Falhou: {job.error}")
+        sys.exit(1)
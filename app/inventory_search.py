@@ -0,0 +1,123 @@
+"""
+Índice de busca textual do Estoque (SQLite FTS5).
+
+A busca ao vivo da tela de Estoque dispara uma requisição por tecla; com
+`ILIKE '%termo%'` cada requisição varre a tabela inteira. Aqui mantemos a
+tabela virtual `inventory_fts` (nome, categoria e localização) sincronizada
+por triggers com `inventoryitem`, com:
+  - busca por prefixo ("filt" encontra "Filtro");
+  - sem acentos ("oleo" encontra "Óleo"), via tokenizer unicode61;
+  - ordenação por relevância (bm25, nome pesa mais que categoria).
+
+Se o SQLite não tiver FTS5 compilado, a busca volta para o LIKE antigo.
+"""
+import re
+
+from sqlalchemy import column, inspect, or_, table, text
+from sqlalchemy.exc import OperationalError
+
+from app.models import InventoryItem
+
+FTS_TABLE = "inventory_fts"
+
+# Pesos do bm25 por coluna: nome, categoria, localização
+RANK_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Definido em install(); False quando o SQLite não suporta FTS5
+fts_available = True
+
+inventory_fts = table(FTS_TABLE, column("rowid"))
+
+FTS_DDL = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, category, location,
+        content='inventoryitem', content_rowid='id',
+        tokenize="unicode61 remove_diacritics 2",
+        prefix='2 3'
+    )
+"""
+
+TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS inventory_fts_insert AFTER INSERT ON inventoryitem BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, category, location)
+        VALUES (NEW.id, NEW.name, NEW.category, NEW.location);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS inventory_fts_delete AFTER DELETE ON inventoryitem BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, category, location)
+        VALUES ('delete', OLD.id, OLD.name, OLD.category, OLD.location);
+    END
+    """,
+    # Só reindexa quando mudam as colunas indexadas (baixa de estoque não toca no índice)
+    f"""
+    CREATE TRIGGER IF NOT EXISTS inventory_fts_update
+    AFTER UPDATE OF name, category, location ON inventoryitem BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, category, location)
+        VALUES ('delete', OLD.id, OLD.name, OLD.category, OLD.location);
+        INSERT INTO {FTS_TABLE}(rowid, name, category, location)
+        VALUES (NEW.id, NEW.name, NEW.category, NEW.location);
+    END
+    """,
+]
+
+
+def install(engine):
+    """
+    Cria o índice FTS5 e seus triggers. Na primeira criação (ou em bancos
+    antigos que já têm peças cadastradas) o índice é populado com 'rebuild'.
+    """
+    global fts_available
+    created = not inspect(engine).has_table(FTS_TABLE)
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(FTS_DDL))
+            for ddl in TRIGGERS:
+                conn.execute(text(ddl))
+            if created:
+                conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    except OperationalError as e:
+        if "fts5" not in str(e):
+            raise
+        print("ALERTA: SQLite sem suporte a FTS5, busca de estoque usará LIKE")
+        fts_available = False
+
+
+def rebuild(engine):
+    """Reconstrói o índice inteiro a partir de `inventoryitem`."""
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def build_match(term: str) -> str:
+    """
+    Converte o texto digitado numa expressão MATCH do FTS5.
+    Cada palavra vira um prefixo entre aspas e todas precisam aparecer:
+    'filtro oleo' -> '"filtro"* "oleo"*'
+    """
+    tokens = re.findall(r"\w+", term)
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def apply_search(query, term: str):
+    """
+    Aplica o filtro de busca a um `select(InventoryItem)`, já ordenado por relevância.
+    Mantém o mesmo formato de resultado (linhas de InventoryItem) da busca antiga.
+    """
+    match = build_match(term)
+    if not match:
+        return query
+
+    if not fts_available:
+        return query.where(or_(
+            InventoryItem.name.ilike(f"%{term}%"),
+            InventoryItem.category.ilike(f"%{term}%"),
+        ))
+
+    weights = ", ".join(str(w) for w in RANK_WEIGHTS)
+    return (
+        query.join(inventory_fts, inventory_fts.c.rowid == InventoryItem.id)
+        .where(text(f"{FTS_TABLE} MATCH :fts_match").bindparams(fts_match=match))
+        .order_by(text(f"bm25({FTS_TABLE}, {weights})"))
+    )
@@ -1,54 +1,74 @@
-from fastapi import FastAPI, Request, Form, Depends, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, Response
+from fastapi import FastAPI, Request, Form, Depends, HTTPException, BackgroundTasks, UploadFile, File
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
-from sqlmodel import Session, select
-from typing import Annotated
+from sqlmodel import Session, select, delete
+from typing import Annotated, List, Optional
 
-from app.database import create_db_and_tables, get_session
-from app.models import InventoryItem, Client, ServiceOrder, ServiceOrderItem, ServiceOrderStatus
-from datetime import datetime
-import google.generativeai as genai
+from app import config
+from app.client_keys import clean_phone, clean_plate
+from app.database import RequestDB, create_db_and_tables, dispose_async_engine, get_db, get_write_db, engine, writer_lane
+from app import ai, ai_cache, analytics, archive, client_lookup, dashboard, events, exports, http_cache, importer, inventory_search, metrics, os_view, pagination, part_lookup, price_jobs, print_batch, stock
+from app.models import InventoryItem, Client, ServiceOrder, ServiceOrderItem, ServiceOrderStatus, PriceAnalysisJob, ImportJob
+from datetime import date, datetime
 import os
 import urllib.parse
-from dotenv import load_dotenv
 
-# Carrega variáveis de ambiente do arquivo .env
-load_dotenv()
+# Modelo de IA do AI_PROVIDER; o SDK do Gemini só é importado na primeira chamada
+model = ai.create_model()
 
-# Configuração da API do Gemini
-api_key = os.getenv("GOOGLE_API_KEY")
-if not api_key:
-    print("ALERTA: GOOGLE_API_KEY não encontrada no arquivo .env")
-
-genai.configure(api_key=api_key)
-# Mantendo gemini-flash-latest que foi o confirmado como disponível
-model = genai.GenerativeModel('gemini-flash-latest')
+# Chamadas ao modelo rodam num pool de threads limitado, fora do event loop
+ai_executor = ai.AIExecutor(
+    model,
+    max_workers=config.AI_MAX_CONCURRENCY,
+    max_queue=config.AI_MAX_QUEUE,
+    timeout=config.AI_TIMEOUT,
+)
+# Análise de preço em lote, executada em segundo plano
+price_jobs.runner = price_jobs.JobRunner(ai_executor, engine)
+# Avisos de "mudou" para as telas abertas (SSE em /events)
+event_bus = events.create_bus(engine)
+# OS fechadas antigas vão para o banco de arquivo (ver app/archive.py)
+archive_scheduler = archive.ArchiveScheduler(engine)
 
 app = FastAPI()
 templates = Jinja2Templates(directory="app/templates")
+if config.METRICS_ENABLED:
+    # Latência por rota, SQL e templates de cada requisição (ver app/metrics.py)
+    app.add_middleware(metrics.MetricsMiddleware)
+    metrics.instrument_templates(templates)
 
 @app.on_event("startup")
 def on_startup():
     create_db_and_tables()
 
+@app.on_event("startup")
+async def start_background_jobs():
+    # Retoma jobs interrompidos por um reinício e aguarda novos
+    price_jobs.runner.start()
+    event_bus.start()
+    archive_scheduler.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await price_jobs.runner.stop()
+    await event_bus.stop()
+    await archive_scheduler.stop()
+    ai_executor.shutdown()
+    print_batch.shutdown()
+    await dispose_async_engine()
+
 @app.get("/", response_class=HTMLResponse)
-async def read_root(request: Request, session: Session = Depends(get_session)):
-    # 1. Calcular Valor Total do Estoque (Custo)
-    items = session.exec(select(InventoryItem)).all()
-    total_inventory_value = sum(item.cost_price * item.quantity for item in items)
-    
-    # 2. Contar Itens com Estoque Baixo
-    low_stock_count = sum(1 for item in items if item.quantity <= item.min_quantity)
-    
-    # 3. Contar OS Abertas
-    open_os_count = len(session.exec(select(ServiceOrder).where(ServiceOrder.status == ServiceOrderStatus.OPEN)).all())
+async def read_root(request: Request, db: RequestDB = Depends(get_db)):
+    # Contadores mantidos por triggers (ver app/dashboard.py): leitura de uma única linha
+    stats = await db.run(dashboard.get_stats)
     
     return templates.TemplateResponse("index.html", {
         "request": request,
-        "total_inventory_value": total_inventory_value,
-        "low_stock_count": low_stock_count,
-        "open_os_count": open_os_count
+        "total_inventory_value": stats.total_inventory_value,
+        "low_stock_count": stats.low_stock_count,
+        "open_os_count": stats.open_os_count
     })
 
 # --- Rotas de Estoque ---
@@ -56,22 +76,35 @@ async def read_root(request: Request, session: Session = Depends(get_session)):
 async def read_inventory(
     request: Request, 
     search: str = "", 
-    session: Session = Depends(get_session)
+    after: Optional[int] = None,
+    offset: int = 0,
+    db: RequestDB = Depends(get_db)
 ):
+    partial = bool(request.headers.get("HX-Request"))
+    # A página inteira também mostra o andamento da análise de preços
+    tables = ("inventoryitem",) if partial else ("inventoryitem", "priceanalysisjob")
+    etag = await db.run(http_cache.list_etag, request, *tables)
+    if http_cache.is_fresh(request, etag):
+        return http_cache.not_modified(etag)
+
+    # A sessão da página pertence ao streaming: a consulta roda quando o
+    # template itera (numa thread) e a sessão é fechada quando ele termina
+    session = Session(engine)
     query = select(InventoryItem)
     
     if search:
-        query = query.where(
-            (InventoryItem.name.ilike(f"%{search}%")) | 
-            (InventoryItem.category.ilike(f"%{search}%"))
-        )
-    
-    items = session.exec(query).all()
-    
-    if request.headers.get("HX-Request"):
-        return templates.TemplateResponse("partials/inventory_rows.html", {"request": request, "items": items})
+        # Busca via índice FTS5 (prefixo, sem acentos, ordenada por relevância)
+        query = inventory_search.apply_search(query, search)
+        page = pagination.offset_page(session, query, offset, config.PAGE_SIZE, search=search)
+    else:
+        page = pagination.keyset_page(session, query, InventoryItem.id, after, config.PAGE_SIZE)
+    
+    context = {"request": request, "items": page, "page": page, "search": search}
+    if partial:
+        return http_cache.tag(pagination.stream_template(templates, "partials/inventory_rows.html", context, session), etag)
         
-    return templates.TemplateResponse("inventory.html", {"request": request, "items": items, "search": search})
+    context["analysis_job"] = await db.run(price_jobs.latest_job)
+    return http_cache.tag(pagination.stream_template(templates, "inventory.html", context, session), etag)
 
 @app.post("/inventory/add")
 async def add_item(
@@ -83,30 +116,46 @@ async def add_item(
     quantity: Annotated[int, Form()],
     min_quantity: Annotated[int, Form()] = 5,
     location: Annotated[str, Form()] = "",
-    session: Session = Depends(get_session)
+    db: RequestDB = Depends(get_write_db)
 ):
     new_item = InventoryItem(
         name=name, category=category, cost_price=cost_price, 
         sell_price=sell_price, quantity=quantity, 
         min_quantity=min_quantity, location=location
     )
-    session.add(new_item)
-    session.commit()
-    session.commit()
+
+    def insert(session):
+        session.add(new_item)
+        session.commit()
+
+    await db.run(insert)
+    event_bus.publish("inventory", "dashboard")
     return RedirectResponse(url="/inventory", status_code=303)
 
+@app.get("/inventory/lookup", response_class=HTMLResponse)
+async def lookup_parts(request: Request, q: str = "", db: RequestDB = Depends(get_db)):
+    """Sugestões do seletor de peças da OS (typeahead): top-N com estoque e preço."""
+    parts = await db.run(part_lookup.lookup, q)
+    return templates.TemplateResponse("partials/part_options.html", {"request": request, "parts": parts, "q": q})
+
 @app.get("/inventory/{item_id}/edit", response_class=HTMLResponse)
-async def edit_item_row(request: Request, item_id: int, session: Session = Depends(get_session)):
-    item = session.get(InventoryItem, item_id)
+async def edit_item_row(request: Request, item_id: int, db: RequestDB = Depends(get_db)):
+    item = await db.get(InventoryItem, item_id)
     if not item: raise HTTPException(status_code=404)
-    return templates.TemplateResponse("partials/inventory_edit_row.html", {"request": request, "item": item})
+    etag = http_cache.make_etag("inventory_edit_row", item.id, item.version)
+    if http_cache.is_fresh(request, etag):
+        return http_cache.not_modified(etag)
+    return http_cache.tag(templates.TemplateResponse("partials/inventory_edit_row.html", {"request": request, "item": item}), etag)
 
 @app.get("/inventory/{item_id}", response_class=HTMLResponse)
-async def get_item_row(request: Request, item_id: int, session: Session = Depends(get_session)):
-    item = session.get(InventoryItem, item_id)
+async def get_item_row(request: Request, item_id: int, db: RequestDB = Depends(get_db)):
+    item = await db.get(InventoryItem, item_id)
     if not item: raise HTTPException(status_code=404)
+    etag = http_cache.make_etag("inventory_row", item.id, item.version)
+    if http_cache.is_fresh(request, etag):
+        return http_cache.not_modified(etag)
     # Reusa o partial de linhas, passando uma lista com 1 item
-    return templates.TemplateResponse("partials/inventory_rows.html", {"request": request, "items": [item]})
+    return http_cache.tag(templates.TemplateResponse("partials/inventory_rows.html", {"request": request, "items": [item]}), etag)
 
 @app.put("/inventory/{item_id}", response_class=HTMLResponse)
 async def update_item(
@@ -116,36 +165,59 @@ async def update_item(
     category: Annotated[str, Form()],
     sell_price: Annotated[float, Form()],
     quantity: Annotated[int, Form()],
-    session: Session = Depends(get_session)
+    db: RequestDB = Depends(get_write_db)
 ):
-    item = session.get(InventoryItem, item_id)
+    def save(session):
+        item = session.get(InventoryItem, item_id)
+        if not item:
+            return None
+        
+        item.name = name
+        item.category = category
+        item.sell_price = sell_price
+        item.quantity = quantity
+        
+        session.add(item)
+        # Nome/preço podem ter mudado: descarta a análise de preço em cache
+        ai_cache.invalidate(session, ai_cache.KIND_PRICE, item_id)
+        session.commit()
+        session.refresh(item)
+        return item
+
+    item = await db.run(save)
     if not item: raise HTTPException(status_code=404)
-    
-    item.name = name
-    item.category = category
-    item.sell_price = sell_price
-    item.quantity = quantity
-    
-    session.add(item)
-    session.commit()
-    session.refresh(item)
+    event_bus.publish(f"inventory:{item_id}", "dashboard")
     
     return templates.TemplateResponse("partials/inventory_rows.html", {"request": request, "items": [item]})
 
 @app.delete("/inventory/{item_id}")
-async def delete_item(item_id: int, session: Session = Depends(get_session)):
-    item = session.get(InventoryItem, item_id)
-    if not item:
+async def delete_item(item_id: int, db: RequestDB = Depends(get_write_db)):
+    def remove(session):
+        item = session.get(InventoryItem, item_id)
+        if not item:
+            return False
+        session.delete(item)
+        ai_cache.invalidate(session, ai_cache.KIND_PRICE, item_id)
+        session.commit()
+        return True
+
+    if not await db.run(remove):
         raise HTTPException(status_code=404, detail="Item not found")
-    session.delete(item)
-    session.commit()
+    event_bus.publish(f"inventory:{item_id}", "dashboard")
     return Response(status_code=200)
 
 # --- Rotas de Clientes ---
 @app.get("/clients", response_class=HTMLResponse)
-async def read_clients(request: Request, session: Session = Depends(get_session)):
-    clients = session.exec(select(Client)).all()
-    return templates.TemplateResponse("clients.html", {"request": request, "clients": clients})
+async def read_clients(request: Request, after: Optional[int] = None, db: RequestDB = Depends(get_db)):
+    etag = await db.run(http_cache.list_etag, request, "client")
+    if http_cache.is_fresh(request, etag):
+        return http_cache.not_modified(etag)
+    session = Session(engine)
+    page = pagination.keyset_page(session, select(Client), Client.id, after, config.PAGE_SIZE)
+    context = {"request": request, "clients": page, "page": page}
+    if request.headers.get("HX-Request"):
+        return http_cache.tag(pagination.stream_template(templates, "partials/client_rows.html", context, session), etag)
+    return http_cache.tag(pagination.stream_template(templates, "clients.html", context, session), etag)
 
 @app.post("/clients/add")
 async def add_client(
@@ -155,197 +227,313 @@ async def add_client(
     car_model: Annotated[str, Form()],
     car_plate: Annotated[str, Form()],
     email: Annotated[str, Form()] = None,
-    session: Session = Depends(get_session)
+    confirm_duplicate: Annotated[bool, Form()] = False,
+    db: RequestDB = Depends(get_write_db)
 ):
-    new_client = Client(name=name, phone=phone, email=email, car_model=car_model, car_plate=car_plate)
-    session.add(new_client)
-    session.commit()
+    # Gravados como na importação: placa em maiúsculas sem traço, telefone só com dígitos
+    new_client = Client(
+        name=name, phone=clean_phone(phone) or phone, email=email or None,
+        car_model=car_model, car_plate=clean_plate(car_plate) or car_plate,
+    )
+
+    def insert(session):
+        # Checagem e gravação na mesma vez da fila de escrita: dois cadastros iguais não passam juntos
+        if not confirm_duplicate:
+            duplicates = client_lookup.find_duplicates(session, phone, car_plate)
+            if duplicates:
+                return duplicates
+        session.add(new_client)
+        session.commit()
+        return []
+
+    duplicates = await db.run(insert)
+    if duplicates:
+        # Não grava: mostra os parecidos no próprio formulário e pede confirmação
+        return templates.TemplateResponse(
+            "partials/client_duplicates.html", {"request": request, "duplicates": duplicates},
+            headers={"HX-Retarget": "#client-duplicates", "HX-Reswap": "innerHTML"},
+        )
     return RedirectResponse(url="/clients", status_code=303)
 
+@app.get("/clients/lookup", response_class=HTMLResponse)
+async def lookup_clients(request: Request, q: str = "", db: RequestDB = Depends(get_db)):
+    """Sugestões do seletor de cliente da nova OS (typeahead): placa, telefone ou nome."""
+    clients = await db.run(client_lookup.lookup, q)
+    return templates.TemplateResponse("partials/client_options.html", {"request": request, "clients": clients, "q": q})
+
 # --- Rotas de OS ---
 @app.get("/os", response_class=HTMLResponse)
-async def read_os_list(request: Request, session: Session = Depends(get_session)):
-    results = session.exec(select(ServiceOrder, Client).where(ServiceOrder.client_id == Client.id)).all()
-    os_list = [{"os": r[0], "client": r[1]} for r in results]
-    clients = session.exec(select(Client)).all()
-    return templates.TemplateResponse("os_list.html", {"request": request, "os_list": os_list, "clients": clients})
+async def read_os_list(request: Request, after: Optional[int] = None, db: RequestDB = Depends(get_db)):
+    # Linhas mostram o cliente
+    etag = await db.run(http_cache.list_etag, request, "serviceorder", "client")
+    if http_cache.is_fresh(request, etag):
+        return http_cache.not_modified(etag)
+    session = Session(engine)
+    # OS mais recentes primeiro
+    query = select(ServiceOrder, Client).where(ServiceOrder.client_id == Client.id)
+    page = pagination.keyset_page(
+        session, query, ServiceOrder.id, after, config.PAGE_SIZE, descending=True, key=lambda row: row[0].id
+    )
+    context = {"request": request, "os_list": page, "page": page}
+    if request.headers.get("HX-Request"):
+        return http_cache.tag(pagination.stream_template(templates, "partials/os_rows.html", context, session), etag)
+    # O cliente da nova OS vem sob demanda do seletor (/clients/lookup)
+    return http_cache.tag(pagination.stream_template(templates, "os_list.html", context, session), etag)
 
 @app.post("/os/create")
-async def create_os(client_id: Annotated[int, Form()], session: Session = Depends(get_session)):
+async def create_os(client_id: Annotated[int, Form()], db: RequestDB = Depends(get_write_db)):
     new_os = ServiceOrder(client_id=client_id, status=ServiceOrderStatus.OPEN)
-    session.add(new_os)
-    session.commit()
-    session.refresh(new_os)
+
+    def insert(session):
+        session.add(new_os)
+        session.commit()
+
+    await db.run(insert)
+    event_bus.publish("dashboard")
     return RedirectResponse(url=f"/os/{new_os.id}", status_code=303)
 
-@app.get("/os/{os_id}", response_class=HTMLResponse)
-async def read_os_details(os_id: int, request: Request, session: Session = Depends(get_session)):
-    os_obj = session.get(ServiceOrder, os_id) # Renomeado para evitar conflito com modulo os
-    if not os_obj: raise HTTPException(status_code=404, detail="OS não encontrada")
-    client = session.get(Client, os_obj.client_id)
-    
-    items_query = select(ServiceOrderItem, InventoryItem).where(
-        ServiceOrderItem.order_id == os_id, ServiceOrderItem.item_id == InventoryItem.id
-    )
-    items_results = session.exec(items_query).all()
-    
-    # Criar objeto simples para view
-    class ItemView:
-        def __init__(self, order_item, inv_item):
-            self.id = order_item.id
-            self.name = inv_item.name
-            self.quantity_sold = order_item.quantity_sold
-            self.price_at_moment = order_item.price_at_moment
-            
-    view_items = [ItemView(oi, ii) for oi, ii in items_results]
-    inventory = session.exec(select(InventoryItem)).all()
-
-    return templates.TemplateResponse("os_details.html", {
-        "request": request, "os": os_obj, "client": client, "os_items": view_items, "inventory": inventory
+@app.get("/os/print_batch")
+async def print_os_batch(
+    ids: str = "",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    status: str = "closed",
+    format: str = print_batch.FORMAT_PDF,
+    db: RequestDB = Depends(get_db)
+):
+    """
+    ZIP com um PDF (ou HTML) por OS: `ids` separados por vírgula ou as OS do
+    período start..end (só as fechadas, a menos que status=all). Os PDFs são
+    gerados num pool de processos e enviados conforme ficam prontos.
+    """
+    try:
+        os_ids = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids deve ser uma lista de números separados por vírgula")
+    if not os_ids:
+        os_ids = await db.offload(print_batch.select_ids, start, end, status != "all")
+    try:
+        # O limite vale antes da carga: um lote grande demais nem chega a ser lido
+        print_batch.check_request(os_ids, format)
+        documents = await db.offload(print_batch.load_documents, os_ids)
+        chunks = print_batch.stream_zip(documents, format)
+    except print_batch.PrintError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    name = print_batch.filename(format, start, end)
+    return StreamingResponse(chunks, media_type="application/zip", headers={
+        "Content-Disposition": f'attachment; filename="{name}"'
     })
 
+@app.get("/os/{os_id}", response_class=HTMLResponse)
+async def read_os_details(os_id: int, request: Request, db: RequestDB = Depends(get_db)):
+    version = await db.run(http_cache.order_version, os_id)
+    if not version: raise HTTPException(status_code=404, detail="OS não encontrada")
+    etag = http_cache.make_etag("os_details", os_id, version)
+    if http_cache.is_fresh(request, etag):
+        return http_cache.not_modified(etag)
+
+    # OS, cliente e itens numa única consulta (ver app/os_view.py)
+    order = await db.run(os_view.load_order, os_id)
+    if not order: raise HTTPException(status_code=404, detail="OS não encontrada")
+
+    # As peças para lançar vêm sob demanda do seletor (/inventory/lookup)
+    return http_cache.tag(templates.TemplateResponse("os_details.html", {
+        "request": request, "os": order, "client": order.client, "os_items": order.items
+    }), etag)
+
 @app.post("/os/{os_id}/add_item")
 async def add_os_item(
     os_id: int, 
     request: Request, 
     item_id: Annotated[int, Form()], 
     quantity: Annotated[int, Form()], 
-    session: Session = Depends(get_session)
+    db: RequestDB = Depends(get_write_db)
 ):
     # Validações básicas
     if quantity <= 0:
         raise HTTPException(status_code=400, detail="Quantidade deve ser positiva")
 
-    os_obj = session.get(ServiceOrder, os_id)
-    inventory_item = session.get(InventoryItem, item_id)
-    
-    if not os_obj or not inventory_item: 
+    if not await db.get(ServiceOrder, os_id):
         raise HTTPException(status_code=404, detail="Item ou OS não encontrados")
-    
-    # 1. VALIDAÇÃO DE ESTOQUE (CORREÇÃO CRÍTICA)
-    if inventory_item.quantity < quantity:
+
+    def sell(session):
+        # 1. Baixa no estoque atômica: só acontece se houver saldo (ver app/stock.py)
+        price = stock.reserve(session, item_id, quantity)
+        
+        # 2. Cria o item na OS com o preço lido na própria baixa
+        session.add(ServiceOrderItem(
+            order_id=os_id, 
+            item_id=item_id, 
+            quantity_sold=quantity, 
+            price_at_moment=price
+        ))
+        session.flush()
+        
+        # 3. Total da OS = soma dos itens, na mesma transação
+        stock.recompute_total(session, os_id)
+        # Itens da OS mudaram: o relatório em cache não vale mais
+        ai_cache.invalidate(session, ai_cache.KIND_REPORT, os_id)
+        session.commit()
+
+    try:
+        await stock.run_retrying(db, sell)
+    except stock.ItemNotFound:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Item ou OS não encontrados")
+    except stock.InsufficientStock as e:
+        await db.rollback()
         # Retorna um script JS simples para alertar o usuário sem quebrar a página
         return HTMLResponse(
             f"""<script>
-                alert('Erro: Estoque insuficiente!\\nDisponível: {inventory_item.quantity}\\nSolicitado: {quantity}');
+                alert('Erro: Estoque insuficiente!\\nDisponível: {e.available}\\nSolicitado: {quantity}');
                 window.history.back();
             </script>"""
         )
-        
-    # 2. Cria o item na OS
-    order_item = ServiceOrderItem(
-        order_id=os_id, 
-        item_id=item_id, 
-        quantity_sold=quantity, 
-        price_at_moment=inventory_item.sell_price
-    )
-    session.add(order_item)
-    
-    # 3. Atualiza Totais e Estoque
-    os_obj.total_value += (quantity * inventory_item.sell_price)
-    inventory_item.quantity -= quantity # Baixa no estoque
-    
-    session.add(os_obj)
-    session.add(inventory_item)
-    session.commit()
     
+    event_bus.publish(f"os:{os_id}", f"inventory:{item_id}", "dashboard")
     return RedirectResponse(url=f"/os/{os_id}", status_code=303)
 
 
+@app.post("/os/{os_id}/add_items")
+async def add_os_items(
+    os_id: int,
+    request: Request,
+    item_id: Annotated[List[int], Form()],
+    quantity: Annotated[List[int], Form()],
+    db: RequestDB = Depends(get_write_db)
+):
+    """
+    Lança várias peças na OS de uma vez: uma consulta para as peças, uma
+    transação e um commit. Responde só com a tabela de itens (HTMX);
+    sem HTMX, redireciona para a tela da OS.
+    """
+    if not await db.get(ServiceOrder, os_id):
+        raise HTTPException(status_code=404, detail="OS não encontrada")
+    if len(item_id) != len(quantity):
+        raise HTTPException(status_code=400, detail="Cada peça precisa de uma quantidade")
+    if any(q <= 0 for q in quantity):
+        raise HTTPException(status_code=400, detail="Quantidade deve ser positiva")
+
+    # A mesma peça em duas linhas vira uma baixa só
+    wanted = {}
+    for iid, q in zip(item_id, quantity):
+        wanted[iid] = wanted.get(iid, 0) + q
+
+    def sell(session):
+        prices = stock.reserve_many(session, wanted)
+        session.add_all([
+            ServiceOrderItem(order_id=os_id, item_id=iid, quantity_sold=q, price_at_moment=prices[iid])
+            for iid, q in wanted.items()
+        ])
+        session.flush()
+        stock.recompute_total(session, os_id)
+        ai_cache.invalidate(session, ai_cache.KIND_REPORT, os_id)
+        session.commit()
+
+    errors = []
+    try:
+        await stock.run_retrying(db, sell)
+    except stock.BatchRejected as e:
+        await db.rollback()
+        errors = e.problems
+    if not errors:
+        event_bus.publish(f"os:{os_id}", *(f"inventory:{iid}" for iid in wanted), "dashboard")
+
+    if "HX-Request" not in request.headers:
+        return RedirectResponse(url=f"/os/{os_id}", status_code=303)
+
+    order = await db.run(os_view.load_order, os_id)
+    return templates.TemplateResponse("partials/os_items.html", {
+        "request": request, "os": order, "os_items": order.items, "errors": errors
+    })
+
+
 # --- ADICIONE ESTA NOVA FUNÇÃO (REMOVER ITEM) ---
 @app.delete("/os/{os_id}/item/{item_row_id}")
 async def delete_os_item(
     os_id: int, 
     item_row_id: int, 
-    session: Session = Depends(get_session)
+    db: RequestDB = Depends(get_write_db)
 ):
     """Remove um item da OS e DEVOLVE ao estoque (Estorno)"""
-    os_obj = session.get(ServiceOrder, os_id)
-    
-    # Busca o registro da venda (ServiceOrderItem)
-    order_item = session.get(ServiceOrderItem, item_row_id)
-    
-    if not os_obj or not order_item:
-        raise HTTPException(status_code=404)
+    def refund(session):
+        # Remove a linha e lê o que foi vendido numa única instrução:
+        # dois cliques simultâneos não conseguem estornar a mesma linha duas vezes
+        removed = session.execute(
+            delete(ServiceOrderItem)
+            .where(ServiceOrderItem.id == item_row_id, ServiceOrderItem.order_id == os_id)
+            .returning(ServiceOrderItem.item_id, ServiceOrderItem.quantity_sold)
+        ).first()
+        if removed is None:
+            return None
         
-    # Busca a peça original para devolver ao estoque
-    inventory_item = session.get(InventoryItem, order_item.item_id)
-    
-    # 1. Estorno Financeiro
-    subtotal = order_item.quantity_sold * order_item.price_at_moment
-    os_obj.total_value -= subtotal
-    
-    # Evitar erros de arredondamento flutuante deixando negativo
-    if os_obj.total_value < 0: os_obj.total_value = 0
-    
-    # 2. Estorno de Estoque (Se o item ainda existir no cadastro)
-    if inventory_item:
-        inventory_item.quantity += order_item.quantity_sold
-        session.add(inventory_item)
-    
-    # 3. Remove o item da OS
-    session.delete(order_item)
-    session.add(os_obj)
-    session.commit()
+        # 1. Estorno de Estoque (Se o item ainda existir no cadastro)
+        stock.release(session, removed.item_id, removed.quantity_sold)
+        # 2. Estorno Financeiro: total volta a ser a soma dos itens restantes
+        stock.recompute_total(session, os_id)
+        ai_cache.invalidate(session, ai_cache.KIND_REPORT, os_id)
+        session.commit()
+        return removed
+
+    removed = await stock.run_retrying(db, refund)
+    if removed is None:
+        await db.rollback()
+        raise HTTPException(status_code=404)
     
+    event_bus.publish(f"os:{os_id}", f"inventory:{removed.item_id}", "dashboard")
     return Response(status_code=200) # HTMX remove a linha da tabela
 
 @app.post("/os/{os_id}/close")
-async def close_os(os_id: int, session: Session = Depends(get_session)):
-    os_obj = session.get(ServiceOrder, os_id)
-    if not os_obj: 
+async def close_os(os_id: int, db: RequestDB = Depends(get_write_db)):
+    def close(session):
+        os_obj = session.get(ServiceOrder, os_id)
+        if not os_obj:
+            return False
+        
+        # Atualiza status para Fechado
+        os_obj.status = ServiceOrderStatus.CLOSED
+        session.add(os_obj)
+        session.commit()
+        return True
+
+    if not await db.run(close): 
         raise HTTPException(status_code=404, detail="OS não encontrada")
-    
-    # Atualiza status para Fechado
-    os_obj.status = ServiceOrderStatus.CLOSED
-    session.add(os_obj)
-    session.commit()
+    event_bus.publish(f"os:{os_id}", "dashboard")
     
     # Recarrega a página para mostrar o novo estado
     return RedirectResponse(url=f"/os/{os_id}", status_code=303)
 
 @app.get("/os/{os_id}/print", response_class=HTMLResponse)
-async def print_os(os_id: int, request: Request, session: Session = Depends(get_session)):
+async def print_os(os_id: int, request: Request, db: RequestDB = Depends(get_db)):
     """Rota simplificada apenas para impressão"""
-    os_obj = session.get(ServiceOrder, os_id)
-    if not os_obj: raise HTTPException(status_code=404)
-    client = session.get(Client, os_obj.client_id)
-    
-    # Busca itens
-    items_results = session.exec(select(ServiceOrderItem, InventoryItem).where(
-        ServiceOrderItem.order_id == os_id, ServiceOrderItem.item_id == InventoryItem.id
-    )).all()
-    
-    # Prepara dados para o template
-    class PrintItem:
-        def __init__(self, oi, ii):
-            self.name = ii.name
-            self.qty = oi.quantity_sold
-            self.price = oi.price_at_moment
-            self.subtotal = oi.quantity_sold * oi.price_at_moment
-
-    print_items = [PrintItem(oi, ii) for oi, ii in items_results]
-
-    return templates.TemplateResponse("print_os.html", {
-        "request": request, 
-        "os": os_obj, 
-        "client": client, 
-        "items": print_items,
+    version = await db.run(http_cache.order_version, os_id)
+    if not version: raise HTTPException(status_code=404)
+    etag = http_cache.make_etag("print_os", os_id, version)
+    # OS fechada não muda mais: o navegador reusa a impressão sem nem perguntar
+    closed = version[1] == ServiceOrderStatus.CLOSED.name
+    cache_control = http_cache.closed_order_cache_control() if closed else http_cache.REVALIDATE
+    if http_cache.is_fresh(request, etag):
+        return http_cache.not_modified(etag, cache_control)
+
+    # Mesmos dados da impressão em lote (app/print_batch.py)
+    order = await db.run(os_view.load_order, os_id)
+    if not order: raise HTTPException(status_code=404)
+
+    return http_cache.tag(templates.TemplateResponse("print_os.html", {
+        "request": request,
+        **print_batch.print_context(order),
         "now": datetime.now()
-    })
+    }), etag, cache_control)
 
 # --- IA ---
 @app.post("/os/{os_id}/generate_report")
-async def generate_report(os_id: int, session: Session = Depends(get_session)):
-    os_obj = session.get(ServiceOrder, os_id)
-    if not os_obj: return HTMLResponse("OS not found", status_code=404)
-    client = session.get(Client, os_obj.client_id)
+async def generate_report(os_id: int, db: RequestDB = Depends(get_db)):
+    order = await db.run(os_view.load_order, os_id)
+    if not order: return HTMLResponse("OS not found", status_code=404)
+    client = order.client
     
-    items_results = session.exec(select(ServiceOrderItem, InventoryItem).where(
-        ServiceOrderItem.order_id == os_id, ServiceOrderItem.item_id == InventoryItem.id
-    )).all()
-    
-    items_list_str = "".join([f"- {ii.name} (x{oi.quantity_sold})\n" for oi, ii in items_results])
+    items_list_str = "".join([f"- {line.name} (x{line.quantity_sold})\n" for line in order.items])
     
     if not items_list_str:
         return HTMLResponse("""
@@ -362,7 +550,7 @@ async def generate_report(os_id: int, session: Session = Depends(get_session)):
     LISTA REAL DE PEÇAS/SERVIÇOS REALIZADOS (USE APENAS ESTES):
     {items_list_str}
     
-    Valor Total: R$ {os_obj.total_value:.2f}
+    Valor Total: R$ {order.total_value:.2f}
     
     Instruções RÍGIDAS:
     1. Cite APENAS as peças listada acima. NÃO INVENTE NENHUM OUTRO SERVIÇO.
@@ -373,8 +561,11 @@ async def generate_report(os_id: int, session: Session = Depends(get_session)):
     """
     
     try:
-        response = model.generate_content(prompt)
-        message = response.text
+        cache_key = ai_cache.report_key(order)
+        message = await db.run(ai_cache.get, cache_key)
+        if message is None:
+            message = await ai_executor.generate(prompt)
+            await run_in_threadpool(ai_cache.store, engine, cache_key, ai_cache.KIND_REPORT, os_id, message)
         whatsapp_link = f"https://wa.me/55{client.phone.replace(' ','')}?text={urllib.parse.quote(message)}"
         
         return HTMLResponse(f"""
@@ -387,8 +578,8 @@ async def generate_report(os_id: int, session: Session = Depends(get_session)):
         return HTMLResponse(f"<div class='alert alert-danger'>Erro IA: {str(e)}</div>")
 
 @app.post("/inventory/{item_id}/analyze")
-async def analyze_price(item_id: int, session: Session = Depends(get_session)):
-    item = session.get(InventoryItem, item_id)
+async def analyze_price(item_id: int, db: RequestDB = Depends(get_db)):
+    item = await db.get(InventoryItem, item_id)
     if not item: return HTMLResponse("Item não encontrado")
 
     prompt = f"""Analise preço autopeça Brasil. Produto: {item.name}. Venda: R$ {item.sell_price:.2f}.
@@ -398,7 +589,247 @@ async def analyze_price(item_id: int, session: Session = Depends(get_session)):
     3. Use classes Bootstrap (text-success/warning/danger)."""
     
     try:
-        response = model.generate_content(prompt)
-        return HTMLResponse(response.text)
+        cache_key = ai_cache.price_key(item)
+        analysis = await db.run(ai_cache.get, cache_key)
+        if analysis is None:
+            analysis = await ai_executor.generate(prompt)
+            await run_in_threadpool(ai_cache.store, engine, cache_key, ai_cache.KIND_PRICE, item_id, analysis)
+        return HTMLResponse(analysis)
     except Exception as e:
         return HTMLResponse(f"<span class='text-danger'>Erro IA: {str(e)}</span>")
+
+# --- Eventos ao vivo (SSE) ---
+def live_fragment(key: str):
+    """
+    HTML atual de uma chave publicada (app/events.py), como (evento SSE, html).
+    O nome do evento é o `sse-swap` do elemento na tela; peça excluída vai
+    vazia (o outerHTML remove a linha).
+    """
+    kind, _, ref = key.partition(":")
+    with Session(engine) as session:
+        if kind == "inventory" and not ref:
+            # Lista inteira mudou: a tela recarrega (como no excesso de pendências)
+            return events.RESYNC, events.RELOAD_HTML
+        if kind == "inventory":
+            item = session.get(InventoryItem, int(ref))
+            html = templates.get_template("partials/inventory_rows.html").render(items=[item]) if item else ""
+            return f"inventory-{ref}", html
+        if kind == "os":
+            order = os_view.load_order(session, int(ref))
+            if not order:
+                return None
+            return f"os-{ref}", templates.get_template("partials/os_items.html").render(os=order, os_items=order.items)
+        if kind == "dashboard":
+            stats = dashboard.get_stats(session)
+            return "dashboard", templates.get_template("partials/dashboard_stats.html").render(
+                total_inventory_value=stats.total_inventory_value,
+                low_stock_count=stats.low_stock_count,
+                open_os_count=stats.open_os_count,
+            )
+    return None
+
+@app.get("/events")
+async def stream_events(topics: str = "inventory,dashboard"):
+    """
+    SSE com as mudanças dos tópicos pedidos (ex: "inventory,dashboard" ou "os:5").
+    Cada mensagem traz o fragmento atualizado, que o HTMX (extensão sse) troca na tela.
+    """
+    subscription = event_bus.subscribe(t.strip() for t in topics.split(",") if t.strip())
+    return events.EventStreamResponse(subscription, live_fragment)
+
+@app.get("/metrics")
+async def read_metrics():
+    """Métricas no formato do Prometheus (latência por rota, SQL, templates, IA)"""
+    ai_stats = ai_executor.metrics()
+    bus_stats = event_bus.metrics()
+    archive_stats = archive.stats()
+    return PlainTextResponse(metrics.render([
+        ("oficina_ai_queue_length", "gauge", "Pedidos à IA aguardando vaga", ai_stats["queued"]),
+        ("oficina_ai_in_flight", "gauge", "Chamadas à IA em andamento", ai_stats["in_flight"]),
+        ("oficina_ai_rejected_total", "counter", "Pedidos à IA recusados por fila cheia", ai_stats["rejected"]),
+        ("oficina_ai_timeouts_total", "counter", "Pedidos à IA que estouraram AI_TIMEOUT", ai_stats["timeouts"]),
+        ("oficina_events_subscribers", "gauge", "Telas conectadas em /events", bus_stats["subscribers"]),
+        ("oficina_events_published_total", "counter", "Chaves publicadas pelas rotas de escrita", bus_stats["published"]),
+        ("oficina_events_coalesced_total", "counter", "Chaves juntadas a uma pendente (cliente lento)", bus_stats["coalesced"]),
+        ("oficina_events_resyncs_total", "counter", "Clientes mandados recarregar por excesso de pendências", bus_stats["resyncs"]),
+        ("oficina_archive_orders_total", "counter", "OS movidas para o banco de arquivo", archive_stats["orders"]),
+        ("oficina_archive_skipped_total", "counter", "OS adiadas por mudarem durante o arquivamento", archive_stats["skipped"]),
+    ]), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/ai/metrics")
+async def ai_metrics(db: RequestDB = Depends(get_db)):
+    """Fila, concorrência e latência das chamadas de IA, e acertos do cache"""
+    return JSONResponse({**ai_executor.metrics(), "cache": await db.run(ai_cache.stats)})
+
+# --- Análise de preço em lote ---
+@app.post("/inventory/analysis/jobs", response_class=HTMLResponse)
+async def create_analysis_job(
+    request: Request,
+    category: Annotated[str, Form()] = "",
+    db: RequestDB = Depends(get_write_db)
+):
+    job = await db.run(price_jobs.create_job, category.strip())
+    return templates.TemplateResponse("partials/analysis_job.html", {"request": request, "job": job})
+
+@app.get("/inventory/analysis/jobs/{job_id}", response_class=HTMLResponse)
+async def read_analysis_job(request: Request, job_id: int, db: RequestDB = Depends(get_db)):
+    """Progresso do job (consultado pelo HTMX a cada 2s enquanto roda)"""
+    job = await db.get(PriceAnalysisJob, job_id)
+    if not job: raise HTTPException(status_code=404)
+    return templates.TemplateResponse("partials/analysis_job.html", {"request": request, "job": job})
+
+@app.post("/inventory/analysis/jobs/{job_id}/resume", response_class=HTMLResponse)
+async def resume_analysis_job(request: Request, job_id: int, db: RequestDB = Depends(get_write_db)):
+    job = await db.run(price_jobs.resume_job, job_id)
+    if not job: raise HTTPException(status_code=404)
+    return templates.TemplateResponse("partials/analysis_job.html", {"request": request, "job": job})
+
+# --- Importação em massa (CSV/XLSX) ---
+# Chaves publicadas ao fim de uma importação (app/events.py)
+IMPORT_EVENTS = {
+    importer.KIND_INVENTORY: ("inventory", "dashboard"),
+    importer.KIND_CLIENTS: ("clients",),
+}
+
+def run_import(job_id: int):
+    """
+    Importação em segundo plano. Os eventos saem uma vez, no fim (mesmo se
+    falhar: os lotes já gravados ficam): recarregar as telas a cada lote
+    só as faria piscar durante a importação.
+    """
+    job = importer.run_job(engine, job_id)
+    if job.inserted or job.updated:
+        event_bus.publish(*IMPORT_EVENTS[job.kind])
+
+def import_job_response(request: Request, job: ImportJob):
+    return templates.TemplateResponse("partials/import_job.html", {
+        "request": request, "job": job, "errors": importer.job_errors(job)[:20], "stale": importer.is_stale(job)
+    })
+
+@app.post("/import/{kind}", response_class=HTMLResponse)
+async def create_import_job(
+    request: Request,
+    kind: str,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    db: RequestDB = Depends(get_db)
+):
+    """Recebe a planilha e importa em segundo plano; o HTMX acompanha o progresso."""
+    if kind not in importer.SPECS:
+        raise HTTPException(status_code=404)
+    if not file.filename.lower().endswith((".csv", ".txt", ".xlsx")):
+        raise HTTPException(status_code=400, detail="Envie um arquivo .csv ou .xlsx")
+
+    # Cópia e contagem de linhas numa thread e fora da fila única de escrita
+    # (um .xlsx grande leva segundos): ela fica só com a gravação do job
+    path = await run_in_threadpool(importer.save_upload, file.file, file.filename)
+    total_rows = await run_in_threadpool(importer.count_rows, path)
+
+    def start(session):
+        with writer_lane():
+            job = importer.create_job(session, kind, path, file.filename, total_rows)
+            importer.claim(session, job.id)
+        session.refresh(job)
+        return job
+
+    job = await db.offload(start)
+    background_tasks.add_task(run_import, job.id)
+    return import_job_response(request, job)
+
+@app.get("/import/jobs/{job_id}", response_class=HTMLResponse)
+async def read_import_job(request: Request, job_id: int, db: RequestDB = Depends(get_db)):
+    """Progresso da importação (consultado pelo HTMX a cada 1s enquanto roda)"""
+    job = await db.get(ImportJob, job_id)
+    if not job: raise HTTPException(status_code=404)
+    return import_job_response(request, job)
+
+@app.post("/import/jobs/{job_id}/resume", response_class=HTMLResponse)
+async def resume_import_job(
+    request: Request,
+    job_id: int,
+    background_tasks: BackgroundTasks,
+    db: RequestDB = Depends(get_db)
+):
+    """Continua uma importação que falhou ou ficou órfã, a partir do último lote gravado."""
+    def resume(session):
+        job = session.get(ImportJob, job_id)
+        if not job:
+            return None, False
+        path = job.path
+        # Fecha a leitura antes de escrever (no WAL, a leitura aberta não vira escrita se outro gravou)
+        session.rollback()
+        with writer_lane():
+            claimed = os.path.exists(path) and importer.claim(session, job_id)
+        session.refresh(job)
+        return job, claimed
+
+    # Numa thread: a espera pela fila de escrita não trava o event loop.
+    # O job (run_job) só entra na fila depois, lote a lote
+    job, claimed = await db.offload(resume)
+    if not job: raise HTTPException(status_code=404)
+    if claimed:
+        background_tasks.add_task(run_import, job_id)
+    return import_job_response(request, job)
+
+@app.get("/import/jobs/{job_id}/errors.csv")
+async def download_import_errors(job_id: int, db: RequestDB = Depends(get_db)):
+    """Relatório das linhas recusadas (linha da planilha + motivo)."""
+    job = await db.get(ImportJob, job_id)
+    if not job: raise HTTPException(status_code=404)
+    lines = ["linha;motivo"] + [f"{line};{message}" for line, message in importer.job_errors(job)]
+    return Response(
+        "\n".join(lines) + "\n",
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="importacao_{job_id}_erros.csv"'},
+    )
+
+# --- Exportações para a contabilidade ---
+@app.get("/export/{dataset}")
+async def export_data(
+    dataset: str,
+    format: str = exports.FORMAT_CSV,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    gzip: bool = False
+):
+    """
+    Baixa Estoque (inventory), OS (orders) ou itens vendidos (sales) em
+    CSV, JSON Lines ou Parquet, gerados em streaming a partir do cursor.
+    """
+    # A sessão pertence ao streaming: é fechada quando o arquivo termina
+    session = Session(engine)
+    try:
+        chunks = exports.stream(session, dataset, format, start, end, gzip)
+    except exports.ExportError as e:
+        session.close()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def body():
+        try:
+            yield from chunks
+        finally:
+            session.close()
+
+    media_type = "application/gzip" if gzip else exports.MEDIA_TYPES[format]
+    name = exports.filename(dataset, format, start, end, gzip)
+    return StreamingResponse(body(), media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="{name}"'
+    })
+
+# --- Relatórios ---
+@app.get("/reports", response_class=HTMLResponse)
+async def read_reports(
+    request: Request,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: RequestDB = Depends(get_db)
+):
+    """Vendas, margem, giro e reposição do período (padrão: últimos 30 dias)."""
+    default_start, default_end = analytics.default_period()
+    start, end = start or default_start, end or default_end
+    if end < start:
+        start, end = end, start
+    # O cálculo (SQL + pandas) roda numa thread; em cache, a resposta é imediata
+    report = await db.offload(analytics.get_report, start, end)
+    return templates.TemplateResponse("reports.html", {"request": request, "report": report})
+
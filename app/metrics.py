@@ -0,0 +1,328 @@
+"""
+Métricas de desempenho da aplicação, no formato texto do Prometheus (/metrics).
+
+O que é medido:
+  - cada requisição HTTP (middleware ASGI): latência por rota/método/status,
+    quantidade e tempo de SQL da requisição, requisições em andamento;
+  - cada instrução SQL (eventos da engine do SQLAlchemy): duração por tipo
+    (SELECT/INSERT/UPDATE/DELETE/OTHER), inclusive as de tarefas de fundo;
+  - cada renderização de template Jinja2 (inclusive as em streaming);
+  - cada chamada ao modelo de IA (app/ai.py).
+
+A rota é o caminho do FastAPI ("/os/{os_id}"), não a URL: o número de
+séries não cresce com os ids. Os dados da requisição atual ficam num
+ContextVar, que acompanha a requisição nas threads do pool (dependências
+síncronas, run_in_threadpool, streaming).
+
+Requisições acima de METRICS_SLOW_REQUEST_MS vão para o log "app.metrics"
+com as instruções SQL mais demoradas da requisição.
+
+Custo: um lock e uma busca binária por observação (microssegundos); sem
+dependências externas.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from jinja2 import Template
+from sqlalchemy import event
+
+from app import config
+
+logger = logging.getLogger("app.metrics")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+AI_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+# Instruções guardadas por requisição para o log de lentas
+_MAX_STATEMENTS_PER_REQUEST = 1000
+_SLOW_LOG_TOP = 5
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.label_names = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [contagem por faixa..., soma, total]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {_number(series[-2])}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}"
+
+
+REQUEST_SECONDS = Histogram(
+    "oficina_http_request_duration_seconds", "Tempo de resposta por rota (até o último byte enviado)",
+    ("method", "route", "status"),
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "oficina_http_request_sql_statements", "Instruções SQL por requisição", ("method", "route"), COUNT_BUCKETS,
+)
+REQUEST_SQL_SECONDS = Histogram(
+    "oficina_http_request_sql_seconds", "Tempo total de SQL por requisição", ("method", "route"),
+)
+REQUEST_TEMPLATE_SECONDS = Histogram(
+    "oficina_http_request_template_seconds", "Tempo de renderização de templates por requisição",
+    ("method", "route"),
+)
+IN_PROGRESS = Gauge("oficina_http_requests_in_progress", "Requisições em andamento")
+SLOW_REQUESTS = Counter(
+    "oficina_http_slow_requests_total", "Requisições acima de METRICS_SLOW_REQUEST_MS", ("method", "route"),
+)
+SQL_SECONDS = Histogram(
+    "oficina_sql_statement_duration_seconds", "Duração de cada instrução SQL", ("operation",), SQL_BUCKETS,
+)
+TEMPLATE_SECONDS = Histogram(
+    "oficina_template_render_seconds", "Renderização de cada template Jinja2", ("template",), SQL_BUCKETS,
+)
+AI_CALL_SECONDS = Histogram(
+    "oficina_ai_call_duration_seconds", "Duração das chamadas ao modelo de IA (sem a fila)", ("outcome",),
+    AI_BUCKETS,
+)
+
+REGISTRY = [
+    REQUEST_SECONDS, REQUEST_SQL_STATEMENTS, REQUEST_SQL_SECONDS, REQUEST_TEMPLATE_SECONDS, IN_PROGRESS,
+    SLOW_REQUESTS, SQL_SECONDS, TEMPLATE_SECONDS, AI_CALL_SECONDS,
+]
+
+
+class RequestStats:
+    """Números da requisição em andamento."""
+    __slots__ = ("sql_count", "sql_seconds", "template_seconds", "statements", "done", "event_stream")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.statements = [] if config.METRICS_SLOW_REQUEST_MS > 0 else None
+        self.done = False
+        # SSE (/events): conexão longa por natureza, não entra no log de lentas
+        self.event_stream = False
+
+
+_current: ContextVar = ContextVar("metrics_request", default=None)
+
+
+# --- SQL ---
+
+_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started
+    head = statement.lstrip()[:6].upper()
+    SQL_SECONDS.observe(elapsed, head if head in _OPERATIONS else "OTHER")
+    stats = _current.get()
+    if stats is not None and not stats.done:
+        stats.sql_count += 1
+        stats.sql_seconds += elapsed
+        if stats.statements is not None and len(stats.statements) < _MAX_STATEMENTS_PER_REQUEST:
+            stats.statements.append((elapsed, statement))
+
+
+def instrument_engine(engine):
+    """Mede as instruções SQL executadas pela engine."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# --- Templates ---
+
+def _observe_template(name, elapsed):
+    TEMPLATE_SECONDS.observe(elapsed, name or "<string>")
+    stats = _current.get()
+    if stats is not None and not stats.done:
+        stats.template_seconds += elapsed
+
+
+class TimedTemplate(Template):
+    """Template que mede `render()` e `generate()` (só o tempo gerando, não o de envio)."""
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            _observe_template(self.name, time.perf_counter() - started)
+
+    def generate(self, *args, **kwargs):
+        chunks = super().generate(*args, **kwargs)
+        elapsed = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    elapsed += time.perf_counter() - started
+                    return
+                elapsed += time.perf_counter() - started
+                yield chunk
+        finally:
+            _observe_template(self.name, elapsed)
+
+
+def instrument_templates(templates):
+    """Usa TimedTemplate nos templates do Jinja2Templates (antes do primeiro carregamento)."""
+    templates.env.template_class = TimedTemplate
+
+
+# --- Requisições HTTP ---
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "(sem rota)"
+
+
+def _finish(scope, stats, status, elapsed):
+    if stats.done:
+        return
+    stats.done = True
+    method, route = scope["method"], _route_label(scope)
+    REQUEST_SECONDS.observe(elapsed, method, route, str(status))
+    REQUEST_SQL_STATEMENTS.observe(stats.sql_count, method, route)
+    REQUEST_SQL_SECONDS.observe(stats.sql_seconds, method, route)
+    REQUEST_TEMPLATE_SECONDS.observe(stats.template_seconds, method, route)
+    slow = config.METRICS_SLOW_REQUEST_MS > 0 and elapsed * 1000 >= config.METRICS_SLOW_REQUEST_MS
+    if slow and not stats.event_stream:
+        SLOW_REQUESTS.inc(method, route)
+        _log_slow(scope, stats, status, elapsed)
+
+
+def _log_slow(scope, stats, status, elapsed):
+    path = scope["path"] + ("?" + scope["query_string"].decode("latin-1") if scope.get("query_string") else "")
+    lines = [
+        f"Requisição lenta: {scope['method']} {path} -> {status} em {elapsed * 1000:.0f} ms "
+        f"(SQL: {stats.sql_count} instruções, {stats.sql_seconds * 1000:.0f} ms; "
+        f"templates: {stats.template_seconds * 1000:.0f} ms)"
+    ]
+    for seconds, statement in sorted(stats.statements or (), key=lambda s: s[0], reverse=True)[:_SLOW_LOG_TOP]:
+        lines.append(f"  {seconds * 1000:8.1f} ms  {' '.join(statement.split())[:500]}")
+    logger.warning("\n".join(lines))
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI puro (não bufferiza a resposta): a latência vai até o
+    último pedaço do corpo, o que inclui respostas em streaming.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+        IN_PROGRESS.inc()
+
+        async def send_with_metrics(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                stats.event_stream = (b"content-type", b"text/event-stream") in (
+                    (name.lower(), value.split(b";")[0]) for name, value in message.get("headers", ())
+                )
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                # Tarefas em segundo plano rodam depois disso e não contam para a rota
+                _finish(scope, stats, status, time.perf_counter() - started)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            IN_PROGRESS.dec()
+            _finish(scope, stats, status, time.perf_counter() - started)
+            _current.reset(token)
+
+
+def render(extra=()) -> str:
+    """
+    Todas as métricas no formato texto do Prometheus (versão 0.0.4).
+    `extra`: valores lidos na hora, como (nome, "gauge"|"counter", descrição, valor).
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for name, kind, help_text, value in extra:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {_number(value)}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,155 @@
+"""
+Migrações versionadas do banco.
+
+`create_all` só cria tabelas que ainda não existem: índices e colunas novas
+nunca chegariam a um `oficina.db` já em uso. Cada migração tem um número
+de versão; a versão atual do banco fica em `PRAGMA user_version` e, na
+inicialização, as migrações pendentes rodam em ordem, cada uma na sua
+própria transação (a versão só avança se todos os passos derem certo).
+
+Os passos podem ser SQL (string) ou uma função que recebe a conexão.
+
+Uso pela linha de comando:
+    python -m app.migrations                # aplica as migrações pendentes
+    python -m app.migrations --check-plans  # falha se uma consulta quente varrer a tabela
+"""
+import re
+import sys
+
+from sqlalchemy import text
+
+from app.client_keys import PHONE_KEY_SQL, PLATE_KEY_SQL
+
+
+def _add_column(table: str, ddl: str):
+    """Passo que acrescenta a coluna se ela ainda não existe (bancos novos já a têm pelo create_all)."""
+    def step(conn):
+        # table_xinfo também lista as colunas geradas (table_info as esconde)
+        columns = {row[1] for row in conn.execute(text(f"PRAGMA table_xinfo({table})"))}
+        if ddl.split()[0] not in columns:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {ddl}"))
+    return step
+
+
+# (versão, descrição, passos)
+MIGRATIONS = [
+    (1, "Índices das chaves estrangeiras e colunas de busca", [
+        "CREATE INDEX IF NOT EXISTS ix_serviceorderitem_order_id ON serviceorderitem (order_id)",
+        "CREATE INDEX IF NOT EXISTS ix_serviceorderitem_item_id ON serviceorderitem (item_id)",
+        "CREATE INDEX IF NOT EXISTS ix_serviceorder_client_id ON serviceorder (client_id)",
+        "CREATE INDEX IF NOT EXISTS ix_serviceorder_created_at ON serviceorder (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_serviceorder_status_created_at ON serviceorder (status, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_client_car_plate ON client (car_plate)",
+        "CREATE INDEX IF NOT EXISTS ix_client_phone ON client (phone)",
+    ]),
+    (2, "Coluna de versão das linhas (ETag)", [
+        _add_column(table, "version INTEGER NOT NULL DEFAULT 1")
+        for table in ("inventoryitem", "serviceorder", "client")
+    ]),
+    # Recriado por analytics.install com o WHEN que ignora as OS sendo arquivadas
+    (3, "Vendas diárias preservadas ao arquivar OS", [
+        "DROP TRIGGER IF EXISTS salesdaily_item_delete",
+    ]),
+    # VIRTUAL: o ALTER TABLE do SQLite não acrescenta coluna gerada STORED
+    (4, "Chaves normalizadas de placa e telefone (busca de clientes)", [
+        _add_column("client", f"plate_key VARCHAR GENERATED ALWAYS AS ({PLATE_KEY_SQL}) VIRTUAL"),
+        _add_column("client", f"phone_key VARCHAR GENERATED ALWAYS AS ({PHONE_KEY_SQL}) VIRTUAL"),
+        "CREATE INDEX IF NOT EXISTS ix_client_plate_key ON client (plate_key)",
+        "CREATE INDEX IF NOT EXISTS ix_client_phone_key ON client (phone_key)",
+        "CREATE INDEX IF NOT EXISTS ix_client_name_nocase ON client (name COLLATE NOCASE)",
+    ]),
+    (5, "Dono da reserva dos jobs de análise de preço", [
+        _add_column("priceanalysisjob", "owner VARCHAR"),
+    ]),
+]
+
+# Consultas das rotas mais acessadas que não podem virar varredura completa
+HOT_QUERIES = [
+    ("itens da OS (detalhes, impressão, relatório IA)",
+     "SELECT * FROM serviceorderitem JOIN inventoryitem ON serviceorderitem.item_id = inventoryitem.id "
+     "WHERE serviceorderitem.order_id = 1"),
+    ("vendas de uma peça",
+     "SELECT * FROM serviceorderitem WHERE item_id = 1"),
+    ("OS abertas (dashboard/reconciliação)",
+     "SELECT COUNT(*) FROM serviceorder WHERE status = 'OPEN'"),
+    ("OS por status ordenadas por data",
+     "SELECT * FROM serviceorder WHERE status = 'OPEN' ORDER BY created_at DESC LIMIT 50"),
+    ("OS de um cliente",
+     "SELECT * FROM serviceorder WHERE client_id = 1"),
+    ("OS por período",
+     "SELECT * FROM serviceorder WHERE created_at >= '2024-01-01' AND created_at < '2024-02-01'"),
+    ("lista de OS (página)",
+     "SELECT * FROM serviceorder JOIN client ON serviceorder.client_id = client.id "
+     "WHERE serviceorder.id < 1000 ORDER BY serviceorder.id DESC LIMIT 51"),
+    ("cliente por placa",
+     "SELECT * FROM client WHERE car_plate = 'ABC1D23'"),
+    ("cliente por telefone",
+     "SELECT * FROM client WHERE phone = '11999999999'"),
+    ("busca de cliente por placa (prefixo)",
+     "SELECT * FROM client WHERE plate_key >= 'ABC1' AND plate_key < 'ABC2' ORDER BY plate_key LIMIT 10"),
+    ("busca de cliente por telefone (prefixo)",
+     "SELECT * FROM client WHERE phone_key >= '1199' AND phone_key < '119:' ORDER BY phone_key LIMIT 10"),
+    ("busca de cliente por nome (prefixo)",
+     "SELECT * FROM client WHERE name LIKE 'silv%' ORDER BY name COLLATE NOCASE LIMIT 10"),
+]
+
+_SCAN = re.compile(r"^SCAN (\w+)(?! VIRTUAL TABLE)")
+
+
+def current_version(conn) -> int:
+    return conn.execute(text("PRAGMA user_version")).scalar()
+
+
+def migrate(engine) -> int:
+    """Aplica as migrações pendentes e devolve a versão final do banco."""
+    with engine.connect() as conn:
+        version = current_version(conn)
+
+    for number, description, steps in MIGRATIONS:
+        if number <= version:
+            continue
+        with engine.begin() as conn:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(text(step))
+            conn.execute(text(f"PRAGMA user_version = {number}"))
+        print(f"Migração {number} aplicada: {description}")
+        version = number
+    return version
+
+
+def explain(conn, sql: str) -> list:
+    """Linhas de detalhe do EXPLAIN QUERY PLAN de uma consulta."""
+    return [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+def check_query_plans(engine) -> list:
+    """
+    Roda EXPLAIN QUERY PLAN nas consultas quentes.
+    Devolve a lista de (nome, plano) das que fazem varredura completa de tabela.
+    """
+    failures = []
+    with engine.connect() as conn:
+        for name, sql in HOT_QUERIES:
+            plan = explain(conn, sql)
+            if any(_SCAN.match(detail) for detail in plan):
+                failures.append((name, plan))
+    return failures
+
+
+if __name__ == "__main__":
+    from app.database import create_db_and_tables, engine
+
+    create_db_and_tables()
+    with engine.connect() as conn:
+        print(f"Banco na versão {current_version(conn)}")
+
+    if "--check-plans" in sys.argv:
+        failures = check_query_plans(engine)
+        for name, plan in failures:
+            print(f"VARREDURA em '{name}': {' | '.join(plan)}")
+        if failures:
+            sys.exit(1)
+        print(f"{len(HOT_QUERIES)} consultas quentes usam índice")
@@ -1,8 +1,11 @@
 from typing import Optional
+from sqlalchemy import Column, Computed, Index, String, text
 from sqlmodel import Field, SQLModel
 from datetime import datetime
 from enum import Enum
 
+from app.client_keys import PHONE_KEY_SQL, PLATE_KEY_SQL
+
 # --- Enums ---
 class ServiceOrderStatus(str, Enum):
     """Status possíveis para uma Ordem de Serviço."""
@@ -10,6 +13,13 @@ class ServiceOrderStatus(str, Enum):
     CLOSED = "Closed"   # Fechada
     PENDING = "Pending" # Pendente
 
+class JobStatus(str, Enum):
+    """Status de um processamento em segundo plano."""
+    PENDING = "Pending"  # Na fila
+    RUNNING = "Running"  # Em execução
+    DONE = "Done"        # Concluído
+    FAILED = "Failed"    # Falhou (pode ser retomado)
+
 # --- Modelos de Dados (Tabelas) ---
 
 class Client(SQLModel, table=True):
@@ -17,12 +27,22 @@ class Client(SQLModel, table=True):
     Representa um Cliente da oficina.
     Armazena dados pessoais e do veículo principal.
     """
+    __table_args__ = (
+        # Busca por início do nome sem diferenciar maiúsculas (LIKE 'silv%' usa o índice)
+        Index("ix_client_name_nocase", text("name COLLATE NOCASE")),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str = Field(description="Nome completo do cliente")
-    phone: str = Field(description="Telefone para contato/WhatsApp")
+    phone: str = Field(index=True, description="Telefone para contato/WhatsApp")
     email: Optional[str] = None
     car_model: str = Field(description="Modelo do veículo (ex: Fiat Uno)")
-    car_plate: str = Field(description="Placa do veículo")
+    car_plate: str = Field(index=True, description="Placa do veículo")
+    # Chaves de busca/duplicidade calculadas pelo SQLite (ver app/client_keys.py)
+    plate_key: Optional[str] = Field(default=None, sa_column=Column(String, Computed(PLATE_KEY_SQL), index=True))
+    phone_key: Optional[str] = Field(default=None, sa_column=Column(String, Computed(PHONE_KEY_SQL), index=True))
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"},
+                         description="Versão da linha (trigger soma 1 a cada alteração; ETag)")
 
 class InventoryItem(SQLModel, table=True):
     """
@@ -36,17 +56,26 @@ class InventoryItem(SQLModel, table=True):
     quantity: int = Field(description="Quantidade atual em estoque")
     min_quantity: int = Field(description="Quantidade mínima para alerta")
     location: Optional[str] = Field(default=None, description="Localização física na oficina")
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"},
+                         description="Versão da linha (trigger soma 1 a cada alteração; ETag)")
 
 class ServiceOrder(SQLModel, table=True):
     """
     Representa uma Ordem de Serviço (OS).
     Vincula um cliente a um conjunto de serviços/peças.
     """
+    __table_args__ = (
+        # Contagem de OS abertas e listagens por status ordenadas por data
+        Index("ix_serviceorder_status_created_at", "status", "created_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    client_id: int = Field(foreign_key="client.id", description="ID do Cliente vinculado")
+    client_id: int = Field(foreign_key="client.id", index=True, description="ID do Cliente vinculado")
     status: ServiceOrderStatus = Field(default=ServiceOrderStatus.OPEN)
     total_value: float = Field(default=0.0, description="Valor total acumulado da OS")
-    created_at: datetime = Field(default_factory=datetime.now, description="Data de abertura")
+    created_at: datetime = Field(default_factory=datetime.now, index=True, description="Data de abertura")
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"},
+                         description="Versão da linha (trigger soma 1 a cada alteração; ETag)")
 
 class ServiceOrderItem(SQLModel, table=True):
     """
@@ -54,7 +83,117 @@ class ServiceOrderItem(SQLModel, table=True):
     Registra qual peça foi usada e o preço cobrado no momento.
     """
     id: Optional[int] = Field(default=None, primary_key=True)
-    order_id: int = Field(foreign_key="serviceorder.id")
-    item_id: int = Field(foreign_key="inventoryitem.id")
+    order_id: int = Field(foreign_key="serviceorder.id", index=True)
+    item_id: int = Field(foreign_key="inventoryitem.id", index=True)
     quantity_sold: int
     price_at_moment: float = Field(description="Preço da peça no momento da venda (congela o preço)")
+
+class DashboardStats(SQLModel, table=True):
+    """
+    Contadores do Painel (Dashboard) mantidos de forma incremental.
+    Linha única (id=1) atualizada por triggers do SQLite a cada escrita
+    em Estoque ou OS, para que a página inicial não precise varrer tabelas.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    total_inventory_value: float = Field(default=0.0, description="Soma de custo x quantidade do estoque")
+    low_stock_count: int = Field(default=0, description="Itens com quantidade <= mínimo")
+    open_os_count: int = Field(default=0, description="OS com status Aberta")
+
+class TableVersion(SQLModel, table=True):
+    """
+    Contador de alterações por tabela (ETag das listas, ver app/http_cache.py).
+    Somado por triggers a cada INSERT/UPDATE/DELETE na tabela.
+    """
+    name: str = Field(primary_key=True, description="Nome da tabela")
+    version: int = Field(default=1)
+
+class EventLog(SQLModel, table=True):
+    """
+    Eventos ao vivo compartilhados entre workers (EVENTS_BROKER=sqlite).
+    Cada worker lê as linhas novas e repassa às telas conectadas; as
+    antigas são apagadas depois de EVENTS_LOG_RETENTION segundos.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    topic: str = Field(description="Chave do que mudou (ex: 'inventory:5', 'os:3', 'dashboard')")
+    origin: str = Field(description="Worker que publicou")
+    created_at: datetime = Field(default_factory=datetime.now, index=True)
+
+class ArchiveBatch(SQLModel, table=True):
+    """
+    OS sendo removidas das tabelas quentes por já estarem no arquivo (app/archive.py).
+    Só tem linhas dentro da transação da mudança: os triggers de vendas
+    ignoram os itens dessas OS, e o histórico dos Relatórios não muda.
+    """
+    order_id: int = Field(primary_key=True)
+
+class SalesDaily(SQLModel, table=True):
+    """
+    Vendas somadas por dia e peça (base dos Relatórios).
+    Mantida por triggers em `serviceorderitem` (ver app/analytics.py): o
+    relatório de um ano lê no máximo 365 x peças vendidas linhas.
+    """
+    day: str = Field(primary_key=True, description="Data da OS (AAAA-MM-DD)")
+    item_id: int = Field(primary_key=True)
+    units: int = Field(default=0)
+    revenue: float = Field(default=0.0, description="Soma de quantidade x preço cobrado")
+
+class AICacheEntry(SQLModel, table=True):
+    """
+    Resposta da IA guardada em cache (análise de preço ou relatório de OS).
+    A chave é o hash das entradas normalizadas do prompt.
+    """
+    key: str = Field(primary_key=True, description="SHA-256 das entradas normalizadas")
+    kind: str = Field(index=True, description="Tipo: 'price' (peça) ou 'report' (OS)")
+    ref_id: int = Field(index=True, description="ID da peça ou da OS de origem")
+    value: str = Field(description="Texto/HTML devolvido pela IA")
+    created_at: datetime = Field(default_factory=datetime.now)
+    last_used_at: datetime = Field(default_factory=datetime.now, index=True, description="Último acesso (LRU)")
+
+class PriceAnalysisJob(SQLModel, table=True):
+    """
+    Análise de preço em lote de todo o estoque (ou de uma categoria).
+    O progresso é salvo a cada lote (`last_item_id`), então o job
+    continua de onde parou após reiniciar o servidor.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    category: Optional[str] = Field(default=None, description="Categoria analisada (vazio = todo o estoque)")
+    status: JobStatus = Field(default=JobStatus.PENDING, index=True)
+    total_items: int = Field(default=0, description="Peças a analisar no início do job")
+    processed_items: int = Field(default=0, description="Peças já analisadas")
+    last_item_id: int = Field(default=0, description="Última peça concluída (ponto de retomada)")
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.now)
+    heartbeat_at: Optional[datetime] = Field(default=None, description="Último sinal de vida do worker que executa o job")
+    owner: Optional[str] = Field(default=None, description="Token do worker que reservou o job (muda a cada reserva)")
+    finished_at: Optional[datetime] = None
+
+class PriceAnalysis(SQLModel, table=True):
+    """Resultado da análise de preço (IA) de uma peça do estoque."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    item_id: int = Field(foreign_key="inventoryitem.id", index=True)
+    job_id: Optional[int] = Field(default=None, foreign_key="priceanalysisjob.id", index=True)
+    sell_price: float = Field(description="Preço de venda no momento da análise")
+    result: str = Field(description="HTML curto devolvido pela IA")
+    created_at: datetime = Field(default_factory=datetime.now)
+
+class ImportJob(SQLModel, table=True):
+    """
+    Importação em massa de uma planilha (CSV/XLSX) de Estoque ou Clientes.
+    Cada lote é gravado junto com o progresso (`processed_rows`), então a
+    importação pode ser retomada do ponto em que parou.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str = Field(description="Destino: 'inventory' ou 'clients'")
+    filename: str = Field(description="Nome original do arquivo enviado")
+    path: str = Field(description="Arquivo salvo no servidor durante a importação")
+    status: JobStatus = Field(default=JobStatus.PENDING, index=True)
+    total_rows: int = Field(default=0, description="Linhas de dados no arquivo")
+    processed_rows: int = Field(default=0, description="Linhas lidas (ponto de retomada)")
+    inserted: int = Field(default=0)
+    updated: int = Field(default=0)
+    error_count: int = Field(default=0, description="Linhas recusadas na validação")
+    errors: str = Field(default="[]", description="JSON com as primeiras linhas recusadas: [[linha, motivo], ...]")
+    error: Optional[str] = Field(default=None, description="Falha que interrompeu a importação")
+    created_at: datetime = Field(default_factory=datetime.now)
+    heartbeat_at: Optional[datetime] = Field(default=None, description="Último lote gravado (detecta importação órfã)")
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,119 @@
+"""
+Carga de uma OS completa (OS + cliente + itens com o nome da peça) numa
+única consulta, para as telas que mostram a OS: detalhes, tabela de itens
+(HTMX), impressão (unitária e em lote) e relatório de IA.
+
+O resultado são objetos de leitura compactos (dataclasses com __slots__,
+imutáveis, sem ligação com a Session), que podem ir direto para o template
+ou para outro processo (impressão em lote). Alterações continuam sendo
+feitas nos modelos (ServiceOrder, ServiceOrderItem).
+
+OS que não estão nas tabelas quentes são procuradas no banco de arquivo
+(app/archive.py), com a mesma consulta sobre as tabelas de lá.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from sqlmodel import Session, select
+
+from app import archive
+from app.models import Client, InventoryItem, ServiceOrder, ServiceOrderItem, ServiceOrderStatus
+
+# Ids por consulta IN (abaixo do limite de variáveis do SQLite)
+_ID_BATCH = 500
+
+# Nome mostrado para itens cuja peça foi excluída do cadastro
+DELETED_PART = "(peça excluída)"
+
+
+@dataclass(frozen=True, slots=True)
+class ClientView:
+    id: int
+    name: str
+    phone: str
+    email: Optional[str]
+    car_model: str
+    car_plate: str
+
+
+@dataclass(frozen=True, slots=True)
+class OrderLine:
+    id: int
+    item_id: int
+    name: str
+    quantity_sold: int
+    price_at_moment: float
+
+    @property
+    def subtotal(self) -> float:
+        return self.quantity_sold * self.price_at_moment
+
+
+@dataclass(frozen=True, slots=True)
+class OrderView:
+    id: int
+    status: ServiceOrderStatus
+    created_at: datetime
+    total_value: float
+    client: Optional[ClientView]
+    items: tuple
+
+    @property
+    def closed(self) -> bool:
+        return self.status == ServiceOrderStatus.CLOSED
+
+
+def _query(os_ids, orders=ServiceOrder.__table__, order_lines=ServiceOrderItem.__table__):
+    # OS 1 -> 1 cliente -> N itens: uma linha por item (ou uma só, sem itens)
+    return (
+        select(
+            orders.c.id, orders.c.status, orders.c.created_at, orders.c.total_value,
+            Client.id, Client.name, Client.phone, Client.email, Client.car_model, Client.car_plate,
+            order_lines.c.id, order_lines.c.item_id, InventoryItem.name,
+            order_lines.c.quantity_sold, order_lines.c.price_at_moment,
+        )
+        .select_from(orders)
+        .outerjoin(Client, Client.id == orders.c.client_id)
+        .outerjoin(order_lines, order_lines.c.order_id == orders.c.id)
+        .outerjoin(InventoryItem, InventoryItem.id == order_lines.c.item_id)
+        .where(orders.c.id.in_(os_ids))
+        .order_by(orders.c.id, order_lines.c.id)
+    )
+
+
+def _load(session: Session, os_ids, found: dict, *tables):
+    for i in range(0, len(os_ids), _ID_BATCH):
+        current_id, head, client, lines = None, None, None, []
+        for row in session.exec(_query(os_ids[i:i + _ID_BATCH], *tables)):
+            if row[0] != current_id:
+                if current_id is not None:
+                    found[current_id] = OrderView(*head, client, tuple(lines))
+                current_id, head, lines = row[0], row[0:4], []
+                client = ClientView(*row[4:10]) if row[4] is not None else None
+            if row[10] is not None:
+                line_id, item_id, name, quantity_sold, price = row[10:15]
+                lines.append(OrderLine(line_id, item_id, name or DELETED_PART, quantity_sold, price))
+        if current_id is not None:
+            found[current_id] = OrderView(*head, client, tuple(lines))
+
+
+def load_orders(session: Session, os_ids) -> List[OrderView]:
+    """
+    OS pedidas, na ordem dos ids (ids inexistentes são ignorados).
+    Uma consulta por lote de até 500 OS, qualquer que seja o número de itens;
+    as que não estão nas tabelas quentes vêm do arquivo (mais uma por lote).
+    """
+    os_ids = list(dict.fromkeys(os_ids))
+    found = {}
+    _load(session, os_ids, found)
+    missing = [os_id for os_id in os_ids if os_id not in found]
+    if missing and archive.available(session.connection()):
+        _load(session, missing, found, archive.orders, archive.lines)
+    return [found[os_id] for os_id in os_ids if os_id in found]
+
+
+def load_order(session: Session, os_id: int) -> Optional[OrderView]:
+    """A OS com cliente e itens (uma consulta), ou None se não existir."""
+    orders = load_orders(session, [os_id])
+    return orders[0] if orders else None
@@ -0,0 +1,119 @@
+"""
+Paginação por cursor (keyset) e renderização em streaming das listagens.
+
+Em vez de `.all()` + um template com todas as linhas, cada página busca
+`limit + 1` linhas a partir da última chave vista (`WHERE id > :after`),
+usando o índice da chave primária em vez de OFFSET. A linha extra só indica
+se existe próxima página; o template coloca no fim uma linha "sentinela"
+que o HTMX carrega ao aparecer na tela (scroll infinito).
+
+As páginas são renderizadas com `Template.generate()` dentro de um
+`StreamingResponse`: a consulta só roda quando o template começa a iterar,
+então as primeiras linhas chegam ao navegador antes do fim da consulta.
+"""
+from urllib.parse import urlencode
+
+from fastapi.responses import StreamingResponse
+
+# Tamanho mínimo de cada pedaço enviado (evita um chunk HTTP por tag)
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+class Page:
+    """
+    Página de resultados consumida pelo template.
+
+    A consulta é executada de forma preguiçosa ao iterar; depois do laço
+    `has_more` e `next_query` ficam disponíveis para montar a sentinela.
+    """
+
+    def __init__(self, session, query, limit, next_params, first=True):
+        self._session = session
+        self._query = query.limit(limit + 1)
+        self._next_params = next_params
+        self.limit = limit
+        self.first = first
+        self.has_more = False
+        self.next_query = ""
+
+    def __iter__(self):
+        count = 0
+        last = None
+        for row in self._session.exec(self._query):
+            if count == self.limit:
+                self.has_more = True
+                self.next_query = urlencode(self._next_params(last, count))
+                break
+            count += 1
+            last = row
+            yield row
+
+
+def keyset_page(session, query, key_column, after=None, limit=50, descending=False, key=None, **params):
+    """
+    Página ordenada por `key_column` começando depois de `after`.
+    `key` extrai o cursor de uma linha (padrão: o atributo de mesmo nome);
+    `params` extras (ex: filtros) são repetidos na URL da próxima página.
+    """
+    if key is None:
+        def key(row):
+            return getattr(row, key_column.key)
+
+    if descending:
+        if after is not None:
+            query = query.where(key_column < after)
+        query = query.order_by(key_column.desc())
+    else:
+        if after is not None:
+            query = query.where(key_column > after)
+        query = query.order_by(key_column)
+
+    def next_params(last, count):
+        return {**params, "after": key(last)}
+
+    return Page(session, query, limit, next_params, first=after is None)
+
+
+def offset_page(session, query, offset=0, limit=50, **params):
+    """
+    Página por OFFSET, para resultados ordenados por relevância (busca),
+    onde não há uma chave estável para o keyset.
+    """
+    if offset:
+        query = query.offset(offset)
+
+    def next_params(last, count):
+        return {**params, "offset": offset + count}
+
+    return Page(session, query, limit, next_params, first=not offset)
+
+
+def _buffered(chunks, size=STREAM_CHUNK_SIZE):
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield "".join(buffer)
+            buffer.clear()
+            buffered = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def stream_template(templates, name, context, session=None):
+    """
+    Renderiza `name` em streaming. A sessão (dona do cursor da página) é
+    fechada quando o template termina, e não quando a rota retorna.
+    """
+    template = templates.get_template(name)
+
+    def render():
+        try:
+            yield from _buffered(template.generate(context))
+        finally:
+            if session is not None:
+                session.close()
+
+    return StreamingResponse(render(), media_type="text/html")
@@ -0,0 +1,175 @@
+"""
+Busca de peças para o seletor (typeahead) da tela da OS.
+
+A tela da OS carregava o estoque inteiro num <select> a cada visita (e ela
+recarrega após cada lançamento). Agora o campo pede só as N melhores
+sugestões enquanto o usuário digita, pelo índice FTS5 do Estoque (prefixo,
+sem acentos, por relevância), já com estoque e preço.
+
+Um cache pequeno em memória guarda as buscas recentes. Qualquer escrita em
+`inventoryitem` feita por uma Session deste processo (pelo ORM ou por
+UPDATE/DELETE direto, como a baixa de estoque) esvazia o cache no commit;
+escritas de outros processos expiram pelo LOOKUP_CACHE_TTL.
+
+As "peças quentes" (sugeridas com o campo vazio) são as mais vendidas nos
+últimos LOOKUP_HOT_DAYS, lidas de `salesdaily` (somas por dia, mantidas
+por trigger) e não do histórico de itens. Só o ranking (ids) fica em cache,
+por LOOKUP_HOT_TTL e sem ser esvaziado a cada venda; estoque e preço das
+peças são lidos na hora, pela chave primária.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import select
+
+from app import config, inventory_search
+from app.models import InventoryItem, SalesDaily
+
+# Marca na Session de que houve escrita em inventoryitem desde o último commit
+_DIRTY = "part_lookup_dirty"
+
+
+@dataclass(frozen=True)
+class PartOption:
+    """Sugestão do seletor (cópia imutável, segura para compartilhar entre requisições)."""
+    id: int
+    name: str
+    category: str
+    quantity: int
+    sell_price: float
+
+
+_lock = threading.Lock()
+# chave -> (vence_em, [PartOption]), da menos para a mais usada
+_cache = OrderedDict()
+# Muda a cada invalidação: resultado lido antes dela não entra no cache
+_generation = 0
+_counters = {"hits": 0, "misses": 0, "invalidations": 0}
+# limite -> (vence_em, [ids]) do ranking de peças quentes
+_hot = {}
+
+
+def invalidate():
+    """Esvazia o cache (chamado automaticamente após commits que alteram o estoque)."""
+    global _generation
+    with _lock:
+        _cache.clear()
+        _generation += 1
+        _counters["invalidations"] += 1
+
+
+def stats() -> dict:
+    with _lock:
+        return {**_counters, "entries": len(_cache)}
+
+
+def _cached(key, load):
+    now = time.monotonic()
+    with _lock:
+        hit = _cache.get(key)
+        if hit and hit[0] > now:
+            _cache.move_to_end(key)
+            _counters["hits"] += 1
+            return hit[1]
+        _counters["misses"] += 1
+        generation = _generation
+
+    result = load()
+
+    with _lock:
+        if generation == _generation:
+            _cache[key] = (now + config.LOOKUP_CACHE_TTL, result)
+            _cache.move_to_end(key)
+            while len(_cache) > config.LOOKUP_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return result
+
+
+def _options(items) -> list:
+    return [PartOption(i.id, i.name, i.category, i.quantity, i.sell_price) for i in items]
+
+
+def _hot_ids(session, limit: int) -> list:
+    """Ids das peças mais vendidas na janela recente (ou as primeiras por nome, sem vendas)."""
+    now = time.monotonic()
+    with _lock:
+        hit = _hot.get(limit)
+        if hit and hit[0] > now:
+            _counters["hits"] += 1
+            return hit[1]
+        _counters["misses"] += 1
+
+    since = (date.today() - timedelta(days=config.LOOKUP_HOT_DAYS)).isoformat()
+    # Faixa da chave primária (dia, peça): lê só os dias da janela
+    ids = session.exec(
+        select(SalesDaily.item_id)
+        .where(SalesDaily.day >= since)
+        .group_by(SalesDaily.item_id)
+        .order_by(func.sum(SalesDaily.units).desc())
+        .limit(limit)
+    ).all()
+    if not ids:
+        ids = session.exec(select(InventoryItem.id).order_by(InventoryItem.name).limit(limit)).all()
+
+    with _lock:
+        _hot[limit] = (now + config.LOOKUP_HOT_TTL, list(ids))
+    return ids
+
+
+def hot_parts(session, limit: int = None) -> list:
+    """Peças mais vendidas recentemente, com estoque e preço atuais."""
+    limit = limit or config.LOOKUP_LIMIT
+    ids = _hot_ids(session, limit)
+    items = {item.id: item for item in session.exec(select(InventoryItem).where(InventoryItem.id.in_(ids))).all()}
+    # Peça excluída depois do ranking simplesmente some da lista
+    return _options(items[item_id] for item_id in ids if item_id in items)
+
+
+def lookup(session, term: str, limit: int = None) -> list:
+    """As `limit` peças que melhor casam com o texto digitado."""
+    limit = limit or config.LOOKUP_LIMIT
+    term = " ".join(term.split()).casefold()
+    if not inventory_search.build_match(term):
+        return hot_parts(session, limit)
+
+    def load():
+        query = inventory_search.apply_search(select(InventoryItem), term).limit(limit)
+        return _options(session.exec(query).all())
+
+    return _cached((term, limit), load)
+
+
+# --- Invalidação automática nas escritas de estoque ---
+
+def _is_inventory(obj) -> bool:
+    return isinstance(obj, InventoryItem)
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _mark_flush(session, flush_context):
+    if any(_is_inventory(obj) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info[_DIRTY] = True
+
+
+@event.listens_for(OrmSession, "do_orm_execute")
+def _mark_statement(state):
+    if (state.is_insert or state.is_update or state.is_delete) and any(
+        mapper.class_ is InventoryItem for mapper in state.all_mappers
+    ):
+        state.session.info[_DIRTY] = True
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _invalidate_after_commit(session):
+    if session.info.pop(_DIRTY, False):
+        invalidate()
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop(_DIRTY, None)
@@ -0,0 +1,282 @@
+"""
+Análise de preço em lote (segundo plano) de todo o estoque ou de uma categoria.
+
+Um `PriceAnalysisJob` é criado pela tela de Estoque e executado pelo
+`JobRunner`, uma tarefa asyncio iniciada com a aplicação:
+  - várias peças por prompt (AI_BATCH_SIZE), menos idas e voltas ao modelo;
+  - no máximo AI_BATCH_CALLS_PER_MINUTE chamadas por minuto;
+  - resultados gravados em `PriceAnalysis` (e no cache de IA, para que o
+    botão "Analisar" da peça responda na hora);
+  - progresso salvo a cada lote em `last_item_id`: após reiniciar, o job
+    continua da última peça concluída.
+
+Os jobs são "alugados" por heartbeat: com vários workers do uvicorn só um
+executa cada job, e um job órfão (worker morto) é retomado após JOB_LEASE.
+O heartbeat é renovado antes de cada chamada ao modelo, e cada reserva
+recebe um token (`owner`): um worker que perdeu o job (parado além do
+JOB_LEASE) não grava mais nada nele.
+"""
+import asyncio
+import json
+import re
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_, update
+from sqlmodel import Session, select
+
+from app import ai_cache, config
+from app.database import writer_lane
+from app.models import InventoryItem, JobStatus, PriceAnalysis, PriceAnalysisJob
+
+# Tempo sem heartbeat para um job RUNNING ser considerado órfão
+JOB_LEASE = timedelta(seconds=120)
+# Intervalo de verificação de novos jobs quando ocioso
+IDLE_POLL_SECONDS = 30
+
+BATCH_PROMPT = """Analise preços de autopeças no Brasil. Para CADA produto abaixo avalie o preço de venda.
+Produtos (#id | nome | preço de venda):
+{lines}
+
+Responda APENAS um objeto JSON no formato {{"<id>": "<html>"}}, um item por produto, onde <html> é
+HTML puro curto (<span> ou <small>) com:
+1. 'Preço Baixo/Justo/Alto'.
+2. Faixa estimada mercado.
+3. Use classes Bootstrap (text-success/warning/danger)."""
+
+
+def _items_query(job: PriceAnalysisJob):
+    query = select(InventoryItem)
+    if job.category:
+        query = query.where(InventoryItem.category == job.category)
+    return query
+
+
+def create_job(session: Session, category: str = None) -> PriceAnalysisJob:
+    """Cria um job na fila; o runner começa a executá-lo em seguida."""
+    job = PriceAnalysisJob(category=category or None)
+    job.total_items = session.exec(
+        select(func.count()).select_from(_items_query(job).subquery())
+    ).one()
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    if runner is not None:
+        runner.wake()
+    return job
+
+
+def latest_job(session: Session):
+    return session.exec(select(PriceAnalysisJob).order_by(PriceAnalysisJob.id.desc()).limit(1)).first()
+
+
+def resume_job(session: Session, job_id: int):
+    """Recoloca na fila um job que falhou (continua de `last_item_id`)."""
+    job = session.get(PriceAnalysisJob, job_id)
+    if job and job.status == JobStatus.FAILED:
+        job.status = JobStatus.PENDING
+        job.error = None
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        if runner is not None:
+            runner.wake()
+    return job
+
+
+def build_prompt(items) -> str:
+    lines = "\n".join(f"#{item.id} | {item.name} | R$ {item.sell_price:.2f}" for item in items)
+    return BATCH_PROMPT.format(lines=lines)
+
+
+def parse_response(text: str) -> dict:
+    """Extrai o JSON {id: html} da resposta (tolera cercas ```json)."""
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if not match:
+        raise ValueError("Resposta da IA sem JSON")
+    data = json.loads(match.group(0))
+    return {int(item_id): str(html) for item_id, html in data.items()}
+
+
+class LeaseLost(Exception):
+    """O job foi reservado por outro worker (heartbeat vencido)."""
+
+
+class RateLimiter:
+    """Espaça as chamadas para no máximo `per_minute` por minuto."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self):
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._next = time.monotonic() + self.interval
+
+
+class JobRunner:
+    """Executa os jobs pendentes, um por vez, numa tarefa asyncio."""
+
+    def __init__(self, executor, engine):
+        self.executor = executor
+        self.engine = engine
+        self.limiter = RateLimiter(config.AI_BATCH_CALLS_PER_MINUTE)
+        self._task = None
+        self._wakeup = None
+        self._loop_ref = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._loop_ref = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def wake(self):
+        """Pode ser chamado de uma thread (rotas com DB_MODE=thread)."""
+        if self._wakeup is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop_ref:
+            self._wakeup.set()
+        elif not self._loop_ref.is_closed():
+            self._loop_ref.call_soon_threadsafe(self._wakeup.set)
+
+    async def _loop(self):
+        while True:
+            claim = await asyncio.to_thread(self._claim_next)
+            if claim is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), IDLE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            job_id, owner = claim
+            try:
+                await self._run_job(job_id, owner)
+            except asyncio.CancelledError:
+                raise
+            except LeaseLost:
+                print(f"ALERTA: job de análise #{job_id} retomado por outro worker; este parou")
+            except Exception as e:
+                try:
+                    await asyncio.to_thread(self._finish, job_id, owner, JobStatus.FAILED, str(e))
+                except LeaseLost:
+                    pass
+
+    def _claim_next(self):
+        """Reserva (atomicamente) o próximo job pendente ou órfão: (id, token) ou None."""
+        now = datetime.now()
+        owner = uuid.uuid4().hex
+        claimable = or_(
+            PriceAnalysisJob.status == JobStatus.PENDING,
+            (PriceAnalysisJob.status == JobStatus.RUNNING) & (PriceAnalysisJob.heartbeat_at < now - JOB_LEASE),
+        )
+        with writer_lane(), Session(self.engine) as session:
+            candidates = session.exec(
+                select(PriceAnalysisJob.id).where(claimable).order_by(PriceAnalysisJob.id)
+            ).all()
+            for job_id in candidates:
+                # O UPDATE condicional garante que só um worker pega o job
+                claimed = session.execute(
+                    update(PriceAnalysisJob)
+                    .where(PriceAnalysisJob.id == job_id, claimable)
+                    .values(status=JobStatus.RUNNING, heartbeat_at=now, owner=owner)
+                ).rowcount
+                session.commit()
+                if claimed:
+                    return job_id, owner
+        return None
+
+    @staticmethod
+    def _owned(session, job_id, owner, **values) -> None:
+        """UPDATE do job só se a reserva ainda for deste worker (senão LeaseLost). Não faz commit."""
+        updated = session.execute(
+            update(PriceAnalysisJob)
+            .where(PriceAnalysisJob.id == job_id, PriceAnalysisJob.owner == owner)
+            .values(**values)
+        ).rowcount
+        if not updated:
+            raise LeaseLost(job_id)
+
+    def _heartbeat(self, job_id, owner):
+        with writer_lane(), Session(self.engine) as session:
+            self._owned(session, job_id, owner, heartbeat_at=datetime.now())
+            session.commit()
+
+    def _next_batch(self, job_id):
+        with Session(self.engine) as session:
+            job = session.get(PriceAnalysisJob, job_id)
+            items = session.exec(
+                _items_query(job)
+                .where(InventoryItem.id > job.last_item_id)
+                .order_by(InventoryItem.id)
+                .limit(config.AI_BATCH_SIZE)
+            ).all()
+            session.expunge_all()
+            return items
+
+    async def _run_job(self, job_id, owner):
+        while True:
+            items = await asyncio.to_thread(self._next_batch, job_id)
+            if not items:
+                await asyncio.to_thread(self._finish, job_id, owner, JobStatus.DONE)
+                return
+
+            prompt = build_prompt(items)
+            for attempt in range(1, config.AI_BATCH_RETRIES + 1):
+                await self.limiter.wait()
+                # Um lote pode levar minutos (espera da cota, timeouts, backoff): renova a reserva a cada tentativa
+                await asyncio.to_thread(self._heartbeat, job_id, owner)
+                try:
+                    results = parse_response(await self.executor.generate(prompt))
+                    break
+                except Exception:
+                    if attempt == config.AI_BATCH_RETRIES:
+                        raise
+                    await asyncio.sleep(2 ** attempt)
+
+            await asyncio.to_thread(self._save_batch, job_id, owner, items, results)
+
+    def _save_batch(self, job_id, owner, items, results):
+        """
+        Grava os resultados do lote, o cache de IA e o ponto de retomada numa
+        única transação (nada é gravado se o job passou para outro worker).
+        """
+        with writer_lane(), Session(self.engine) as session:
+            self._owned(
+                session, job_id, owner,
+                processed_items=PriceAnalysisJob.processed_items + len(items),
+                last_item_id=items[-1].id,
+                heartbeat_at=datetime.now(),
+            )
+            for item in items:
+                html = results.get(item.id)
+                if html is None:
+                    continue
+                session.add(PriceAnalysis(item_id=item.id, job_id=job_id, sell_price=item.sell_price, result=html))
+                ai_cache.add(session, ai_cache.price_key(item), ai_cache.KIND_PRICE, item.id, html)
+            ai_cache.evict(session)
+            session.commit()
+
+    def _finish(self, job_id, owner, status, error=None):
+        with writer_lane(), Session(self.engine) as session:
+            self._owned(session, job_id, owner, status=status, error=error, finished_at=datetime.now())
+            session.commit()
+
+
+# Instância criada pela aplicação na inicialização (ver app/main.py)
+runner = None
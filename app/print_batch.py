@@ -0,0 +1,384 @@
+"""
+Impressão de OS em lote (fechamento do mês): um ZIP com um PDF por OS.
+
+O pipeline tem três etapas:
+  1. carga: OS, clientes e itens de todas as OS pedidas numa consulta por
+     lote de ids (app/os_view.py), em objetos de leitura simples, que podem
+     ser enviados a outros processos;
+  2. renderização: `print_os.html` + conversão para PDF (xhtml2pdf) num
+     pool de processos com um worker por núcleo (PRINT_WORKERS), em
+     blocos de PRINT_CHUNK_SIZE documentos por tarefa;
+  3. envio: cada documento entra no ZIP assim que fica pronto, e o ZIP é
+     enviado em streaming (sem montar o arquivo inteiro na memória).
+
+OS fechadas não mudam mais: o arquivo gerado fica em PRINT_CACHE_DIR e a
+próxima impressão só lê do disco. O nome do arquivo leva um hash do
+conteúdo do documento e do template, então uma OS reaberta/alterada ou um
+template novo nunca reaproveitam um arquivo antigo.
+
+Sem o xhtml2pdf instalado, o formato "html" gera as mesmas páginas de
+impressão em HTML (prontas para imprimir pelo navegador).
+
+Uso pela linha de comando:
+    python -m app.print_batch --start 2024-01-01 --end 2024-01-31 -o os_jan.zip
+    python -m app.print_batch --ids 10,11,12 --format html
+"""
+import argparse
+import hashlib
+import io
+import os
+import sys
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import astuple
+from datetime import date, datetime, timedelta
+from multiprocessing import get_context
+from typing import List
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from sqlmodel import Session, select
+
+from app import archive, config, os_view
+from app.models import ServiceOrder, ServiceOrderStatus
+from app.os_view import OrderView
+
+FORMAT_PDF = "pdf"
+FORMAT_HTML = "html"
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates")
+TEMPLATE_NAME = "print_os.html"
+
+class PrintError(Exception):
+    """Pedido inválido (formato, seleção vazia ou grande demais) ou dependência ausente."""
+
+
+# --- 1. Carga ---
+
+def select_ids(session: Session, start: date = None, end: date = None, only_closed: bool = True) -> List[int]:
+    """Ids das OS abertas no período [start, end] (dias inclusivos), em ordem, inclusive as arquivadas."""
+    ids = set()
+    for orders, _ in archive.sources(session.connection()):
+        query = select(orders.c.id)
+        if start:
+            query = query.where(orders.c.created_at >= datetime.combine(start, datetime.min.time()))
+        if end:
+            query = query.where(orders.c.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+        if only_closed:
+            query = query.where(orders.c.status == ServiceOrderStatus.CLOSED)
+        ids.update(session.exec(query).all())
+    return sorted(ids)
+
+
+def load_documents(session: Session, os_ids) -> List[OrderView]:
+    """OS pedidas com cliente e itens (ver app/os_view.py), na ordem dos ids."""
+    return os_view.load_orders(session, os_ids)
+
+
+def print_context(document: OrderView) -> dict:
+    """Variáveis de `print_os.html`."""
+    return {"os": document, "client": document.client, "items": document.items}
+
+
+# --- 2. Renderização (roda nos processos do pool) ---
+
+_env = None
+
+
+def _environment() -> Environment:
+    global _env
+    if _env is None:
+        _env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape(["html"]))
+    return _env
+
+
+def render_html(document: OrderView, for_pdf: bool = False) -> str:
+    return _environment().get_template(TEMPLATE_NAME).render(for_pdf=for_pdf, **print_context(document))
+
+
+def _html_to_pdf(html: str) -> bytes:
+    from xhtml2pdf import pisa
+
+    out = io.BytesIO()
+    result = pisa.CreatePDF(html, dest=out, encoding="utf-8")
+    if result.err:
+        raise RuntimeError(f"xhtml2pdf: {result.err} erro(s) ao gerar o PDF")
+    return out.getvalue()
+
+
+def render(document: OrderView, fmt: str) -> bytes:
+    if fmt == FORMAT_PDF:
+        return _html_to_pdf(render_html(document, for_pdf=True))
+    return render_html(document).encode("utf-8")
+
+
+def _render_chunk(documents, fmt):
+    """Tarefa do pool: um bloco de documentos -> [(id da OS, bytes)]."""
+    return [(document.id, render(document, fmt)) for document in documents]
+
+
+# --- Cache dos documentos de OS fechadas ---
+
+_template_version = None
+
+
+def _template_hash() -> str:
+    global _template_version
+    path = os.path.join(TEMPLATE_DIR, TEMPLATE_NAME)
+    stat = os.stat(path)
+    if _template_version is None or _template_version[0] != stat.st_mtime_ns:
+        with open(path, "rb") as f:
+            _template_version = (stat.st_mtime_ns, hashlib.sha256(f.read()).hexdigest())
+    return _template_version[1]
+
+
+def _cache_path(document: OrderView, fmt: str) -> str:
+    raw = repr((astuple(document), _template_hash())).encode("utf-8")
+    digest = hashlib.sha256(raw).hexdigest()[:20]
+    return os.path.join(config.PRINT_CACHE_DIR, f"os_{document.id}_{digest}.{fmt}")
+
+
+def _cache_get(document: OrderView, fmt: str):
+    if not document.closed:
+        return None
+    try:
+        with open(_cache_path(document, fmt), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _cached_versions(fmt: str) -> dict:
+    """{id da OS: [arquivos]} do cache, numa única leitura do diretório (uma por lote)."""
+    versions = {}
+    try:
+        names = os.listdir(config.PRINT_CACHE_DIR)
+    except FileNotFoundError:
+        return versions
+    for name in names:
+        os_id, _, rest = name[len("os_"):].partition("_")
+        if name.startswith("os_") and os_id.isdigit() and rest.endswith(f".{fmt}"):
+            versions.setdefault(int(os_id), []).append(name)
+    return versions
+
+
+def _cache_put(document: OrderView, fmt: str, data: bytes, versions: dict):
+    """Grava o documento e apaga as versões antigas dele listadas em `versions` (ver _cached_versions)."""
+    if not document.closed:
+        return
+    path = _cache_path(document, fmt)
+    os.makedirs(config.PRINT_CACHE_DIR, exist_ok=True)
+    # Versões antigas do mesmo documento (OS reaberta, template alterado)
+    for name in versions.pop(document.id, ()):
+        if name != os.path.basename(path):
+            try:
+                os.remove(os.path.join(config.PRINT_CACHE_DIR, name))
+            except FileNotFoundError:
+                pass
+    # Escrita atômica: outro pedido nunca lê um arquivo pela metade
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+# --- Pool de processos ---
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def workers() -> int:
+    return config.PRINT_WORKERS or os.cpu_count() or 1
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    Pool criado no primeiro uso. "spawn": os workers não herdam as threads
+    e conexões abertas do servidor.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers(), mp_context=get_context("spawn"))
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def check_format(fmt: str):
+    if fmt not in (FORMAT_PDF, FORMAT_HTML):
+        raise PrintError(f"Formato desconhecido: {fmt}")
+    if fmt == FORMAT_PDF:
+        try:
+            import xhtml2pdf  # noqa: F401
+        except ImportError:
+            raise PrintError("Gerar PDF requer o xhtml2pdf (pip install xhtml2pdf); use o formato html")
+
+
+def rendered(documents: List[OrderView], fmt: str, pool: ProcessPoolExecutor = None, stats: dict = None):
+    """
+    Gera (id da OS, bytes) na ordem dos documentos. O que está no cache sai
+    direto; o resto é renderizado no pool, com no máximo 2 blocos por worker
+    em andamento (a memória não cresce com o tamanho do lote).
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("cached", 0)
+    stats.setdefault("rendered", 0)
+    pending = deque()  # (documentos do bloco, future | None)
+    chunk = []
+    versions = None
+
+    def flush_chunk():
+        if chunk:
+            pending.append((list(chunk), (pool or get_pool()).submit(_render_chunk, list(chunk), fmt)))
+            chunk.clear()
+
+    def drain(limit):
+        nonlocal versions
+        while len(pending) > limit:
+            docs, future = pending.popleft()
+            if future is None:
+                yield from docs
+                continue
+            by_id = {document.id: document for document in docs}
+            results = future.result()
+            if versions is None:
+                versions = _cached_versions(fmt)
+            for os_id, data in results:
+                _cache_put(by_id[os_id], fmt, data, versions)
+                stats["rendered"] += 1
+                yield os_id, data
+
+    try:
+        for document in documents:
+            data = _cache_get(document, fmt)
+            if data is not None:
+                flush_chunk()
+                stats["cached"] += 1
+                pending.append(([(document.id, data)], None))
+            else:
+                chunk.append(document)
+                if len(chunk) >= config.PRINT_CHUNK_SIZE:
+                    flush_chunk()
+            yield from drain(2 * workers())
+        flush_chunk()
+        yield from drain(0)
+    finally:
+        # Download cancelado: o que ainda não começou sai da fila do pool
+        for _, future in pending:
+            if future is not None:
+                future.cancel()
+
+
+# --- 3. ZIP em streaming ---
+
+class _ZipSink:
+    """Destino do ZipFile sem seek: os bytes escritos são retirados a cada documento."""
+
+    def __init__(self):
+        self._parts = []
+        self._offset = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def filename(fmt: str, start: date = None, end: date = None) -> str:
+    period = "_".join(d.isoformat() for d in (start, end) if d)
+    return f"os_{period or 'lote'}_{fmt}.zip"
+
+
+def check_request(os_ids, fmt: str):
+    """Valida formato e tamanho do lote pelos ids, antes de carregar as OS."""
+    check_format(fmt)
+    if not os_ids:
+        raise PrintError("Nenhuma OS encontrada para imprimir")
+    if len(os_ids) > config.PRINT_MAX_ORDERS:
+        raise PrintError(f"Máximo de {config.PRINT_MAX_ORDERS} OS por lote ({len(os_ids)} pedidas)")
+
+
+def stream_zip(documents: List[OrderView], fmt: str, pool: ProcessPoolExecutor = None, stats: dict = None):
+    """
+    Valida o pedido na chamada (levanta PrintError antes de qualquer byte)
+    e devolve um gerador com os bytes do ZIP.
+    """
+    check_request(documents, fmt)
+    created = {document.id: document.created_at for document in documents}
+
+    def chunks():
+        sink = _ZipSink()
+        # PDF já é comprimido: guardado como está; HTML comprime bem
+        compression = zipfile.ZIP_STORED if fmt == FORMAT_PDF else zipfile.ZIP_DEFLATED
+        with zipfile.ZipFile(sink, "w", compression=compression) as archive:
+            for os_id, data in rendered(documents, fmt, pool, stats):
+                info = zipfile.ZipInfo(f"OS_{os_id:06d}.{fmt}", date_time=created[os_id].timetuple()[:6])
+                info.compress_type = compression
+                archive.writestr(info, data)
+                yield sink.take()
+        yield sink.take()
+
+    return chunks()
+
+
+if __name__ == "__main__":
+    from app.database import create_db_and_tables, engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ids", help="ids separados por vírgula (em vez do período)")
+    parser.add_argument("--start", type=date.fromisoformat)
+    parser.add_argument("--end", type=date.fromisoformat)
+    parser.add_argument("--all", action="store_true", help="inclui OS não fechadas do período")
+    parser.add_argument("--format", default=FORMAT_PDF, choices=[FORMAT_PDF, FORMAT_HTML])
+    parser.add_argument("-o", "--output", help="arquivo de saída (padrão: nome gerado)")
+    args = parser.parse_args()
+    create_db_and_tables()
+
+    with Session(engine) as session:
+        if args.ids:
+            ids = [int(value) for value in args.ids.split(",") if value.strip()]
+        else:
+            ids = select_ids(session, args.start, args.end, only_closed=not args.all)
+        try:
+            check_request(ids, args.format)
+        except PrintError as e:
+            print(e)
+            sys.exit(1)
+        documents = load_documents(session, ids)
+    output = args.output or filename(args.format, args.start, args.end)
+    stats = {}
+    started = time.perf_counter()
+    try:
+        chunks = stream_zip(documents, args.format, stats=stats)
+    except PrintError as e:
+        print(e)
+        sys.exit(1)
+    try:
+        with open(output, "wb") as out:
+            for chunk in chunks:
+                out.write(chunk)
+    finally:
+        shutdown()
+    print(f"{output}: {len(documents)} OS em {time.perf_counter() - started:.1f}s "
+          f"({stats['rendered']} geradas, {stats['cached']} do cache, {workers()} processos)")
@@ -0,0 +1,159 @@
+"""
+Movimentação de estoque e total da OS com UPDATEs atômicos.
+
+Ler `inventory_item.quantity`, conferir em Python e gravar `quantity -= n`
+deixa uma janela em que dois balcões vendem a última unidade ao mesmo
+tempo (estoque negativo) ou um sobrescreve o total da OS do outro. Aqui:
+  - a baixa é um único `UPDATE ... WHERE quantity >= :n` (se não há saldo,
+    nenhuma linha muda e nada é gravado);
+  - o total da OS é recalculado no banco como a soma dos seus itens, na
+    mesma transação, então sempre bate com `ServiceOrderItem`;
+  - `run_retrying` (rotas) e `run_with_retry` (threads) repetem a transação
+    inteira se o SQLite estiver ocupado.
+"""
+import asyncio
+import random
+import time
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+
+from app.models import InventoryItem, ServiceOrder, ServiceOrderItem
+
+# Tentativas e espera inicial (segundos) quando o banco está ocupado
+BUSY_RETRIES = 5
+BUSY_BACKOFF = 0.05
+
+
+class ItemNotFound(Exception):
+    """Peça inexistente no estoque."""
+
+
+class InsufficientStock(Exception):
+    """Saldo menor que a quantidade pedida."""
+
+    def __init__(self, item_id, available, requested):
+        super().__init__(f"Estoque insuficiente para o item {item_id}: disponível {available}, solicitado {requested}")
+        self.item_id = item_id
+        self.available = available
+        self.requested = requested
+
+
+class BatchRejected(Exception):
+    """Lançamento em lote recusado; `problems` lista todas as peças com problema."""
+
+    def __init__(self, problems):
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+
+def reserve(session: Session, item_id: int, quantity: int) -> float:
+    """
+    Baixa `quantity` unidades da peça se houver saldo, num único UPDATE.
+    Devolve o preço de venda atual (lido na mesma instrução).
+    """
+    row = session.execute(
+        update(InventoryItem)
+        .where(InventoryItem.id == item_id, InventoryItem.quantity >= quantity)
+        .values(quantity=InventoryItem.quantity - quantity)
+        .returning(InventoryItem.sell_price)
+    ).first()
+    if row is not None:
+        return row.sell_price
+
+    available = session.execute(select(InventoryItem.quantity).where(InventoryItem.id == item_id)).scalar()
+    if available is None:
+        raise ItemNotFound(item_id)
+    raise InsufficientStock(item_id, available, quantity)
+
+
+def reserve_many(session: Session, wanted: dict) -> dict:
+    """
+    Baixa várias peças na mesma transação (`wanted` = {item_id: quantidade}).
+    Carrega todas as peças numa única consulta e confere o saldo de todas antes
+    de gravar; se alguma falhar, nada é baixado e `BatchRejected` traz a lista
+    completa. Devolve {item_id: preço de venda}.
+    """
+    items = {
+        item.id: item
+        for item in session.execute(select(InventoryItem).where(InventoryItem.id.in_(wanted))).scalars()
+    }
+    problems = []
+    for item_id, quantity in wanted.items():
+        item = items.get(item_id)
+        if item is None:
+            problems.append(f"Peça #{item_id} não encontrada")
+        elif item.quantity < quantity:
+            problems.append(f"{item.name}: disponível {item.quantity}, solicitado {quantity}")
+    if problems:
+        raise BatchRejected(problems)
+
+    # A baixa continua condicional: outro balcão pode ter vendido depois da leitura
+    prices = {}
+    for item_id, quantity in wanted.items():
+        try:
+            prices[item_id] = reserve(session, item_id, quantity)
+        except InsufficientStock as e:
+            raise BatchRejected([f"{items[item_id].name}: disponível {e.available}, solicitado {quantity}"])
+    return prices
+
+
+def release(session: Session, item_id: int, quantity: int):
+    """Devolve unidades ao estoque (estorno). Ignora peças já excluídas do cadastro."""
+    session.execute(
+        update(InventoryItem)
+        .where(InventoryItem.id == item_id)
+        .values(quantity=InventoryItem.quantity + quantity)
+    )
+
+
+def recompute_total(session: Session, os_id: int):
+    """Grava o total da OS como a soma dos seus itens (mesma transação)."""
+    subtotal = (
+        select(func.coalesce(func.sum(ServiceOrderItem.quantity_sold * ServiceOrderItem.price_at_moment), 0.0))
+        .where(ServiceOrderItem.order_id == os_id)
+        .scalar_subquery()
+    )
+    session.execute(update(ServiceOrder).where(ServiceOrder.id == os_id).values(total_value=subtotal))
+
+
+def _is_busy(error: OperationalError) -> bool:
+    message = str(error.orig).lower()
+    return "locked" in message or "busy" in message
+
+
+def _backoff(attempt: int) -> float:
+    return BUSY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+
+
+def run_with_retry(session: Session, work):
+    """
+    Executa `work()` (que deve terminar com commit) e, se o SQLite responder
+    "database is locked", desfaz e repete com espera exponencial.
+    Bloqueia a thread durante a espera: uso fora do event loop (threads, CLI).
+    """
+    for attempt in range(1, BUSY_RETRIES + 1):
+        try:
+            return work()
+        except OperationalError as e:
+            session.rollback()
+            if not _is_busy(e) or attempt == BUSY_RETRIES:
+                raise
+            time.sleep(_backoff(attempt))
+
+
+async def run_retrying(db, work):
+    """
+    `await db.run(work)` (RequestDB) com a mesma repetição de `run_with_retry`,
+    mas esperando com asyncio.sleep: nos modos sync e async a transação roda
+    no event loop, e um time.sleep ali pararia todas as requisições.
+    """
+    for attempt in range(1, BUSY_RETRIES + 1):
+        try:
+            return await db.run(work)
+        except OperationalError as e:
+            await db.rollback()
+            if not _is_busy(e) or attempt == BUSY_RETRIES:
+                raise
+            await asyncio.sleep(_backoff(attempt))
@@ -0,0 +1,66 @@
+"""
+Benchmark da camada de IA com o modelo local (FakeModel).
+
+Simula N cliques simultâneos em "Analisar"/"Gerar Relatório" enquanto um
+"ping" mede o atraso do event loop (o que as outras rotas sentiriam):
+  - direto: `model.generate_content()` chamado dentro da coroutine (antigo);
+  - executor: `AIExecutor.generate()` com pool limitado.
+
+Uso:
+    python -m benchmarks.bench_ai
+    python -m benchmarks.bench_ai --calls 20 --latency 0.3 --workers 4
+"""
+import argparse
+import asyncio
+import time
+
+from app.ai import AIExecutor, FakeModel
+
+
+async def ping(stop: asyncio.Event, lags: list):
+    """Acorda a cada 10ms e registra quanto atrasou."""
+    while not stop.is_set():
+        expected = time.perf_counter() + 0.01
+        await asyncio.sleep(0.01)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def run(calls: int, call_one):
+    stop = asyncio.Event()
+    lags = []
+    pinger = asyncio.create_task(ping(stop, lags))
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    await asyncio.gather(*(call_one(f"prompt {i}") for i in range(calls)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await pinger
+    return elapsed, max(lags) * 1000
+
+
+async def main_async(args):
+    model = FakeModel(latency=args.latency)
+
+    async def direct(prompt):
+        return model.generate_content(prompt).text
+
+    elapsed, lag = await run(args.calls, direct)
+    print(f"direto:   {args.calls} chamadas em {elapsed:.2f}s, maior atraso do event loop {lag:.0f}ms")
+
+    executor = AIExecutor(model, max_workers=args.workers, max_queue=args.calls, timeout=60)
+    elapsed, lag = await run(args.calls, executor.generate)
+    print(f"executor: {args.calls} chamadas em {elapsed:.2f}s, maior atraso do event loop {lag:.0f}ms")
+    print(f"métricas: {executor.metrics()}")
+    executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.25)
+    parser.add_argument("--workers", type=int, default=4)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark dos relatórios de vendas e margem (app/analytics.py).
+
+Gera alguns anos de OS e itens vendidos num banco temporário e mede o
+cálculo do relatório para períodos de 30 dias, 1 ano e o histórico todo:
+primeira vez (SQL + pandas) e repetida (cache por período).
+
+Uso:
+    python -m benchmarks.bench_analytics
+    python -m benchmarks.bench_analytics --years 5 --orders-per-day 80 --items 5000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlmodel import Session, SQLModel
+
+from app import analytics, dashboard, database
+from app.models import Client, InventoryItem, ServiceOrder, ServiceOrderItem, ServiceOrderStatus
+
+CATEGORIES = ["Motor", "Freio", "Suspensão", "Elétrica", "Transmissão", "Arrefecimento", "Filtros", "Pneus"]
+
+
+def populate(engine, args, today):
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(Client.__table__.insert(), [
+            {"name": "Cliente", "phone": "0", "car_model": "Scania", "car_plate": "ABC1D23"}
+        ])
+        conn.execute(InventoryItem.__table__.insert(), [{
+            "name": f"Peça {i}", "category": CATEGORIES[i % len(CATEGORIES)], "cost_price": cost,
+            "sell_price": cost * rng.uniform(1.2, 2.0), "quantity": rng.randint(0, 200), "min_quantity": 5,
+            "location": None,
+        } for i, cost in enumerate(rng.uniform(5, 800) for _ in range(args.items))])
+
+        first_day = today - timedelta(days=365 * args.years)
+        order_id = 0
+        lines = 0
+        day = first_day
+        while day <= today:
+            orders, items = [], []
+            for _ in range(rng.randint(args.orders_per_day // 2, args.orders_per_day * 3 // 2)):
+                order_id += 1
+                created = datetime.combine(day, datetime.min.time()) + timedelta(minutes=rng.randint(420, 1080))
+                orders.append({"id": order_id, "client_id": 1, "status": ServiceOrderStatus.CLOSED,
+                               "total_value": 0.0, "created_at": created})
+                for _ in range(rng.randint(1, args.lines_per_order * 2 - 1)):
+                    # Poucas peças concentram a maior parte das vendas
+                    item_id = min(int(rng.paretovariate(1.2)), args.items)
+                    items.append({"order_id": order_id, "item_id": item_id, "quantity_sold": rng.randint(1, 4),
+                                  "price_at_moment": rng.uniform(10, 900)})
+            conn.execute(ServiceOrder.__table__.insert(), orders)
+            conn.execute(ServiceOrderItem.__table__.insert(), items)
+            lines += len(items)
+            day += timedelta(days=1)
+    dashboard.install(engine)
+    # Tabela vazia + vendas existentes: calcula `salesdaily` do zero
+    analytics.install(engine)
+    return order_id, lines
+
+
+def measure(engine, start, end, label):
+    analytics._cache.clear()
+    with Session(engine) as session:
+        t0 = time.perf_counter()
+        report = analytics.get_report(session, start, end)
+        cold = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        analytics.get_report(session, start, end)
+        warm = (time.perf_counter() - t0) * 1000
+    print(f"{label:<18} {report.totals['units']:>10} peças  {report.totals['orders']:>8} OS   "
+          f"primeira {cold:>7.0f} ms   em cache {warm:>6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--orders-per-day", type=int, default=40)
+    parser.add_argument("--lines-per-order", type=int, default=5)
+    parser.add_argument("--items", type=int, default=3000)
+    args = parser.parse_args()
+
+    today = date.today()
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = database.build_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        SQLModel.metadata.create_all(engine)
+        t0 = time.perf_counter()
+        orders, lines = populate(engine, args, today)
+        print(f"{orders} OS e {lines} itens vendidos gerados em {time.perf_counter() - t0:.1f}s\n")
+
+        measure(engine, today - timedelta(days=29), today, "30 dias")
+        measure(engine, today - timedelta(days=364), today, "1 ano")
+        measure(engine, today - timedelta(days=365 * args.years), today, f"{args.years} anos (tudo)")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
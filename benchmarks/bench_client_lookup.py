@@ -0,0 +1,149 @@
+"""
+Benchmark da busca de clientes no balcão: lista inteira x LIKE x índice de
+chaves normalizadas (app/client_lookup.py).
+
+Gera um banco temporário com N clientes (padrão 200.000), com placas
+antigas e Mercosul e telefones digitados de vários jeitos ("(11) 9...",
+"+55 ...", "011 ..."), e mede para termos típicos digitados no balcão:
+
+  - lista:  o que a tela de OS fazia (carregar todos os clientes no <select>);
+  - LIKE:   '%termo%' nas colunas cruas (varre a tabela e não junta formatos);
+  - índice: client_lookup.lookup (faixas de índice sobre plate_key/phone_key/nome).
+
+A coluna "acha?" diz se o cliente procurado veio no resultado: o LIKE não
+acha a placa antiga pela Mercosul convertida, nem o telefone com outra
+formatação. Mede também a checagem de duplicidade do cadastro.
+
+Uso:
+    python -m benchmarks.bench_client_lookup
+    python -m benchmarks.bench_client_lookup --clients 500000 --repeat 50
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import or_
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app import client_lookup, migrations
+from app.models import Client
+from benchmarks.seed import COMPANY_SUFFIXES, FIRST_NAMES, LAST_NAMES, TRUCKS, plate
+
+
+def old_plate(rng) -> str:
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return "".join(rng.choice(letters) for _ in range(3)) + f"-{rng.randint(0, 9999):04d}"
+
+
+def formatted_phone(rng) -> str:
+    ddd, first, last = rng.randint(11, 99), rng.randint(1000, 9999), rng.randint(1000, 9999)
+    return rng.choice((
+        f"{ddd}9{first}{last}", f"({ddd}) 9{first}-{last}", f"+55 {ddd} 9{first}-{last}", f"0{ddd} 9{first} {last}",
+    ))
+
+
+def populate(engine, n_clients: int, seed: int = 42):
+    """Insere N clientes sintéticos (executemany); as chaves são calculadas pelo SQLite."""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n_clients):
+        person = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        rows.append({
+            "name": person if rng.random() < 0.6 else f"{rng.choice(LAST_NAMES)} {rng.choice(COMPANY_SUFFIXES)}",
+            "phone": formatted_phone(rng),
+            "email": None,
+            "car_model": rng.choice(TRUCKS),
+            "car_plate": plate(rng) if rng.random() < 0.6 else old_plate(rng),
+        })
+    with engine.begin() as conn:
+        conn.execute(Client.__table__.insert(), rows)
+
+
+def mercosul(value: str) -> str:
+    """Placa antiga -> Mercosul convertida ('ABC-1234' -> 'ABC1C34')."""
+    value = value.replace("-", "")
+    return value[:4] + "ABCDEFGHIJ"[int(value[4])] + value[5:]
+
+
+def terms(session):
+    """(rótulo, texto digitado, id do cliente procurado) a partir de clientes reais do banco."""
+    by_old = session.exec(select(Client).where(Client.car_plate.like("___-____")).limit(1)).one()
+    by_new = session.exec(select(Client).where(Client.car_plate.not_like("%-%")).limit(1)).one()
+    by_phone = session.exec(select(Client).where(Client.phone.like("+55%")).limit(1)).one()
+    digits = "".join(ch for ch in by_phone.phone if ch.isdigit())[2:]
+    by_name = session.exec(select(Client).order_by(Client.id.desc()).limit(1)).one()
+    return [
+        ("placa (início)", by_new.car_plate[:4].lower(), by_new.id),
+        ("placa inteira", by_new.car_plate, by_new.id),
+        ("antiga digitada Mercosul", mercosul(by_old.car_plate), by_old.id),
+        ("telefone (início)", f"({digits[:2]}) {digits[2:6]}", by_phone.id),
+        ("telefone inteiro", digits, by_phone.id),
+        ("nome (início)", by_name.name[:5].lower(), None),
+        ("sem resultado", "zzz9", None),
+    ]
+
+
+def like_query(term: str):
+    pattern = f"%{term}%"
+    return select(Client).where(or_(
+        Client.car_plate.ilike(pattern), Client.phone.ilike(pattern), Client.name.ilike(pattern),
+    )).limit(10)
+
+
+def measure(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        SQLModel.metadata.create_all(engine)
+
+        start = time.perf_counter()
+        populate(engine, args.clients)
+        print(f"{args.clients} clientes inseridos (chaves e índices) em {time.perf_counter() - start:.1f}s")
+
+        with Session(engine) as session:
+            clients, full_ms = measure(lambda: session.exec(select(Client)).all(), max(args.repeat // 5, 1))
+            print(f"lista inteira (tela de OS antiga): {len(clients)} clientes em {full_ms:.0f} ms\n")
+            del clients
+
+            print(f"{'busca':<26}{'termo':<14}{'LIKE (ms)':>10}{'acha?':>7}{'índice (ms)':>13}{'acha?':>7}{'ganho':>9}")
+            for label, term, target in terms(session):
+                like_rows, like_ms = measure(lambda: session.exec(like_query(term)).all(), args.repeat)
+                rows, ms = measure(lambda: client_lookup.lookup(session, term), args.repeat)
+
+                def found(result):
+                    return "-" if target is None else "sim" if any(c.id == target for c in result) else "não"
+
+                print(f"{label:<26}{term:<14}{like_ms:>10.2f}{found(like_rows):>7}{ms:>13.3f}{found(rows):>7}"
+                      f"{like_ms / ms:>8.0f}x")
+
+            # Mesmo caminhão redigitado: telefone sem formatação e placa no outro formato
+            sample = session.exec(select(Client).where(Client.car_plate.like("___-____")).limit(1)).one()
+            duplicates, dup_ms = measure(
+                lambda: client_lookup.find_duplicates(session, sample.phone_key, mercosul(sample.car_plate)), args.repeat
+            )
+            print(f"\nchecagem de duplicidade no cadastro: {dup_ms:.3f} ms ({len(duplicates)} encontrado)")
+
+            for name, sql in migrations.HOT_QUERIES:
+                if name.startswith("busca de cliente"):
+                    print(f"{name}: {' | '.join(migrations.explain(session.connection(), sql))}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
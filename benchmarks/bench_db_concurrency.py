@@ -0,0 +1,119 @@
+"""
+Benchmark de concorrência do SQLite: perfil "default" x "tuned".
+
+Simula vários balcões ao mesmo tempo: threads leitoras (dashboard e página
+do estoque) e threads escritoras (baixa de estoque + lançamento na OS),
+durante alguns segundos, contra um banco temporário.
+
+No perfil "tuned" as escritoras passam pela fila única de escrita
+(`writer_lane`), como as rotas de escrita da aplicação.
+
+Uso:
+    python -m benchmarks.bench_db_concurrency
+    python -m benchmarks.bench_db_concurrency --readers 8 --writers 4 --seconds 5
+"""
+import argparse
+import contextlib
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import text, update
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel, select
+
+from app import dashboard, database
+from app.models import Client, InventoryItem, ServiceOrder, ServiceOrderItem, ServiceOrderStatus
+
+
+def populate(engine, n_items: int):
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        conn.execute(Client.__table__.insert(), [
+            {"name": "Cliente", "phone": "0", "car_model": "Scania", "car_plate": "ABC1D23"}
+        ])
+        conn.execute(InventoryItem.__table__.insert(), [{
+            "name": f"Peça {i}", "category": "Motor", "cost_price": rng.uniform(5, 500),
+            "sell_price": rng.uniform(10, 900), "quantity": 1_000_000, "min_quantity": 5, "location": None,
+        } for i in range(n_items)])
+        conn.execute(ServiceOrder.__table__.insert(), [
+            {"client_id": 1, "status": ServiceOrderStatus.OPEN, "total_value": 0.0, "created_at": datetime.now()}
+        ])
+    dashboard.install(engine)
+
+
+def reader(engine, stop, stats):
+    with Session(engine) as session:
+        while not stop.is_set():
+            try:
+                dashboard.get_stats(session)
+                session.exec(select(InventoryItem).where(InventoryItem.id > random.randint(0, 1000)).limit(50)).all()
+                session.rollback()
+                stats["reads"] += 1
+            except OperationalError:
+                session.rollback()
+                stats["errors"] += 1
+
+
+def writer(engine, stop, stats, n_items, lane):
+    while not stop.is_set():
+        item_id = random.randint(1, n_items)
+        try:
+            with lane(), Session(engine) as session:
+                session.execute(
+                    update(InventoryItem).where(InventoryItem.id == item_id).values(quantity=InventoryItem.quantity - 1)
+                )
+                session.add(ServiceOrderItem(order_id=1, item_id=item_id, quantity_sold=1, price_at_moment=10.0))
+                session.execute(text("UPDATE serviceorder SET total_value = total_value + 10 WHERE id = 1"))
+                session.commit()
+            stats["writes"] += 1
+        except OperationalError:
+            stats["errors"] += 1
+
+
+def run_profile(profile, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = database.build_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", profile)
+        SQLModel.metadata.create_all(engine)
+        populate(engine, args.items)
+
+        lane = database.writer_lane if profile == database.PROFILE_TUNED else contextlib.nullcontext
+        stop = threading.Event()
+        counters = [Counter() for _ in range(args.readers + args.writers)]
+        threads = [
+            threading.Thread(target=reader, args=(engine, stop, counters[i])) for i in range(args.readers)
+        ]
+        threads += [
+            threading.Thread(target=writer, args=(engine, stop, counters[args.readers + i], args.items, lane))
+            for i in range(args.writers)
+        ]
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        engine.dispose()
+
+    stats = sum(counters, Counter())
+    print(f"{profile:<8} leituras/s {stats['reads'] / args.seconds:>9.0f}   "
+          f"escritas/s {stats['writes'] / args.seconds:>7.0f}   erros 'database is locked' {stats['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=20_000)
+    parser.add_argument("--readers", type=int, default=6)
+    parser.add_argument("--writers", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=4)
+    args = parser.parse_args()
+    for profile in (database.PROFILE_DEFAULT, database.PROFILE_TUNED):
+        run_profile(profile, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Vazão e latência das rotas com cada DB_MODE (sync, thread, async) sob
+requisições simultâneas.
+
+No modo "sync" as rotas `async def` consultam o SQLite direto no event
+loop: enquanto uma consulta roda, nenhuma outra requisição do worker anda.
+Os modos "thread" e "async" (aiosqlite) liberam o event loop durante as
+consultas. Este benchmark roda o benchmarks/load_test.py num processo novo
+para cada modo (DB_MODE é lido na importação) e para cada nível de
+concorrência, sobre o mesmo banco sintético, e compara os resultados.
+
+O cenário padrão é o "mixed" (telas rápidas e lentas intercaladas); o p99
+mostra o quanto as requisições rápidas esperam atrás das lentas.
+
+Uso:
+    python -m benchmarks.bench_db_modes
+    python -m benchmarks.bench_db_modes --scale small --concurrency 1,8,32
+    python -m benchmarks.bench_db_modes --only os_details,part_lookup --modes sync,thread
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import seed
+from benchmarks.load_test import DEFAULT_CACHE_DIR
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ("sync", "thread", "async")
+
+
+def has_aiosqlite():
+    try:
+        import aiosqlite  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def run_load_test(args, mode, concurrency, output):
+    command = [
+        sys.executable, "-W", "ignore", "-m", "benchmarks.load_test",
+        "--scale", args.scale, "--seed", str(args.seed), "--cache-dir", args.cache_dir,
+        "--requests", str(args.requests), "--concurrency", str(concurrency),
+        "--warmup", str(args.warmup), "--only", args.only, "-o", output,
+    ]
+    result = subprocess.run(
+        command, cwd=ROOT, env={**os.environ, "DB_MODE": mode}, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"load_test falhou (DB_MODE={mode}, concorrência {concurrency}):\n{result.stderr}")
+    with open(output, encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    seed.add_scale_arguments(parser)
+    parser.add_argument("--modes", default=",".join(MODES), help="modos separados por vírgula")
+    parser.add_argument("--concurrency", default="1,8,32", help="níveis de concorrência separados por vírgula")
+    parser.add_argument("--requests", type=int, default=300, help="requisições medidas por cenário")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--only", default="mixed", help="cenários do load_test separados por vírgula")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="onde guardar os bancos gerados")
+    parser.add_argument("-o", "--output", help="grava todos os resultados num JSON")
+    args = parser.parse_args()
+
+    modes = args.modes.split(",")
+    if "async" in modes and not has_aiosqlite():
+        print("aiosqlite não instalado: modo async ignorado (pip install aiosqlite)\n")
+        modes.remove("async")
+    levels = [int(value) for value in args.concurrency.split(",")]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in modes:
+            for concurrency in levels:
+                output = os.path.join(tmp, f"{mode}_{concurrency}.json")
+                results[f"{mode}/{concurrency}"] = run_load_test(args, mode, concurrency, output)
+
+    for scenario in args.only.split(","):
+        print(f"\nCenário {scenario} ({args.scale}, {args.requests} requisições)")
+        print(f"{'modo':<8} {'conc.':>5} {'req/s':>8} {'vs sync':>8} {'p50':>9} {'p95':>9} {'p99':>9}  erros")
+        for concurrency in levels:
+            baseline = results.get(f"sync/{concurrency}", {}).get(scenario)
+            for mode in modes:
+                result = results[f"{mode}/{concurrency}"][scenario]
+                gain = (f"{(result['throughput_rps'] / baseline['throughput_rps'] - 1) * 100:+7.1f}%"
+                        if baseline and mode != "sync" else f"{'-':>8}")
+                print(f"{mode:<8} {concurrency:>5} {result['throughput_rps']:>8.1f} {gain} "
+                      f"{result['p50_ms']:>7.1f}ms {result['p95_ms']:>7.1f}ms {result['p99_ms']:>7.1f}ms  "
+                      f"{sum(result['errors'].values()) or '-'}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"scale": args.scale, "seed": args.seed, "results": results}, f, indent=2)
+        print(f"\nResultado gravado em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark do custo das métricas (app/metrics.py).
+
+Mede cada peça com e sem instrumentação, no mesmo processo:
+  - observação num histograma;
+  - middleware ASGI em volta de uma rota trivial;
+  - instrução SQL simples (SELECT 1) com e sem os eventos da engine;
+  - renderização de um template com e sem TimedTemplate.
+A diferença é o custo que a métrica acrescenta a cada requisição/instrução.
+
+Uso:
+    python -m benchmarks.bench_metrics
+    python -m benchmarks.bench_metrics --n 50000
+"""
+import argparse
+import asyncio
+import time
+
+from jinja2 import Environment
+from sqlalchemy import create_engine, text
+
+from app import metrics
+
+
+def per_call_us(fn, n):
+    started = time.perf_counter()
+    fn(n)
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def bench_histogram(n):
+    histogram = metrics.Histogram("bench_seconds", "bench", ("route",))
+
+    def run(n):
+        for i in range(n):
+            histogram.observe(0.003 * (i % 50), "/os/{os_id}")
+    return per_call_us(run, n)
+
+
+def bench_middleware(n):
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    scope = {"type": "http", "method": "GET", "path": "/bench", "query_string": b""}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    def runner(app):
+        def run(n):
+            async def loop():
+                for _ in range(n):
+                    await app(dict(scope), receive, send)
+            asyncio.run(loop())
+        return run
+
+    return per_call_us(runner(endpoint), n), per_call_us(runner(metrics.MetricsMiddleware(endpoint)), n)
+
+
+def bench_sql(n):
+    results = []
+    for instrumented in (False, True):
+        engine = create_engine("sqlite://")
+        if instrumented:
+            metrics.instrument_engine(engine)
+        with engine.connect() as conn:
+            statement = text("SELECT 1")
+
+            def run(n):
+                for _ in range(n):
+                    conn.execute(statement).scalar()
+            run(100)
+            results.append(per_call_us(run, n))
+        engine.dispose()
+    return results
+
+
+def bench_template(n):
+    source = "{% for i in items %}<tr><td>{{ i }}</td><td>{{ '%.2f'|format(i * 1.5) }}</td></tr>{% endfor %}"
+    results = []
+    for template_class in (None, metrics.TimedTemplate):
+        env = Environment()
+        if template_class:
+            env.template_class = template_class
+        template = env.from_string(source)
+
+        def run(n):
+            for _ in range(n):
+                template.render(items=range(20))
+        results.append(per_call_us(run, n))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'peça':<28} {'sem':>10} {'com':>10} {'custo':>10}")
+    observe = bench_histogram(args.n)
+    print(f"{'histograma.observe':<28} {'-':>10} {observe:>8.2f}us {observe:>8.2f}us")
+    for label, (plain, timed) in (
+        ("requisição (middleware)", bench_middleware(args.n)),
+        ("instrução SQL (SELECT 1)", bench_sql(args.n)),
+        ("template (20 linhas)", bench_template(args.n // 4)),
+    ):
+        print(f"{label:<28} {plain:>8.2f}us {timed:>8.2f}us {timed - plain:>8.2f}us")
+
+
+if __name__ == "__main__":
+    main()
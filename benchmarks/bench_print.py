@@ -0,0 +1,94 @@
+"""
+Benchmark da impressão de OS em lote (app/print_batch.py).
+
+Gera OS fechadas num banco temporário e mede o ZIP completo: carga em
+consultas agrupadas, renderização com 1 processo e com o pool inteiro, e
+a repetição servida pelo cache de documentos das OS fechadas.
+
+Uso:
+    python -m benchmarks.bench_print
+    python -m benchmarks.bench_print --orders 500 --format pdf
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+
+from sqlmodel import Session, SQLModel
+
+from app import config, database, print_batch
+from app.models import Client, InventoryItem, ServiceOrder, ServiceOrderItem, ServiceOrderStatus
+
+
+def populate(engine, args):
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(Client.__table__.insert(), [
+            {"name": f"Cliente {i}", "phone": "0", "car_model": "Scania R450", "car_plate": f"ABC{i:04d}"}
+            for i in range(50)
+        ])
+        conn.execute(InventoryItem.__table__.insert(), [
+            {"name": f"Peça {i}", "category": "Motor", "cost_price": 10.0, "sell_price": 25.0,
+             "quantity": 100, "min_quantity": 5, "location": None}
+            for i in range(500)
+        ])
+        start = datetime(2024, 1, 1, 8)
+        conn.execute(ServiceOrder.__table__.insert(), [
+            {"id": i + 1, "client_id": rng.randint(1, 50), "status": ServiceOrderStatus.CLOSED,
+             "total_value": 0.0, "created_at": start + timedelta(hours=i)}
+            for i in range(args.orders)
+        ])
+        conn.execute(ServiceOrderItem.__table__.insert(), [
+            {"order_id": i + 1, "item_id": rng.randint(1, 500), "quantity_sold": rng.randint(1, 4),
+             "price_at_moment": 25.0}
+            for i in range(args.orders) for _ in range(rng.randint(1, args.lines_per_order * 2 - 1))
+        ])
+
+
+def measure(label, documents, fmt, pool):
+    stats = {}
+    t0 = time.perf_counter()
+    size = sum(len(chunk) for chunk in print_batch.stream_zip(documents, fmt, pool=pool, stats=stats))
+    elapsed = time.perf_counter() - t0
+    print(f"{label:<28} {elapsed:>7.2f}s  {len(documents) / elapsed:>8.0f} OS/s  "
+          f"ZIP {size / 1024:>8.0f} KiB  ({stats['rendered']} geradas, {stats['cached']} do cache)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=300)
+    parser.add_argument("--lines-per-order", type=int, default=6)
+    parser.add_argument("--format", default=print_batch.FORMAT_HTML,
+                        choices=[print_batch.FORMAT_PDF, print_batch.FORMAT_HTML])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config.PRINT_CACHE_DIR = os.path.join(tmp, "print_cache")
+        engine = database.build_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        SQLModel.metadata.create_all(engine)
+        populate(engine, args)
+
+        t0 = time.perf_counter()
+        with Session(engine) as session:
+            documents = print_batch.load_documents(session, print_batch.select_ids(session))
+        print(f"{len(documents)} OS carregadas em {(time.perf_counter() - t0) * 1000:.0f} ms\n")
+
+        for workers in sorted({1, print_batch.workers()}):
+            with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+                # Aquece os processos (importações e template) antes de medir
+                list(pool.map(print_batch._render_chunk, [documents[:1]] * workers, [args.format] * workers))
+                if os.path.isdir(config.PRINT_CACHE_DIR):
+                    for name in os.listdir(config.PRINT_CACHE_DIR):
+                        os.remove(os.path.join(config.PRINT_CACHE_DIR, name))
+                measure(f"{workers} processo(s), sem cache", documents, args.format, pool)
+        # Tudo já está no cache: o pool nem é usado
+        measure("com cache", documents, args.format, None)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark da busca de Estoque: LIKE '%termo%' (antigo) x índice FTS5.
+
+Gera um banco temporário com N peças (padrão 100.000) e mede, para alguns
+termos típicos digitados no balcão, o tempo da consulta usada pela rota
+/inventory em cada caminho.
+
+Uso:
+    python -m benchmarks.bench_search
+    python -m benchmarks.bench_search --items 200000 --repeat 20
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import or_
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app import inventory_search
+from app.models import InventoryItem
+
+PARTS = [
+    "Filtro de Óleo", "Filtro de Ar", "Filtro de Combustível", "Pastilha de Freio",
+    "Disco de Freio", "Lona de Freio", "Amortecedor", "Correia Dentada", "Bomba d'Água",
+    "Junta do Cabeçote", "Válvula de Admissão", "Rolamento de Roda", "Embreagem",
+    "Cruzeta do Cardan", "Mangueira do Radiador", "Lâmpada do Farol", "Bateria",
+    "Alternador", "Motor de Partida", "Bico Injetor", "Sensor de Rotação", "Retentor",
+]
+BRANDS = ["Bosch", "Mahle", "Fras-le", "Cofap", "SKF", "Sabó", "Mann", "Tecfil", "Nakata", "Wega"]
+CATEGORIES = ["Motor", "Freio", "Suspensão", "Transmissão", "Elétrica", "Arrefecimento", "Injeção"]
+TERMS = ["filtro", "oleo", "pastilha bosch", "cabeç", "freio", "sensor rot", "xyz"]
+
+
+def populate(engine, n_items: int, seed: int = 42):
+    """Insere N peças sintéticas com executemany (uma transação)."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_items):
+        cost = round(rng.uniform(5, 2000), 2)
+        rows.append({
+            "name": f"{rng.choice(PARTS)} {rng.choice(BRANDS)} {i}",
+            "category": rng.choice(CATEGORIES),
+            "cost_price": cost,
+            "sell_price": round(cost * rng.uniform(1.2, 1.8), 2),
+            "quantity": rng.randint(0, 50),
+            "min_quantity": rng.randint(1, 10),
+            "location": f"Prateleira {rng.choice('ABCDEFGH')}{rng.randint(1, 30)}",
+        })
+    with engine.begin() as conn:
+        conn.execute(InventoryItem.__table__.insert(), rows)
+
+
+def like_query(term: str):
+    return select(InventoryItem).where(or_(
+        InventoryItem.name.ilike(f"%{term}%"),
+        InventoryItem.category.ilike(f"%{term}%"),
+    ))
+
+
+def fts_query(term: str):
+    return inventory_search.apply_search(select(InventoryItem), term)
+
+
+def measure(session, query, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = session.exec(query).all()
+        timings.append((time.perf_counter() - start) * 1000)
+    return len(rows), statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        SQLModel.metadata.create_all(engine)
+        inventory_search.install(engine)
+
+        start = time.perf_counter()
+        populate(engine, args.items)
+        print(f"{args.items} peças inseridas (com indexação FTS) em {time.perf_counter() - start:.1f}s\n")
+
+        print(f"{'termo':<16}{'LIKE (ms)':>12}{'linhas':>9}{'FTS5 (ms)':>12}{'linhas':>9}{'ganho':>9}")
+        with Session(engine) as session:
+            for term in TERMS:
+                like_rows, like_ms = measure(session, like_query(term), args.repeat)
+                fts_rows, fts_ms = measure(session, fts_query(term), args.repeat)
+                print(f"{term:<16}{like_ms:>12.2f}{like_rows:>9}{fts_ms:>12.2f}{fts_rows:>9}{like_ms / fts_ms:>8.1f}x")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark da subida da aplicação (o que cada worker do uvicorn e cada
+reload pagam antes de responder).
+
+Cada medição roda num processo Python novo, sobre um banco temporário:
+  - import: `import app.main` (módulos + criação do app e do executor de IA);
+  - primeira resposta: startup (create_db_and_tables, jobs) + GET /;
+  - total: do início do processo até a primeira resposta, interpretador
+    incluído (medido de fora);
+  - carga do SDK: o que a primeira chamada ao Gemini paga ao importar o
+    SDK (só com AI_PROVIDER=gemini; não chama a API).
+
+Com --eager o SDK do Gemini é importado antes da aplicação, reproduzindo a
+subida de quando app/main.py o importava no topo. Requer o httpx, usado
+pelo TestClient (pip install -r requirements-dev.txt).
+
+Uso:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 10 --eager
+    python -m benchmarks.bench_startup --top 15
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Roda no processo filho; a última linha da saída é o JSON com os tempos
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+if {eager!r}:
+    import google.generativeai
+from app.main import app, model
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app) as client:
+    status = client.get("/").status_code
+    answered = time.perf_counter()
+    sdk_on_startup = "google.generativeai" in sys.modules
+load = None
+if hasattr(model, "_load"):
+    began = time.perf_counter()
+    model._load()
+    load = time.perf_counter() - began
+print(json.dumps({{
+    "status": status, "import": imported - started, "first_response": answered - started,
+    "sdk_on_startup": sdk_on_startup, "sdk_load": load, "after_response": time.perf_counter() - answered,
+}}))
+"""
+
+
+def run_probe(env, eager):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", PROBE.format(eager=eager)],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    total = time.perf_counter() - started
+    if result.returncode != 0:
+        raise SystemExit(f"O processo de medição falhou:\n{result.stderr}")
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    # Até a primeira resposta: desconta o que o filho fez depois dela
+    data["total"] = total - data["after_response"]
+    return data
+
+
+def heaviest_imports(env, n):
+    """Pacotes de primeiro nível mais caros de importar (python -X importtime)."""
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-X", "importtime", "-c", "import app.main"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    totals = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        if match and "." not in match.group(3):
+            totals[match.group(3)] = max(totals.get(match.group(3), 0), int(match.group(1)))
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--provider", default="gemini", choices=("gemini", "fake"))
+    parser.add_argument("--eager", action="store_true", help="compara com o SDK importado na subida")
+    parser.add_argument("--top", type=int, default=0, help="lista os N pacotes mais caros de importar")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp.name, 'startup.db')}",
+        "PRINT_CACHE_DIR": os.path.join(tmp.name, "print_cache"),
+        "AI_PROVIDER": args.provider,
+    }
+    variants = [("SDK na primeira chamada", False)] + ([("SDK importado na subida", True)] if args.eager else [])
+    # Primeira subida cria o banco e aquece o cache de bytecode/disco
+    run_probe(env, False)
+
+    print(f"{args.runs} subidas por variante (mediana), AI_PROVIDER={args.provider}\n")
+    print(f"{'variante':<26} {'import':>9} {'1ª resposta':>12} {'total':>9} {'carga do SDK':>13}")
+    for label, eager in variants:
+        runs = [run_probe(env, eager) for _ in range(args.runs)]
+        assert all(r["status"] == 200 for r in runs)
+        median = {key: statistics.median(r[key] for r in runs) for key in ("import", "first_response", "total")}
+        loads = [r["sdk_load"] for r in runs if r["sdk_load"] is not None]
+        load = f"{statistics.median(loads) * 1000:>11.0f}ms" if loads else f"{'-':>13}"
+        print(f"{label:<26} {median['import'] * 1000:>7.0f}ms {median['first_response'] * 1000:>10.0f}ms "
+              f"{median['total'] * 1000:>7.0f}ms {load}")
+        if not eager and any(r["sdk_on_startup"] for r in runs):
+            print("  AVISO: o SDK do Gemini foi importado durante a subida")
+
+    if args.top:
+        print("\nPacotes mais caros de importar (app.main):")
+        for name, microseconds in heaviest_imports(env, args.top):
+            print(f"  {name:<28} {microseconds / 1000:>7.0f}ms")
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
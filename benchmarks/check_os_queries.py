@@ -0,0 +1,141 @@
+"""
+Conferência do número de consultas das telas de OS (app/os_view.py).
+
+Sobe a aplicação num banco temporário, cria uma OS com 1 item e outra com
+muitos itens e conta as instruções SQL enviadas ao banco em cada rota:
+detalhes da OS, impressão, relatório de IA (modelo "fake") e a carga da
+impressão em lote. A OS inteira (OS + cliente + itens) deve vir numa única
+consulta, qualquer que seja o número de itens. A leitura das versões para
+o ETag (app/http_cache.py) é contada à parte: também é uma só.
+
+Sai com código 1 se alguma rota passar do limite. Requer o httpx, usado
+pelo TestClient (pip install -r requirements-dev.txt).
+
+Uso:
+    python -m benchmarks.check_os_queries
+"""
+import argparse
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# Banco e modelo de IA de teste: precisam estar definidos antes de importar a aplicação
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'check.db')}"
+os.environ["AI_PROVIDER"] = "fake"
+os.environ["AI_FAKE_LATENCY"] = "0"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+from app import print_batch  # noqa: E402
+from app.database import async_engine, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Client, InventoryItem, ServiceOrder, ServiceOrderItem, ServiceOrderStatus  # noqa: E402
+
+# Tabelas lidas pelo carregador da OS
+_OS_TABLES = ("serviceorder", "client", "inventoryitem")
+
+
+@contextmanager
+def counting():
+    """Instruções SQL executadas no bloco (lista de textos)."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # Com DB_MODE=async as rotas consultam pela engine do aiosqlite
+    engines = [engine] + ([async_engine.sync_engine] if async_engine is not None else [])
+    for target in engines:
+        event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", before_cursor_execute)
+
+
+def is_version_probe(statement):
+    return statement.lstrip().upper().startswith("SELECT O.VERSION")
+
+
+def os_reads(statements):
+    """SELECTs que leem OS, cliente ou peças (as do carregador da OS, sem a leitura do ETag)."""
+    return [
+        s for s in statements
+        if s.lstrip().upper().startswith("SELECT") and not is_version_probe(s)
+        and any(f"FROM {t}" in s or f"JOIN {t}" in s for t in _OS_TABLES)
+    ]
+
+
+def populate(lines_per_order):
+    with engine.begin() as conn:
+        conn.execute(Client.__table__.insert(), [
+            {"name": "Cliente", "phone": "11999990000", "car_model": "Scania R450", "car_plate": "ABC1D23"}
+        ])
+        conn.execute(InventoryItem.__table__.insert(), [
+            {"name": f"Peça {i}", "category": "Motor", "cost_price": 10.0, "sell_price": 25.0,
+             "quantity": 1000, "min_quantity": 5, "location": None}
+            for i in range(lines_per_order)
+        ])
+        conn.execute(ServiceOrder.__table__.insert(), [
+            {"id": os_id, "client_id": 1, "status": ServiceOrderStatus.CLOSED, "total_value": 25.0 * n}
+            for os_id, n in ((1, 1), (2, lines_per_order))
+        ])
+        conn.execute(ServiceOrderItem.__table__.insert(), [
+            {"order_id": os_id, "item_id": i + 1, "quantity_sold": 1, "price_at_moment": 25.0}
+            for os_id, n in ((1, 1), (2, lines_per_order)) for i in range(n)
+        ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=40, help="itens da OS grande")
+    parser.add_argument("-v", "--verbose", action="store_true", help="mostra as instruções de cada rota")
+    args = parser.parse_args()
+
+    failures = 0
+    with TestClient(app) as client:
+        populate(args.lines)
+        checks = [
+            ("GET /os/{id}", lambda os_id: client.get(f"/os/{os_id}")),
+            ("GET /os/{id}/print", lambda os_id: client.get(f"/os/{os_id}/print")),
+            ("POST /os/{id}/generate_report", lambda os_id: client.post(f"/os/{os_id}/generate_report")),
+        ]
+        print(f"{'rota':<32} {'OS':>4} {'itens':>6} {'SQL total':>10} {'leituras da OS':>15} {'ETag':>5}")
+        for label, call in checks:
+            for os_id, lines in ((1, 1), (2, args.lines)):
+                with counting() as statements:
+                    response = call(os_id)
+                reads = os_reads(statements)
+                probes = sum(map(is_version_probe, statements))
+                ok = response.status_code == 200 and len(reads) == 1 and probes <= 1
+                failures += not ok
+                print(f"{label:<32} {os_id:>4} {lines:>6} {len(statements):>10} {len(reads):>15} {probes:>5}"
+                      f"{'' if ok else '   <-- FALHOU (esperado 1)'}")
+                if args.verbose:
+                    for statement in statements:
+                        print("    " + " ".join(statement.split())[:140])
+
+        # Impressão em lote: uma consulta por lote de ids, não por OS
+        with Session(engine) as session, counting() as statements:
+            documents = print_batch.load_documents(session, [1, 2])
+        ok = len(documents) == 2 and len(os_reads(statements)) == 1
+        failures += not ok
+        print(f"{'print_batch.load_documents':<32} {'1,2':>4} {1 + args.lines:>6} {len(statements):>10} "
+              f"{len(os_reads(statements)):>15}{'' if ok else '   <-- FALHOU (esperado 1)'}")
+
+    engine.dispose()
+    _tmp.cleanup()
+    if failures:
+        print(f"\n{failures} conferência(s) falharam")
+        sys.exit(1)
+    print("\nOK: cada OS é lida numa única consulta")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Teste de carga das rotas da aplicação, em processo, sobre uma oficina sintética.
+
+1. Gera (ou reaproveita) um banco com benchmarks/seed.py e trabalha numa
+   cópia dele: as escritas de uma rodada não afetam a próxima.
+2. Sobe a aplicação FastAPI de verdade (startup incluído) com o modelo de
+   IA "fake" e chama as rotas via ASGI (httpx.ASGITransport), sem rede,
+   com N requisições simultâneas.
+3. Para cada cenário mede vazão (req/s) e latência p50/p95/p99, e grava
+   tudo num JSON (com commit, escala e parâmetros) para comparar rodadas.
+
+Cenários: dashboard, estoque (lista, busca HTMX, seletor de peças), OS
+(lista, detalhes, lançar peça, impressão), relatório de IA, relatórios
+de vendas e "mixed" (telas rápidas e lentas intercaladas, como no balcão).
+Os ids e termos de busca são sorteados com a mesma semente.
+
+Requer o httpx (pip install -r requirements-dev.txt).
+
+Uso:
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --scale small --requests 100 --concurrency 8
+    python -m benchmarks.load_test --only os_details,add_item -o antes.json
+    python -m benchmarks.load_test -o depois.json --compare antes.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Banco de trabalho, IA local e sem log de requisições lentas: precisam
+# estar definidos antes de importar a aplicação (app.config lê na importação)
+_WORK_DIR = tempfile.mkdtemp(prefix="oficina_load_")
+_WORK_DB = os.path.join(_WORK_DIR, "oficina.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_WORK_DB}"
+os.environ["AI_PROVIDER"] = "fake"
+os.environ["AI_FAKE_LATENCY"] = "0"
+os.environ["METRICS_SLOW_REQUEST_MS"] = "0"
+os.environ["PRINT_CACHE_DIR"] = os.path.join(_WORK_DIR, "print_cache")
+
+from benchmarks import seed  # noqa: E402
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "oficina_bench")
+
+
+def percentile(sorted_values, p):
+    """Percentil p (0-100) por interpolação linear, de uma lista já ordenada."""
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (k - low)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_database(args, scale):
+    """Banco semeado em cache (por escala + semente), copiado para o banco de trabalho desta rodada."""
+    cache_dir = args.cache_dir
+    os.makedirs(cache_dir, exist_ok=True)
+    name = "_".join(str(v) for v in (args.seed, *(getattr(scale, f) for f in scale.__dataclass_fields__)))
+    seeded = os.path.join(cache_dir, f"seed_{name}.db")
+    if not os.path.exists(seeded) or args.reseed:
+        if os.path.exists(seeded):
+            os.remove(seeded)
+        print(f"Gerando a oficina sintética ({scale})...")
+        counts = seed.generate(seeded + ".tmp", scale, args.seed)
+        os.replace(seeded + ".tmp", seeded)
+        print(f"  {counts['clients']} clientes, {counts['parts']} peças, {counts['orders']} OS, "
+              f"{counts['lines']} itens em {counts['seconds']}s")
+    shutil.copyfile(seeded, _WORK_DB)
+
+
+def sample_ids(engine, rng):
+    """Ids e termos sorteados para os cenários (mesma semente -> mesmas requisições)."""
+    from sqlalchemy import text
+
+    with engine.connect() as conn:
+        open_ids = [r[0] for r in conn.execute(text("SELECT id FROM serviceorder WHERE status = 'OPEN'"))]
+        closed_ids = [r[0] for r in conn.execute(
+            text("SELECT id FROM serviceorder WHERE status = 'CLOSED' ORDER BY id DESC LIMIT 5000"))]
+        part_ids = [r[0] for r in conn.execute(
+            text("SELECT id FROM inventoryitem WHERE quantity > 1000 ORDER BY id LIMIT 5000"))]
+        names = [r[0] for r in conn.execute(text("SELECT name FROM inventoryitem ORDER BY id LIMIT 2000"))]
+    words = sorted({w for name in names for w in name.split() if len(w) > 3 and not w.isdigit()})
+    return {
+        "open": open_ids or closed_ids, "closed": closed_ids, "parts": part_ids,
+        "terms": [rng.choice(words)[:n] for n in (3, 4, 6) for _ in range(50)],
+    }
+
+
+def scenarios(data):
+    """nome -> função(rng) que devolve (método, url, dados do formulário, cabeçalhos)."""
+    hx = {"HX-Request": "true"}
+    available = {
+        "dashboard": lambda rng: ("GET", "/", None, None),
+        "inventory_list": lambda rng: ("GET", "/inventory", None, None),
+        "inventory_search": lambda rng: ("GET", f"/inventory?search={rng.choice(data['terms'])}", None, hx),
+        "part_lookup": lambda rng: ("GET", f"/inventory/lookup?q={rng.choice(data['terms'])}", None, hx),
+        "os_list": lambda rng: ("GET", "/os", None, None),
+        "os_details": lambda rng: ("GET", f"/os/{rng.choice(data['closed'] + data['open'])}", None, None),
+        "add_item": lambda rng: ("POST", f"/os/{rng.choice(data['open'])}/add_item",
+                                 {"item_id": str(rng.choice(data["parts"])), "quantity": "1"}, None),
+        "print": lambda rng: ("GET", f"/os/{rng.choice(data['closed'])}/print", None, None),
+        "ai_report": lambda rng: ("POST", f"/os/{rng.choice(data['closed'][:20])}/generate_report", None, None),
+        "reports": lambda rng: ("GET", "/reports", None, None),
+    }
+    # Consultas rápidas disputando o worker com listas e buscas mais pesadas
+    mix = [available[name] for name in ("dashboard", "part_lookup", "os_details", "add_item",
+                                        "inventory_search", "os_list")]
+    available["mixed"] = lambda rng: rng.choice(mix)(rng)
+    return available
+
+
+async def run_scenario(client, build, rng, requests, concurrency):
+    plan = [build(rng) for _ in range(requests)]
+    latencies, errors = [], {}
+    position = 0
+
+    async def worker():
+        nonlocal position
+        while position < len(plan):
+            method, url, form, headers = plan[position]
+            position += 1
+            started = time.perf_counter()
+            response = await client.request(method, url, data=form, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    ms = lambda value: round(value * 1000, 2)  # noqa: E731
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "throughput_rps": round(requests / wall, 1),
+        "mean_ms": ms(sum(latencies) / len(latencies)),
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]),
+        "errors": errors,
+    }
+
+
+async def run(args):
+    import httpx
+
+    from app import config
+    from app.database import engine
+    from app.main import app
+
+    print(f"DB_MODE={config.DB_MODE}, DB_PROFILE={config.DB_PROFILE}")
+
+    rng = random.Random(args.seed)
+    data = sample_ids(engine, rng)
+    available = scenarios(data)
+    selected = args.only.split(",") if args.only else list(available)
+    unknown = [name for name in selected if name not in available]
+    if unknown:
+        raise SystemExit(f"Cenários desconhecidos: {', '.join(unknown)} (disponíveis: {', '.join(available)})")
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://oficina") as client:
+            print(f"\n{'cenário':<18} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'máx':>9}  erros")
+            for name in selected:
+                build = available[name]
+                await run_scenario(client, build, rng, args.warmup, 1)
+                result = await run_scenario(client, build, rng, args.requests, args.concurrency)
+                results[name] = result
+                print(f"{name:<18} {result['throughput_rps']:>8.1f} {result['p50_ms']:>7.1f}ms "
+                      f"{result['p95_ms']:>7.1f}ms {result['p99_ms']:>7.1f}ms {result['max_ms']:>7.1f}ms  "
+                      f"{sum(result['errors'].values()) or '-'}")
+    engine.dispose()
+    return results
+
+
+def compare(current, previous_path):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\nComparação com {previous_path} (commit {previous['meta'].get('commit')}):")
+    print(f"{'cenário':<18} {'req/s':>16} {'p50':>20} {'p99':>20}")
+
+    def delta(old, new):
+        return f"{(new - old) / old * 100:+6.1f}%" if old else "    -  "
+
+    for name, result in current["results"].items():
+        old = previous["results"].get(name)
+        if not old:
+            continue
+        print(f"{name:<18} {result['throughput_rps']:>8.1f} {delta(old['throughput_rps'], result['throughput_rps'])}"
+              f" {result['p50_ms']:>10.1f}ms {delta(old['p50_ms'], result['p50_ms'])}"
+              f" {result['p99_ms']:>10.1f}ms {delta(old['p99_ms'], result['p99_ms'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    seed.add_scale_arguments(parser)
+    parser.add_argument("--requests", type=int, default=200, help="requisições medidas por cenário")
+    parser.add_argument("--concurrency", type=int, default=4, help="requisições simultâneas")
+    parser.add_argument("--warmup", type=int, default=10, help="requisições de aquecimento por cenário")
+    parser.add_argument("--only", help="cenários separados por vírgula")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="onde guardar os bancos gerados")
+    parser.add_argument("--reseed", action="store_true", help="gera o banco de novo mesmo se já existir")
+    parser.add_argument("-o", "--output", help="arquivo JSON do resultado (padrão: bench_results/<data>_<commit>.json)")
+    parser.add_argument("--compare", help="JSON de uma rodada anterior para comparar")
+    args = parser.parse_args()
+    scale = seed.scale_from_args(args)
+
+    try:
+        prepare_database(args, scale)
+        results = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+
+    from app import config
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "scale": {f: getattr(scale, f) for f in scale.__dataclass_fields__},
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "db_mode": config.DB_MODE,
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        "bench_results", f"{datetime.now():%Y%m%d_%H%M%S}_{commit or 'sem-git'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nResultado gravado em {output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Gerador de uma oficina sintética (dados de teste e de benchmark).
+
+Cria um banco SQLite com clientes e seus caminhões, um estoque grande de
+peças e anos de OS com itens, sempre iguais para a mesma semente e escala
+(random.Random(seed)). Os dados entram em lotes (executemany) com as
+tabelas ainda sem triggers; depois o banco passa pelo mesmo preparo da
+inicialização da aplicação (migrações, contadores do Dashboard, índice de
+busca e resumo de vendas), que calcula tudo a partir dos dados.
+
+OS com mais de OPEN_AFTER_DAYS dias estão fechadas; as mais recentes ficam
+abertas, para os cenários de lançamento de peças.
+
+Uso:
+    python -m benchmarks.seed oficina_bench.db
+    python -m benchmarks.seed oficina_bench.db --scale large --seed 7
+    python -m benchmarks.seed oficina_bench.db --parts 200000 --years 5
+"""
+import argparse
+import os
+import random
+import time
+from dataclasses import dataclass, fields, replace
+from datetime import datetime, timedelta
+
+from sqlmodel import SQLModel
+
+from app import database
+from app.models import Client, InventoryItem, ServiceOrder, ServiceOrderItem, ServiceOrderStatus
+
+
+@dataclass(frozen=True)
+class Scale:
+    clients: int
+    parts: int
+    years: int
+    orders_per_day: int
+    lines_per_order: int
+
+
+SCALES = {
+    "small": Scale(clients=500, parts=5_000, years=1, orders_per_day=15, lines_per_order=4),
+    "medium": Scale(clients=5_000, parts=100_000, years=3, orders_per_day=40, lines_per_order=5),
+    "large": Scale(clients=20_000, parts=250_000, years=5, orders_per_day=80, lines_per_order=6),
+}
+
+# OS abertas nos últimos dias (o resto já foi fechado)
+OPEN_AFTER_DAYS = 7
+
+_BATCH = 20_000
+
+TRUCKS = [
+    "Scania R450", "Scania R540", "Scania P320", "Volvo FH 460", "Volvo FH 540", "Volvo VM 270",
+    "Mercedes-Benz Actros 2651", "Mercedes-Benz Atego 2430", "Mercedes-Benz Axor 2544",
+    "DAF XF 480", "DAF CF 410", "Iveco S-Way 480", "Iveco Tector 240", "MAN TGX 29.480",
+    "VW Constellation 24.280", "VW Meteor 28.460", "VW Delivery 11.180", "Ford Cargo 2429",
+]
+FIRST_NAMES = [
+    "João", "José", "Antônio", "Francisco", "Carlos", "Paulo", "Pedro", "Lucas", "Luiz", "Marcos",
+    "Maria", "Ana", "Francisca", "Antônia", "Adriana", "Juliana", "Márcia", "Fernanda", "Patrícia", "Aline",
+]
+LAST_NAMES = [
+    "Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes",
+    "Costa", "Ribeiro", "Martins", "Carvalho", "Almeida", "Lopes", "Soares", "Fernandes", "Vieira", "Barbosa",
+]
+COMPANY_SUFFIXES = ["Transportes", "Logística", "Cargas", "Fretes", "Rodoviário"]
+# categoria -> peças
+PARTS = {
+    "Motor": ["Junta do cabeçote", "Pistão", "Anel de segmento", "Bomba de óleo", "Turbina", "Correia dentada",
+              "Bronzina", "Válvula de admissão", "Bico injetor", "Bomba injetora"],
+    "Freio": ["Lona de freio", "Tambor de freio", "Pastilha de freio", "Disco de freio", "Cuíca de freio",
+              "Válvula relé", "Compressor de ar", "Secador de ar"],
+    "Suspensão": ["Feixe de molas", "Amortecedor", "Bolsa de ar", "Barra estabilizadora", "Bucha do feixe",
+                  "Grampo de mola"],
+    "Elétrica": ["Alternador", "Motor de partida", "Bateria 150Ah", "Relé", "Farol", "Lanterna traseira",
+                 "Chicote elétrico", "Sensor de rotação"],
+    "Transmissão": ["Kit embreagem", "Platô", "Disco de embreagem", "Rolamento de embreagem", "Cruzeta",
+                    "Cardã", "Sincronizado"],
+    "Arrefecimento": ["Radiador", "Bomba d'água", "Válvula termostática", "Ventoinha", "Mangueira do radiador",
+                      "Reservatório de expansão"],
+    "Filtros": ["Filtro de óleo", "Filtro de combustível", "Filtro de ar", "Filtro separador", "Filtro de cabine"],
+    "Pneus": ["Pneu 295/80 R22.5", "Pneu 275/80 R22.5", "Câmara de ar", "Protetor", "Válvula de pneu"],
+}
+BRANDS = ["Bosch", "Mahle", "Sabó", "Cofap", "Fras-le", "Wabco", "Knorr", "ZF", "Eaton", "Mann", "Tecfil",
+          "Pirelli", "Michelin", "Continental", "Valeo", "Delphi", "Schadek", "Nakata"]
+LOCATIONS = [f"Corredor {a}-{b:02d}" for a in "ABCDEFGH" for b in range(1, 21)]
+
+
+def plate(rng) -> str:
+    """Placa no padrão Mercosul (ABC1D23)."""
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return (
+        "".join(rng.choice(letters) for _ in range(3)) + str(rng.randint(0, 9))
+        + rng.choice(letters) + f"{rng.randint(0, 99):02d}"
+    )
+
+
+def _clients(rng, n):
+    for _ in range(n):
+        person = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        name = person if rng.random() < 0.6 else f"{rng.choice(LAST_NAMES)} {rng.choice(COMPANY_SUFFIXES)}"
+        yield {
+            "name": name,
+            "phone": f"{rng.randint(11, 99)}9{rng.randint(1000, 9999)}{rng.randint(1000, 9999)}",
+            "email": None if rng.random() < 0.5 else f"{person.split()[0].lower()}{rng.randint(1, 999)}@email.com",
+            "car_model": rng.choice(TRUCKS),
+            "car_plate": plate(rng),
+        }
+
+
+def _parts(rng, n):
+    categories = list(PARTS)
+    for i in range(n):
+        category = rng.choice(categories)
+        cost = round(rng.lognormvariate(4.0, 1.0), 2)
+        yield {
+            "name": f"{rng.choice(PARTS[category])} {rng.choice(BRANDS)} {rng.choice(TRUCKS).split()[0]} "
+                    f"{rng.randint(100000, 999999)}",
+            "category": category,
+            "cost_price": cost,
+            "sell_price": round(cost * rng.uniform(1.3, 2.2), 2),
+            # Estoque alto: os cenários de venda não devem esgotar peças
+            "quantity": rng.randint(0, 10) if rng.random() < 0.05 else rng.randint(50, 5000),
+            "min_quantity": rng.choice((2, 5, 10, 20)),
+            "location": rng.choice(LOCATIONS),
+        }
+
+
+def _insert(conn, table, rows):
+    batch, total = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= _BATCH:
+            conn.execute(table.insert(), batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        conn.execute(table.insert(), batch)
+        total += len(batch)
+    return total
+
+
+def _orders(conn, rng, scale: Scale, parts, now):
+    """OS e itens dia a dia; poucas peças concentram a maior parte das vendas."""
+    first_day = (now - timedelta(days=365 * scale.years)).date()
+    open_since = now - timedelta(days=OPEN_AFTER_DAYS)
+    prices = parts["sell_price"]
+    n_parts = len(prices)
+    order_id = 0
+    orders, lines = [], []
+    n_orders = n_lines = 0
+    day = first_day
+    while day <= now.date():
+        for _ in range(rng.randint(scale.orders_per_day // 2, scale.orders_per_day * 3 // 2)):
+            created = datetime.combine(day, datetime.min.time()) + timedelta(minutes=rng.randint(420, 1080))
+            if created > now:
+                continue
+            order_id += 1
+            total = 0.0
+            for _ in range(rng.randint(1, scale.lines_per_order * 2 - 1)):
+                # Log-uniforme: cada faixa de 10x ids vende o mesmo, as primeiras peças vendem muito
+                item_id = min(int(n_parts ** rng.random()), n_parts)
+                quantity = rng.randint(1, 4)
+                price = prices[item_id - 1]
+                total += quantity * price
+                lines.append({"order_id": order_id, "item_id": item_id, "quantity_sold": quantity,
+                              "price_at_moment": price})
+            orders.append({
+                "id": order_id, "client_id": rng.randint(1, scale.clients),
+                "status": ServiceOrderStatus.OPEN if created >= open_since else ServiceOrderStatus.CLOSED,
+                "total_value": round(total, 2), "created_at": created,
+            })
+        if len(lines) >= _BATCH:
+            conn.execute(ServiceOrder.__table__.insert(), orders)
+            conn.execute(ServiceOrderItem.__table__.insert(), lines)
+            n_orders, n_lines = n_orders + len(orders), n_lines + len(lines)
+            orders, lines = [], []
+        day += timedelta(days=1)
+    if orders:
+        conn.execute(ServiceOrder.__table__.insert(), orders)
+        conn.execute(ServiceOrderItem.__table__.insert(), lines)
+        n_orders, n_lines = n_orders + len(orders), n_lines + len(lines)
+    return n_orders, n_lines
+
+
+def generate(path: str, scale: Scale, seed: int = 42, now: datetime = None, verbose: bool = True) -> dict:
+    """Cria o banco em `path` (que não pode existir) e devolve as contagens geradas."""
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    rng = random.Random(seed)
+    now = now or datetime.now().replace(microsecond=0)
+    engine = database.build_engine(f"sqlite:///{path}")
+    started = time.perf_counter()
+    counts = {}
+    try:
+        SQLModel.metadata.create_all(engine)
+        with engine.begin() as conn:
+            counts["clients"] = _insert(conn, Client.__table__, _clients(rng, scale.clients))
+            part_rows = list(_parts(rng, scale.parts))
+            counts["parts"] = _insert(conn, InventoryItem.__table__, part_rows)
+            parts = {"sell_price": [row["sell_price"] for row in part_rows]}
+            del part_rows
+            counts["orders"], counts["lines"] = _orders(conn, rng, scale, parts, now)
+        if verbose:
+            print(f"Dados inseridos em {time.perf_counter() - started:.1f}s; preparando o banco...")
+        # Mesmo preparo da inicialização: triggers, FTS e tabelas derivadas calculadas a partir dos dados
+        database.create_db_and_tables(engine)
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+    finally:
+        engine.dispose()
+    counts["seconds"] = round(time.perf_counter() - started, 1)
+    return counts
+
+
+def scale_from_args(args) -> Scale:
+    """Escala nomeada com os valores passados na linha de comando por cima."""
+    overrides = {f.name: getattr(args, f.name) for f in fields(Scale) if getattr(args, f.name, None) is not None}
+    return replace(SCALES[args.scale], **overrides)
+
+
+def add_scale_arguments(parser):
+    parser.add_argument("--scale", default="medium", choices=sorted(SCALES))
+    parser.add_argument("--seed", type=int, default=42)
+    for f in fields(Scale):
+        parser.add_argument(f"--{f.name.replace('_', '-')}", dest=f.name, type=int,
+                            help=f"sobrepõe o valor da escala ({f.name})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="arquivo do banco a criar")
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+    scale = scale_from_args(args)
+    counts = generate(args.path, scale, args.seed)
+    print(f"{args.path}: {counts['clients']} clientes, {counts['parts']} peças, {counts['orders']} OS, "
+          f"{counts['lines']} itens em {counts['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Teste de estresse da baixa de estoque concorrente.
+
+Vários balcões (threads, cada uma com sua própria engine, como processos
+diferentes do uvicorn) vendem as mesmas poucas peças ao mesmo tempo, com
+estornos no meio, até o estoque acabar. Ao final confere:
+  - nenhuma peça com estoque negativo;
+  - total de cada OS == soma dos seus itens;
+  - unidades vendidas (itens na OS) == queda do estoque.
+
+Sai com código 1 se alguma conferência falhar.
+
+Uso:
+    python -m benchmarks.stress_stock
+    python -m benchmarks.stress_stock --threads 16 --items 3 --stock 200
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import delete, func
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel, select
+
+from app import database, stock
+from app.models import Client, InventoryItem, ServiceOrder, ServiceOrderItem, ServiceOrderStatus
+
+
+def populate(engine, n_items, initial_stock, n_orders):
+    with engine.begin() as conn:
+        conn.execute(Client.__table__.insert(), [
+            {"name": "Cliente", "phone": "0", "car_model": "Scania", "car_plate": "ABC1D23"}
+        ])
+        conn.execute(InventoryItem.__table__.insert(), [{
+            "name": f"Peça {i}", "category": "Motor", "cost_price": 10.0, "sell_price": 25.0 + i,
+            "quantity": initial_stock, "min_quantity": 1, "location": None,
+        } for i in range(n_items)])
+        conn.execute(ServiceOrder.__table__.insert(), [
+            {"client_id": 1, "status": ServiceOrderStatus.OPEN, "total_value": 0.0, "created_at": datetime.now()}
+            for _ in range(n_orders)
+        ])
+
+
+def counter(url, args, stats):
+    """Um balcão: vende (e às vezes estorna) até o estoque de todas as peças acabar."""
+    engine = database.build_engine(url)
+    rng = random.Random()
+    sold_out = set()
+    with Session(engine) as session:
+        while len(sold_out) < args.items:
+            item_id = rng.randint(1, args.items)
+            os_id = rng.randint(1, args.orders)
+            quantity = rng.randint(1, 3)
+
+            def sell():
+                price = stock.reserve(session, item_id, quantity)
+                session.add(ServiceOrderItem(
+                    order_id=os_id, item_id=item_id, quantity_sold=quantity, price_at_moment=price
+                ))
+                session.flush()
+                stock.recompute_total(session, os_id)
+                session.commit()
+
+            def refund():
+                row = session.execute(
+                    delete(ServiceOrderItem)
+                    .where(ServiceOrderItem.id == select(func.max(ServiceOrderItem.id))
+                           .where(ServiceOrderItem.order_id == os_id).scalar_subquery())
+                    .returning(ServiceOrderItem.item_id, ServiceOrderItem.quantity_sold)
+                ).first()
+                if row is not None:
+                    stock.release(session, row.item_id, row.quantity_sold)
+                    stock.recompute_total(session, os_id)
+                session.commit()
+
+            try:
+                if rng.random() < args.refund_rate:
+                    stock.run_with_retry(session, refund)
+                    stats["refunds"] += 1
+                else:
+                    stock.run_with_retry(session, sell)
+                    stats["sales"] += 1
+            except stock.InsufficientStock as e:
+                session.rollback()
+                stats["rejected"] += 1
+                if e.available == 0:
+                    sold_out.add(item_id)
+            except OperationalError:
+                session.rollback()
+                stats["busy"] += 1
+    engine.dispose()
+
+
+def check(engine, args) -> list:
+    problems = []
+    with Session(engine) as session:
+        quantities = dict(session.exec(select(InventoryItem.id, InventoryItem.quantity)).all())
+        for item_id, quantity in quantities.items():
+            if quantity < 0:
+                problems.append(f"peça {item_id} com estoque negativo ({quantity})")
+            sold = session.exec(
+                select(func.coalesce(func.sum(ServiceOrderItem.quantity_sold), 0))
+                .where(ServiceOrderItem.item_id == item_id)
+            ).one()
+            if sold != args.stock - quantity:
+                problems.append(f"peça {item_id}: vendidas {sold}, estoque caiu {args.stock - quantity}")
+
+        for os_obj in session.exec(select(ServiceOrder)).all():
+            lines = session.exec(
+                select(func.coalesce(func.sum(ServiceOrderItem.quantity_sold * ServiceOrderItem.price_at_moment), 0.0))
+                .where(ServiceOrderItem.order_id == os_obj.id)
+            ).one()
+            if abs(os_obj.total_value - lines) > 1e-6:
+                problems.append(f"OS {os_obj.id}: total {os_obj.total_value:.2f} != soma dos itens {lines:.2f}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=12)
+    parser.add_argument("--items", type=int, default=3, help="poucas peças = muita disputa pela última unidade")
+    parser.add_argument("--stock", type=int, default=150, help="estoque inicial de cada peça")
+    parser.add_argument("--orders", type=int, default=4)
+    parser.add_argument("--refund-rate", type=float, default=0.15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'stress.db')}"
+        engine = database.build_engine(url)
+        SQLModel.metadata.create_all(engine)
+        populate(engine, args.items, args.stock, args.orders)
+
+        counters = [Counter() for _ in range(args.threads)]
+        threads = [threading.Thread(target=counter, args=(url, args, counters[i])) for i in range(args.threads)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        problems = check(engine, args)
+        engine.dispose()
+
+    stats = sum(counters, Counter())
+    print(f"{args.threads} balcões em {elapsed:.1f}s: vendas {stats['sales']}, estornos {stats['refunds']}, "
+          f"recusadas por falta de estoque {stats['rejected']}, desistências por banco ocupado {stats['busy']}")
+    for problem in problems:
+        print(f"FALHA: {problem}")
+    if problems:
+        sys.exit(1)
+    print("OK: estoque nunca negativo e totais das OS batem com os itens")
+
+
+if __name__ == "__main__":
+    main()